@@ -0,0 +1,47 @@
+# Micro-benchmark for CompressedSet. Run with: python -m benchmarks.compressed_set
+import random
+import timeit
+
+from nerdd_backend.util import CompressedSet
+
+
+def add_one_by_one(xs):
+    s = CompressedSet()
+    for x in xs:
+        s.add(x)
+    return s
+
+
+def add_batched(xs, batch_size):
+    s = CompressedSet()
+    for i in range(0, len(xs), batch_size):
+        s.update(xs[i : i + batch_size])
+    return s
+
+
+def main():
+    n = 100_000
+    sequential = list(range(n))
+    random_order = list(range(n))
+    random.seed(0)
+    random.shuffle(random_order)
+
+    for name, xs in [("sequential", sequential), ("random", random_order)]:
+        for label, fn in [
+            ("add", lambda xs=xs: add_one_by_one(xs)),
+            ("update (batches of 1000)", lambda xs=xs: add_batched(xs, 1000)),
+            ("update (all at once)", lambda xs=xs: CompressedSet().update(xs)),
+        ]:
+            seconds = min(timeit.repeat(fn, number=1, repeat=3))
+            print(f"{name:>10} | {label:<25} | {n / seconds:>12,.0f} elements/s")
+
+    # membership and cardinality on a fragmented set (every second element is missing)
+    fragmented = CompressedSet().update(range(0, 2 * n, 2))
+    seconds = min(timeit.repeat(lambda: [x in fragmented for x in random_order], number=1))
+    print(f"{'contains':>10} | {'fragmented set':<25} | {n / seconds:>12,.0f} lookups/s")
+    seconds = min(timeit.repeat(fragmented.count, number=1000)) / 1000
+    print(f"{'count':>10} | {'fragmented set':<25} | {seconds * 1e6:>12,.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# Benchmark for storing uploaded files. Run with: python -m benchmarks.upload
+import asyncio
+import os
+import tempfile
+import time
+from tempfile import SpooledTemporaryFile
+
+import aiofiles
+from starlette.datastructures import UploadFile
+
+from nerdd_backend.util import store_upload
+
+
+def create_upload(num_bytes):
+    # Starlette spools uploads to disk if they are larger than 1 MiB
+    file = SpooledTemporaryFile(max_size=1024 * 1024)
+    block = os.urandom(1024 * 1024)
+    for _ in range(num_bytes // len(block)):
+        file.write(block)
+    file.seek(0)
+    return UploadFile(file, size=num_bytes)
+
+
+async def store_upload_1kib(file, path):
+    # previous implementation of put_source
+    async with aiofiles.open(path, "wb") as out_file:
+        while content := await file.read(1024):
+            await out_file.write(content)
+
+
+async def main():
+    num_bytes = 64 * 1024 * 1024
+    upload = create_upload(num_bytes)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, fn in [
+            ("aiofiles, 1 KiB chunks", lambda path: store_upload_1kib(upload, path)),
+            ("store_upload", lambda path: store_upload(upload, path)),
+            (
+                "store_upload (sha256)",
+                lambda path: store_upload(upload, path, hash_algorithm="sha256"),
+            ),
+        ]:
+            seconds = []
+            for i in range(3):
+                await upload.seek(0)
+                path = os.path.join(directory, f"{i}.bin")
+                start = time.perf_counter()
+                await fn(path)
+                seconds.append(time.perf_counter() - start)
+                os.remove(path)
+            print(f"{label:<25} | {num_bytes / min(seconds) / 1e6:>10,.1f} MB/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
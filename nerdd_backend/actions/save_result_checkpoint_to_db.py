@@ -1,10 +1,12 @@
 import logging
+from typing import Optional
 
 from nerdd_link import Action, Channel, ResultCheckpointMessage, SerializationRequestMessage
 from omegaconf import DictConfig
 
-from ..data import Repository
+from ..data import Repository, ResultStore
 from ..models import JobUpdate
+from ..util import BackgroundTasks
 
 __all__ = ["SaveResultCheckpointToDb"]
 
@@ -12,10 +14,22 @@ logger = logging.getLogger(__name__)
 
 
 class SaveResultCheckpointToDb(Action[ResultCheckpointMessage]):
-    def __init__(self, channel: Channel, repository: Repository, config: DictConfig) -> None:
+    def __init__(
+        self,
+        channel: Channel,
+        repository: Repository,
+        config: DictConfig,
+        result_store: Optional[ResultStore] = None,
+        background_tasks: Optional[BackgroundTasks] = None,
+    ) -> None:
         super().__init__(channel.result_checkpoints_topic())
         self.repository = repository
         self.config = config
+        # if given, results of complete jobs are archived (in the background)
+        self.result_store = result_store
+        self.background_tasks = (
+            background_tasks if background_tasks is not None else BackgroundTasks()
+        )
 
     async def _process_message(self, message: ResultCheckpointMessage) -> None:
         job_id = message.job_id
@@ -40,5 +54,10 @@ class SaveResultCheckpointToDb(Action[ResultCheckpointMessage]):
                     )
                 )
 
+            # Note: the last results might still be buffered in SaveResultToDb (in this case,
+            # SaveResultToDb archives the results when writing them)
+            if self.result_store is not None:
+                self.result_store.archive_results_later(job, self.background_tasks)
+
     def _get_group_name(self):
         return "save-result-checkpoint-to-db"
@@ -1,12 +1,17 @@
 import asyncio
 import logging
+import os
 from asyncio import Lock
 from collections import OrderedDict
+from typing import Dict, List, Optional, Set
 
 from nerdd_link import Action, Channel, ResultMessage
+from omegaconf import DictConfig
+from starlette.concurrency import run_in_threadpool
 
-from ..data import RecordNotFoundError, Repository
+from ..data import RecordNotFoundError, Repository, ResultStore
 from ..models import JobUpdate, Result
+from ..util import BackgroundTasks, Journal, JournalFile
 
 __all__ = ["SaveResultToDb"]
 
@@ -47,29 +52,172 @@ async def get_source_by_id(source_id, repository):
 
 
 class SaveResultToDb(Action[ResultMessage]):
-    def __init__(self, channel: Channel, repository: Repository) -> None:
+    def __init__(
+        self,
+        channel: Channel,
+        repository: Repository,
+        config: DictConfig,
+        result_store: Optional[ResultStore] = None,
+        background_tasks: Optional[BackgroundTasks] = None,
+    ) -> None:
         super().__init__(channel.results_topic())
         self.repository = repository
+        self.config = config
+        # if given, results of complete jobs are archived (in the background)
+        self.result_store = result_store
+        self.background_tasks = (
+            background_tasks if background_tasks is not None else BackgroundTasks()
+        )
+
+        # Results are buffered per job and written in batches: a batch is flushed as soon as it
+        # contains result_batch_size messages or result_batch_timeout_seconds after its first
+        # message arrived (whatever happens first). A batch size of 1 writes every result
+        # immediately.
+        self.batch_size = max(1, config.result_batch_size)
+        self.batch_timeout = config.result_batch_timeout_seconds
+        self._batches: Dict[str, List[ResultMessage]] = {}
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+        # A message is acknowledged (and never delivered again) as soon as _process_message
+        # returns. Buffered messages are written to a journal first, so that they are not lost if
+        # the process stops before their batch is written.
+        if self.batch_size > 1:
+            self.journal: Optional[Journal] = Journal(
+                os.path.join(config.media_root, "journal", self._get_group_name())
+            )
+        else:
+            self.journal = None
+        self._journal_files: Dict[str, JournalFile] = {}
+
+    async def run(self) -> None:
+        try:
+            await self._recover()
+            await super().run()
+        finally:
+            # the timers must not fire after the action stopped (e.g. when the repository is
+            # closed already), so everything that is still buffered is written right now
+            for task in list(self._flush_tasks):
+                task.cancel()
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+            for job_id in list(self._batches.keys()):
+                await self._flush(job_id)
+
+    async def _recover(self) -> None:
+        # write the batches of a previous run that were not written before it stopped
+        if self.journal is None:
+            return
+
+        for journal_file, records in await run_in_threadpool(list, self.journal.recover()):
+            messages_by_job: Dict[str, List[ResultMessage]] = {}
+            for record in records:
+                message = ResultMessage(**record)
+                messages_by_job.setdefault(message.job_id, []).append(message)
+
+            try:
+                for job_id, messages in messages_by_job.items():
+                    await self._write(job_id, messages)
+            except Exception:
+                # keep the file and try again after the next start
+                logger.error(f"Could not recover results from {journal_file.path}", exc_info=True)
+                await run_in_threadpool(journal_file.close)
+                continue
+
+            logger.info(f"Recovered {len(records)} result(s) from {journal_file.path}")
+            await run_in_threadpool(journal_file.remove)
 
     async def _process_message(self, message: ResultMessage) -> None:
         job_id = message.job_id
 
+        batch = self._batches.get(job_id)
+        if batch is None:
+            batch = self._batches[job_id] = []
+            if self.journal is not None:
+                self._journal_files[job_id] = await run_in_threadpool(self.journal.open)
+            if self.batch_size > 1:
+                # make sure that the batch is written even if no more messages arrive
+                task = asyncio.create_task(self._flush_later(job_id, batch))
+                self._flush_tasks.add(task)
+                task.add_done_callback(self._flush_tasks.discard)
+
+        batch.append(message)
+        if self.journal is not None:
+            self._journal_files[job_id].append(message.model_dump())
+
+        if len(batch) >= self.batch_size:
+            await self._flush(job_id)
+
+    async def _flush_later(self, job_id: str, batch: List[ResultMessage]) -> None:
+        await asyncio.sleep(self.batch_timeout)
+
+        # the batch might have been flushed already (because it reached the maximum size)
+        if self._batches.get(job_id) is not batch:
+            return
+
+        try:
+            await self._flush(job_id)
+        except Exception:
+            logger.error(f"Error writing results of job {job_id}", exc_info=True)
+
+    async def _flush(self, job_id: str) -> None:
+        # Remove the batch before doing anything asynchronous. Messages arriving in the meantime
+        # start a new batch.
+        messages = self._batches.pop(job_id, [])
+        journal_file = self._journal_files.pop(job_id, None)
+        if len(messages) == 0:
+            return
+
+        try:
+            await self._write(job_id, messages)
+        except BaseException:
+            # the batch is recovered from the journal after the next start
+            if journal_file is not None:
+                await run_in_threadpool(journal_file.close)
+            raise
+
+        if journal_file is not None:
+            await run_in_threadpool(journal_file.remove)
+
+    async def _write(self, job_id: str, messages: List[ResultMessage]) -> None:
         # If a job was submitted and deleted during processing, results might still be generated.
         # In this case, we ignore the results of the deleted job.
         try:
             job = await self.repository.get_job_by_id(job_id)
         except RecordNotFoundError:
-            logger.error(f"Job with id {job_id} not found. Ignoring this result.")
+            logger.error(f"Job with id {job_id} not found. Ignoring {len(messages)} result(s).")
             return
 
         try:
-            module = await self.repository.get_module_by_id(job.job_type)
+            await self.repository.get_module_by_id(job.job_type)
         except RecordNotFoundError:
-            logger.error(f"Module with id {job.job_type} not found. Ignoring this result.")
+            logger.error(
+                f"Module with id {job.job_type} not found. Ignoring {len(messages)} result(s)."
+            )
             return
 
         # TODO: check if corresponding module has correct task type (e.g. "derivative_prediction")
 
+        results = [await self._create_result(message) for message in messages]
+
+        # save results
+        inserted = await self.repository.create_results(results)
+        if len(inserted) < len(results):
+            logger.warning(
+                f"Skipped {len(results) - len(inserted)} of {len(results)} result(s) of job "
+                f"{job_id}, because they could not be inserted"
+            )
+
+        # update set of processed entries in job
+        job = await self.repository.update_job(
+            JobUpdate(id=job_id, entries_processed=[message.mol_id for message in messages])
+        )
+
+        # the job might be complete now (see SaveResultCheckpointToDb)
+        if self.result_store is not None and job is not None:
+            self.result_store.archive_results_later(job, self.background_tasks)
+
+    async def _create_result(self, message: ResultMessage) -> Result:
+        job_id = message.job_id
+
         # generate an id for the result
         if hasattr(message, "atom_id"):
             id = f"{job_id}-{message.mol_id}-{message.atom_id}"
@@ -83,8 +231,14 @@ class SaveResultToDb(Action[ResultMessage]):
 
         # map sources to original file names
         if hasattr(message, "source") and not isinstance(message.source, str):
+            # Note: molecules read from archives (e.g. the packed inline inputs, see pack_inputs)
+            # are marked with "raw_input" by the readers, which is not a source
             translated_sources = await asyncio.gather(
-                *(get_source_by_id(source_id, self.repository) for source_id in message.source)
+                *(
+                    get_source_by_id(source_id, self.repository)
+                    for source_id in message.source
+                    if source_id != "raw_input"
+                )
             )
             message.source = [s for s in translated_sources if s is not None]
 
@@ -94,11 +248,7 @@ class SaveResultToDb(Action[ResultMessage]):
             if isinstance(v, str) and v.startswith("file://"):
                 result[k] = f"/api/jobs/{job_id}/files/{k}/{record_id}"
 
-        # save result
-        await self.repository.create_result(Result(id=id, **result))
-
-        # update set of processed entries in job
-        await self.repository.update_job(JobUpdate(id=job_id, entries_processed=[message.mol_id]))
+        return Result(id=id, **result)
 
     def _get_group_name(self):
         return "save-result-to-db"
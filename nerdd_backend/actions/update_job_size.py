@@ -4,7 +4,6 @@ from nerdd_link import Action, Channel, LogMessage, SerializationRequestMessage
 from omegaconf import DictConfig
 
 from ..data import Repository
-from ..models import JobUpdate
 
 __all__ = ["UpdateJobSize"]
 
@@ -21,13 +20,10 @@ class UpdateJobSize(Action[LogMessage]):
         if message.message_type == "report_job_size":
             logger.info(f"Update job size {message}")
 
-            # update job size
-            job = await self.repository.update_job(
-                JobUpdate(
-                    id=message.job_id,
-                    num_entries_total=message.num_entries,
-                    num_checkpoints_total=message.num_checkpoints,
-                )
+            # update job size (and the usage of the user, only once per job, because messages
+            # might be redelivered)
+            job = await self.repository.update_job_size(
+                message.job_id, message.num_entries, message.num_checkpoints
             )
 
             # check if all checkpoints have been processed
@@ -1,4 +1,8 @@
+from .caching_repository import *
 from .exceptions import *
+from .instrumentation import *
 from .memory_repository import *
 from .repository import *
+from .result_store import *
+from .rethinkdb_connection_pool import *
 from .rethinkdb_repository import *
@@ -0,0 +1,374 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterable, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from ..models import (
+    AnonymousUser,
+    Challenge,
+    JobInternal,
+    JobUpdate,
+    Module,
+    Result,
+    Source,
+    User,
+    UserUsage,
+)
+from .repository import Repository
+
+__all__ = ["CachingRepository"]
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Cache(Generic[T]):
+    # LRU cache with a time to live for every entry
+    # * copy: copies values that are put into or read from the cache (mutable values would be
+    #   shared by all callers otherwise)
+    # * Every put and invalidation of a key gets a new generation. A value read from the wrapped
+    #   repository after a miss is only put if the key did not change since the read started
+    #   (see fill), otherwise it might overwrite a newer value (or a concurrent invalidation).
+    def __init__(
+        self, max_size: int, ttl_seconds: float, copy: Optional[Callable[[T], T]] = None
+    ) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.copy = copy
+        self._entries: OrderedDict[str, Tuple[float, T]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # generations of the recently changed keys (older changes are covered by
+        # _forgotten_generation)
+        self.generation = 0
+        self._changes: OrderedDict[str, int] = OrderedDict()
+        self._forgotten_generation = 0
+
+    def get(self, key: str) -> Optional[T]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        value = entry[1]
+        return self.copy(value) if self.copy is not None else value
+
+    def _change(self, key: str) -> None:
+        self.generation += 1
+        self._changes[key] = self.generation
+        self._changes.move_to_end(key)
+        while len(self._changes) > max(self.max_size, 1):
+            _, self._forgotten_generation = self._changes.popitem(last=False)
+
+    def put(self, key: str, value: T) -> None:
+        self._change(key)
+        if self.copy is not None:
+            value = self.copy(value)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def fill(self, key: str, value: T, generation: int) -> None:
+        # puts a value that was read when the cache had the given generation
+        if self._changes.get(key, self._forgotten_generation) > generation:
+            return
+        self.put(key, value)
+
+    def invalidate(self, key: str) -> None:
+        self._change(key)
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._changes.clear()
+        self._forgotten_generation = self.generation
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+class CachingRepository(Repository):
+    # Wraps another repository and caches modules and jobs, because they are read on the hot path
+    # (every result message, every job poll and every results page).
+    # * Modules rarely change. Cached modules are invalidated by the module changefeed.
+    # * Jobs change often. Changes made through this repository (e.g. by the actions in this
+    #   process) and changes seen on job changefeeds (e.g. by websockets) update the cache. A short
+    #   time to live bounds the staleness of changes made by other processes.
+    def __init__(
+        self,
+        repository: Repository,
+        max_size: int = 1000,
+        module_ttl_seconds: float = 600,
+        job_ttl_seconds: float = 2,
+    ) -> None:
+        self.repository = repository
+        self.modules = _Cache[Module](
+            max_size, module_ttl_seconds, copy=lambda module: module.model_copy(deep=True)
+        )
+        self.all_modules = _Cache[List[Module]](
+            1,
+            module_ttl_seconds,
+            copy=lambda modules: [module.model_copy(deep=True) for module in modules],
+        )
+        self.jobs = _Cache[JobInternal](
+            max_size, job_ttl_seconds, copy=lambda job: job.model_copy(deep=True)
+        )
+        self._invalidation_task: Optional[asyncio.Task] = None
+
+    def get_cache_stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "modules": self.modules.get_stats(),
+            "all_modules": self.all_modules.get_stats(),
+            "jobs": self.jobs.get_stats(),
+        }
+
+    #
+    # INITIALIZATION
+    #
+    async def initialize(self) -> None:
+        await self.repository.initialize()
+        self._invalidation_task = asyncio.create_task(self._invalidate_modules())
+
+    async def close(self) -> None:
+        if self._invalidation_task is not None:
+            self._invalidation_task.cancel()
+            await asyncio.gather(self._invalidation_task, return_exceptions=True)
+            self._invalidation_task = None
+        await self.repository.close()
+
+    async def _invalidate_modules(self) -> None:
+        try:
+            async for old, new in self.repository.get_module_changes():
+                for module in (old, new):
+                    if module is not None:
+                        self.modules.invalidate(module.id)
+                self.all_modules.clear()
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.error("Module changefeed failed, disabling module cache", exc_info=True)
+            self.modules.max_size = 0
+            self.modules.clear()
+            self.all_modules.max_size = 0
+            self.all_modules.clear()
+
+    #
+    # MODULES
+    #
+    def get_module_changes(
+        self,
+    ) -> AsyncIterable[Tuple[Optional[Module], Optional[Module]]]:
+        return self.repository.get_module_changes()
+
+    async def get_all_modules(self) -> List[Module]:
+        modules = self.all_modules.get("all")
+        if modules is None:
+            generation = self.all_modules.generation
+            modules = await self.repository.get_all_modules()
+            self.all_modules.fill("all", modules, generation)
+        return modules
+
+    async def get_module_by_id(self, module_id: str) -> Module:
+        module = self.modules.get(module_id)
+        if module is None:
+            generation = self.modules.generation
+            module = await self.repository.get_module_by_id(module_id)
+            self.modules.fill(module_id, module, generation)
+        return module
+
+    async def create_module(self, module: Module) -> Module:
+        return await self.repository.create_module(module)
+
+    async def update_module(self, module: Module) -> Module:
+        self.modules.invalidate(module.id)
+        self.all_modules.clear()
+        return await self.repository.update_module(module)
+
+    #
+    # JOBS
+    #
+    async def get_job_changes(
+        self, job_id: str
+    ) -> AsyncIterable[Tuple[Optional[JobInternal], Optional[JobInternal]]]:
+        async for old, new in self.repository.get_job_changes(job_id):
+            if new is not None and new.status != "deleted":
+                self.jobs.put(job_id, new)
+            else:
+                self.jobs.invalidate(job_id)
+            yield old, new
+
+    async def create_job(self, job: JobInternal) -> JobInternal:
+        job = await self.repository.create_job(job)
+        self.jobs.put(job.id, job)
+        return job
+
+    async def update_job(self, job_update: JobUpdate) -> JobInternal:
+        self.jobs.invalidate(job_update.id)
+        job = await self.repository.update_job(job_update)
+        # Note: progress updates may still arrive for jobs that were deleted in the meantime
+        if job is not None and job.status != "deleted":
+            self.jobs.put(job.id, job)
+        return job
+
+    async def update_job_size(
+        self, job_id: str, num_entries_total: int, num_checkpoints_total: int
+    ) -> JobInternal:
+        self.jobs.invalidate(job_id)
+        job = await self.repository.update_job_size(
+            job_id, num_entries_total, num_checkpoints_total
+        )
+        self.jobs.put(job.id, job)
+        return job
+
+    async def get_job_by_id(self, job_id: str) -> JobInternal:
+        job = self.jobs.get(job_id)
+        if job is None:
+            generation = self.jobs.generation
+            job = await self.repository.get_job_by_id(job_id)
+            self.jobs.fill(job_id, job, generation)
+        return job
+
+    async def delete_job_by_id(self, job_id: str) -> None:
+        self.jobs.invalidate(job_id)
+        await self.repository.delete_job_by_id(job_id)
+
+    async def get_jobs_by_reuse_key(self, reuse_key: str) -> List[JobInternal]:
+        return await self.repository.get_jobs_by_reuse_key(reuse_key)
+
+    async def mark_job_deleted(self, job_id: str) -> JobInternal:
+        self.jobs.invalidate(job_id)
+        return await self.repository.mark_job_deleted(job_id)
+
+    async def mark_jobs_deleted(self, created_before: datetime) -> int:
+        # the affected jobs are not known here (and expire after job_ttl_seconds anyway)
+        self.jobs.clear()
+        return await self.repository.mark_jobs_deleted(created_before)
+
+    async def get_deleted_jobs(self, limit: int) -> List[JobInternal]:
+        return await self.repository.get_deleted_jobs(limit)
+
+    async def get_jobs_created_before(
+        self,
+        created_before: datetime,
+        job_type: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[JobInternal]:
+        return await self.repository.get_jobs_created_before(created_before, job_type, limit)
+
+    #
+    # SOURCES
+    #
+    async def create_source(self, source: Source) -> Source:
+        return await self.repository.create_source(source)
+
+    async def get_source_by_id(self, source_id: str) -> Source:
+        return await self.repository.get_source_by_id(source_id)
+
+    async def delete_source_by_id(self, source_id: str) -> None:
+        await self.repository.delete_source_by_id(source_id)
+
+    async def add_source_reference(self, source_id: str, owner: str) -> Source:
+        return await self.repository.add_source_reference(source_id, owner)
+
+    async def release_source(self, source_id: str, owner: str) -> bool:
+        return await self.repository.release_source(source_id, owner)
+
+    #
+    # RESULTS
+    #
+    async def get_num_processed_entries_by_job_id(self, job_id: str) -> int:
+        return await self.repository.get_num_processed_entries_by_job_id(job_id)
+
+    async def count_results_by_job_id(self, job_id: str) -> int:
+        return await self.repository.count_results_by_job_id(job_id)
+
+    async def delete_results_by_job_id(self, job_id: str, limit: Optional[int] = None) -> int:
+        return await self.repository.delete_results_by_job_id(job_id, limit)
+
+    async def get_results_by_job_id(
+        self,
+        job_id: str,
+        start_mol_id: Optional[int] = None,
+        end_mol_id: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Result]:
+        return await self.repository.get_results_by_job_id(job_id, start_mol_id, end_mol_id, limit)
+
+    def iter_results_by_job_id(
+        self,
+        job_id: str,
+        start_mol_id: Optional[int] = None,
+        end_mol_id: Optional[int] = None,
+    ) -> AsyncIterable[Result]:
+        return self.repository.iter_results_by_job_id(job_id, start_mol_id, end_mol_id)
+
+    async def create_result(self, result: Result) -> Result:
+        return await self.repository.create_result(result)
+
+    async def create_results(self, results: List[Result]) -> List[Result]:
+        return await self.repository.create_results(results)
+
+    def get_result_changes(
+        self,
+        job_id,
+        start_mol_id: Optional[int] = None,
+        end_mol_id: Optional[int] = None,
+    ) -> AsyncIterable[Tuple[Optional[Result], Optional[Result]]]:
+        return self.repository.get_result_changes(job_id, start_mol_id, end_mol_id)
+
+    #
+    # USERS
+    #
+    async def get_user_by_ip_address(self, ip_address: str) -> AnonymousUser:
+        return await self.repository.get_user_by_ip_address(ip_address)
+
+    async def create_user(self, user: User) -> User:
+        return await self.repository.create_user(user)
+
+    async def get_recent_jobs_by_user(self, user: User, num_seconds: int) -> List[JobInternal]:
+        return await self.repository.get_recent_jobs_by_user(user, num_seconds)
+
+    #
+    # USAGE (QUOTAS)
+    #
+    async def add_user_usage(
+        self,
+        user_id: str,
+        timestamp: datetime,
+        num_fresh_jobs: int = 0,
+        num_entries: int = 0,
+    ) -> None:
+        await self.repository.add_user_usage(user_id, timestamp, num_fresh_jobs, num_entries)
+
+    async def get_user_usage(self, user_id: str, num_seconds: int) -> UserUsage:
+        return await self.repository.get_user_usage(user_id, num_seconds)
+
+    async def delete_user_usage(self, before: datetime, limit: Optional[int] = None) -> int:
+        return await self.repository.delete_user_usage(before, limit)
+
+    #
+    # CHALLENGES (CAPTCHAS)
+    #
+    async def get_challenge_by_salt(self, salt: str) -> Challenge:
+        return await self.repository.get_challenge_by_salt(salt)
+
+    async def create_challenge(self, challenge: Challenge) -> Challenge:
+        return await self.repository.create_challenge(challenge)
+
+    async def delete_challenge_by_id(self, id: str) -> None:
+        await self.repository.delete_challenge_by_id(id)
+
+    async def delete_challenge_by_salt(self, salt: str, deadline: datetime) -> Challenge:
+        return await self.repository.delete_challenge_by_salt(salt, deadline)
+
+    async def delete_expired_challenges(
+        self, deadline: datetime, limit: Optional[int] = None
+    ) -> int:
+        return await self.repository.delete_expired_challenges(deadline, limit)
@@ -0,0 +1,90 @@
+import functools
+import inspect
+import time
+
+from ..util import MetricsRegistry
+from .repository import Repository
+
+__all__ = ["instrument_repository"]
+
+
+def instrument_repository(repository: Repository, metrics: MetricsRegistry) -> Repository:
+    # Measures the duration of all methods of the Repository interface and counts the changes
+    # delivered by changefeeds (methods ending with _changes). The methods are replaced on the
+    # instance, so that wrappers (e.g. CachingRepository) call the instrumented methods, too.
+    backend = type(repository).__name__
+    durations = metrics.histogram(
+        "nerdd_repository_method_duration_seconds",
+        "Duration of repository method calls (streams: until the last item was read)",
+        ["backend", "method"],
+    )
+    errors = metrics.counter(
+        "nerdd_repository_method_errors_total",
+        "Number of repository method calls that raised an exception",
+        ["backend", "method"],
+    )
+    changes = metrics.counter(
+        "nerdd_repository_changes_total",
+        "Number of changes delivered by repository changefeeds",
+        ["backend", "method"],
+    )
+
+    def instrument_coroutine(name, method):
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                errors.inc(backend=backend, method=name)
+                raise
+            finally:
+                durations.observe(time.perf_counter() - start, backend=backend, method=name)
+
+        return wrapper
+
+    def instrument_stream(name, method):
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            stream = method(*args, **kwargs)
+            try:
+                async for item in stream:
+                    yield item
+            except Exception:
+                errors.inc(backend=backend, method=name)
+                raise
+            finally:
+                await stream.aclose()
+                durations.observe(time.perf_counter() - start, backend=backend, method=name)
+
+        return wrapper
+
+    def instrument_changefeed(name, method):
+        # changefeeds run until the subscriber leaves (their duration is not interesting)
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            feed = method(*args, **kwargs)
+            try:
+                async for change in feed:
+                    changes.inc(backend=backend, method=name)
+                    yield change
+            finally:
+                await feed.aclose()
+
+        return wrapper
+
+    for name in sorted(Repository.__abstractmethods__):
+        method = getattr(repository, name)
+        if inspect.isasyncgenfunction(method):
+            if name.endswith("_changes"):
+                wrapper = instrument_changefeed(name, method)
+            else:
+                wrapper = instrument_stream(name, method)
+        elif inspect.iscoroutinefunction(method):
+            wrapper = instrument_coroutine(name, method)
+        else:
+            continue
+        setattr(repository, name, wrapper)
+
+    return repository
@@ -1,9 +1,8 @@
+import logging
 import time
 from asyncio import Lock
 from datetime import datetime
-from typing import AsyncIterable, List, Optional, Tuple
-
-from nerdd_link.utils import ObservableList
+from typing import AsyncIterable, Dict, List, Optional, Tuple
 
 from ..models import (
     AnonymousUser,
@@ -15,13 +14,16 @@ from ..models import (
     Result,
     Source,
     User,
+    UserUsage,
 )
-from ..util import CompressedSet
+from ..util import CompressedSet, Index, IndexedObservableList
 from .exceptions import RecordAlreadyExistsError, RecordNotFoundError
 from .repository import Repository
 
 __all__ = ["MemoryRepository"]
 
+logger = logging.getLogger(__name__)
+
 
 class MemoryRepository(Repository):
     def __init__(self) -> None:
@@ -32,12 +34,31 @@ class MemoryRepository(Repository):
     #
     async def initialize(self) -> None:
         self.transaction_lock = Lock()
-        self.jobs = ObservableList[JobInternal]()
-        self.modules = ObservableList[Module]()
-        self.sources = ObservableList[Source]()
-        self.results = ObservableList[Result]()
-        self.users = ObservableList[User]()
-        self.challenges = ObservableList[Challenge]()
+        self.jobs = IndexedObservableList[JobInternal](
+            indexes={
+                "user_id": Index(lambda job: job.user_id),
+                "reuse_key": Index(lambda job: job.reuse_key),
+                "status": Index(lambda job: job.status),
+            }
+        )
+        self.modules = IndexedObservableList[Module]()
+        self.sources = IndexedObservableList[Source]()
+        self.results = IndexedObservableList[Result](
+            indexes={
+                "job_id": Index(lambda result: result.job_id, order_by=lambda result: result.mol_id)
+            }
+        )
+        self.users = IndexedObservableList[User](
+            indexes={"ip_address": Index(lambda user: getattr(user, "ip_address", None))}
+        )
+        self.challenges = IndexedObservableList[Challenge](
+            indexes={"salt": Index(lambda challenge: challenge.salt)}
+        )
+        # maps (user_id, bucket) to usage counters
+        self.user_usage: Dict[Tuple[str, int], UserUsage] = {}
+
+    async def close(self) -> None:
+        pass
 
     #
     # MODULES
@@ -65,13 +86,13 @@ class MemoryRepository(Repository):
         async with self.transaction_lock:
             existing_module = await self.get_module_by_id(module.id)
             self.modules.update(existing_module, module)
-            return await self.get_module_by_id(module)
+            return await self.get_module_by_id(module.id)
 
     async def get_module_by_id(self, id: str) -> Module:
-        try:
-            return next((module for module in self.modules.get_items() if module.id == id))
-        except StopIteration as e:
-            raise RecordNotFoundError(Module, id) from e
+        module = self.modules.get(id)
+        if module is None:
+            raise RecordNotFoundError(Module, id)
+        return module
 
     #
     # JOBS
@@ -100,8 +121,12 @@ class MemoryRepository(Repository):
                 modified_job.status = job_update.status
             if job_update.entries_processed is not None:
                 entries_processed = CompressedSet(modified_job.entries_processed)
-                for entry in job_update.entries_processed:
-                    entries_processed.add(entry)
+                entries_processed.update(job_update.entries_processed)
+                modified_job.entries_processed = entries_processed.to_intervals()
+            if job_update.intervals_processed is not None:
+                entries_processed = CompressedSet(modified_job.entries_processed).union(
+                    CompressedSet(job_update.intervals_processed)
+                )
                 modified_job.entries_processed = entries_processed.to_intervals()
             if job_update.num_entries_total is not None:
                 modified_job.num_entries_total = job_update.num_entries_total
@@ -111,20 +136,94 @@ class MemoryRepository(Repository):
                 modified_job.checkpoints_processed.extend(job_update.new_checkpoints_processed)
             if job_update.new_output_formats is not None:
                 modified_job.output_formats.extend(job_update.new_output_formats)
+            if job_update.results_archived is not None:
+                modified_job.results_archived = job_update.results_archived
             self.jobs.update(existing_job, modified_job)
             return await self.get_job_by_id(job_update.id)
 
+    async def update_job_size(
+        self, job_id: str, num_entries_total: int, num_checkpoints_total: int
+    ) -> JobInternal:
+        async with self.transaction_lock:
+            job = await self.get_job_by_id(job_id)
+            self.jobs.update(
+                job,
+                job.model_copy(
+                    update={
+                        "num_entries_total": num_entries_total,
+                        "num_checkpoints_total": num_checkpoints_total,
+                    }
+                ),
+            )
+            if job.num_entries_total is None and job.user_id is not None:
+                await self.add_user_usage(
+                    job.user_id, job.created_at, num_fresh_jobs=-1, num_entries=num_entries_total
+                )
+            return await self.get_job_by_id(job_id)
+
     async def get_job_by_id(self, id: str) -> JobInternal:
-        try:
-            return next((job for job in self.jobs.get_items() if job.id == id))
-        except StopIteration as e:
-            raise RecordNotFoundError(Job, id) from e
+        job = self.jobs.get(id)
+        if job is None or job.status == "deleted":
+            raise RecordNotFoundError(Job, id)
+        return job
 
     async def delete_job_by_id(self, id: str) -> None:
         async with self.transaction_lock:
-            job = await self.get_job_by_id(id)
+            # Note: get_job_by_id hides jobs that are marked as deleted
+            job = self.jobs.get(id)
+            if job is None:
+                raise RecordNotFoundError(Job, id)
             self.jobs.remove(job)
 
+    async def mark_job_deleted(self, job_id: str) -> JobInternal:
+        async with self.transaction_lock:
+            job = await self.get_job_by_id(job_id)
+            new_job = job.model_copy(update={"status": "deleted"})
+            self.jobs.update(job, new_job)
+            await self._release_fresh_job(job)
+            return new_job
+
+    async def mark_jobs_deleted(self, created_before: datetime) -> int:
+        async with self.transaction_lock:
+            jobs = [
+                job
+                for job in self.jobs.get_items()
+                if job.status != "deleted" and job.created_at < created_before
+            ]
+            for job in jobs:
+                self.jobs.update(job, job.model_copy(update={"status": "deleted"}))
+                await self._release_fresh_job(job)
+            return len(jobs)
+
+    async def _release_fresh_job(self, job: JobInternal) -> None:
+        if job.num_entries_total is None and job.user_id is not None:
+            await self.add_user_usage(job.user_id, job.created_at, num_fresh_jobs=-1)
+
+    async def get_deleted_jobs(self, limit: int) -> List[JobInternal]:
+        return self.jobs.get_all("deleted", index="status")[:limit]
+
+    async def get_jobs_created_before(
+        self,
+        created_before: datetime,
+        job_type: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[JobInternal]:
+        jobs = [
+            job
+            for job in self.jobs.get_items()
+            if job.status != "deleted"
+            and job.created_at < created_before
+            and (job_type is None or job.job_type == job_type)
+        ]
+        return sorted(jobs, key=lambda job: job.created_at)[:limit]
+
+    async def get_jobs_by_reuse_key(self, reuse_key: str) -> List[JobInternal]:
+        return [
+            job
+            for job in self.jobs.get_all(reuse_key, index="reuse_key")
+            if job.status != "deleted"
+        ]
+
     #
     # SOURCES
     #
@@ -138,16 +237,37 @@ class MemoryRepository(Repository):
                 return source
 
     async def get_source_by_id(self, id: str) -> Source:
-        try:
-            return next((source for source in self.sources.get_items() if source.id == id))
-        except StopIteration as e:
-            raise RecordNotFoundError(Source, id) from e
+        source = self.sources.get(id)
+        if source is None:
+            raise RecordNotFoundError(Source, id)
+        return source
 
     async def delete_source_by_id(self, id: str) -> None:
         async with self.transaction_lock:
             source = await self.get_source_by_id(id)
             self.sources.remove(source)
 
+    async def add_source_reference(self, source_id: str, owner: str) -> Source:
+        async with self.transaction_lock:
+            source = await self.get_source_by_id(source_id)
+            if owner in source.references:
+                return source
+            new_source = source.model_copy(update={"references": [*source.references, owner]})
+            self.sources.update(source, new_source)
+            return new_source
+
+    async def release_source(self, source_id: str, owner: str) -> bool:
+        async with self.transaction_lock:
+            source = await self.get_source_by_id(source_id)
+            if owner not in source.references:
+                return False
+            references = [reference for reference in source.references if reference != owner]
+            if len(references) > 0:
+                self.sources.update(source, source.model_copy(update={"references": references}))
+                return False
+            self.sources.remove(source)
+            return True
+
     #
     # RESULTS
     #
@@ -171,33 +291,60 @@ class MemoryRepository(Repository):
                 yield change
 
     async def get_result_by_id(self, id: str) -> Result:
-        try:
-            return next((result for result in self.results.get_items() if result.id == id))
-        except StopIteration as e:
-            raise RecordNotFoundError(Result, id) from e
+        result = self.results.get(id)
+        if result is None:
+            raise RecordNotFoundError(Result, id)
+        return result
 
     async def get_results_by_job_id(
         self,
         job_id: str,
         start_mol_id: Optional[int] = None,
         end_mol_id: Optional[int] = None,
+        limit: Optional[int] = None,
     ) -> List[Result]:
-        return [
-            result
-            for result in self.results.get_items()
-            if result.job_id == job_id and start_mol_id <= result.mol_id <= end_mol_id
-        ]
+        return self.results.get_range(job_id, start_mol_id, end_mol_id, index="job_id")[:limit]
+
+    async def iter_results_by_job_id(
+        self,
+        job_id: str,
+        start_mol_id: Optional[int] = None,
+        end_mol_id: Optional[int] = None,
+    ) -> AsyncIterable[Result]:
+        # all results are in memory anyway
+        for result in await self.get_results_by_job_id(job_id, start_mol_id, end_mol_id):
+            yield result
 
     async def create_result(self, result: Result) -> None:
         async with self.transaction_lock:
-            try:
-                await self.get_result_by_id(result.id)
+            if self.results.get(result.id) is not None:
                 raise RecordAlreadyExistsError(Result, result.id)
-            except RecordNotFoundError:
+            self.results.append(result)
+
+    async def create_results(self, results: List[Result]) -> List[Result]:
+        inserted = []
+        async with self.transaction_lock:
+            # similar to RethinkDB, existing results are skipped and the rest is inserted
+            for result in results:
+                if self.results.get(result.id) is not None:
+                    logger.warning(f"Could not insert result {result.id}: duplicate primary key")
+                    continue
                 self.results.append(result)
+                inserted.append(result)
+        return inserted
 
     async def get_all_results_by_job_id(self, job_id: str) -> List[Result]:
-        return [result for result in self.results.get_items() if result.job_id == job_id]
+        return self.results.get_all(job_id, index="job_id")
+
+    async def delete_results_by_job_id(self, job_id: str, limit: Optional[int] = None) -> int:
+        async with self.transaction_lock:
+            results = self.results.get_all(job_id, index="job_id")[:limit]
+            for result in results:
+                self.results.remove(result)
+            return len(results)
+
+    async def count_results_by_job_id(self, job_id: str) -> int:
+        return len(self.results.get_all(job_id, index="job_id"))
 
     async def get_num_processed_entries_by_job_id(self, job_id: str) -> int:
         return len(await self.get_all_results_by_job_id(job_id))
@@ -206,17 +353,17 @@ class MemoryRepository(Repository):
     # USERS
     #
     async def get_user_by_ip_address(self, ip_address: str) -> User:
-        try:
-            return next((user for user in self.users.get_items() if user.ip_address == ip_address))
-        except StopIteration as e:
-            raise RecordNotFoundError(User, ip_address) from e
+        users = self.users.get_all(ip_address, index="ip_address")
+        if len(users) == 0:
+            raise RecordNotFoundError(User, ip_address)
+        return users[0]
 
     # Note: this method is not mandatory for the repository interface.
     async def get_user_by_id(self, id: str) -> User:
-        try:
-            return next((user for user in self.users.get_items() if user.id == id))
-        except StopIteration as e:
-            raise RecordNotFoundError(User, id) from e
+        user = self.users.get(id)
+        if user is None:
+            raise RecordNotFoundError(User, id)
+        return user
 
     async def create_user(self, user: User) -> User:
         async with self.transaction_lock:
@@ -231,25 +378,60 @@ class MemoryRepository(Repository):
     async def get_recent_jobs_by_user(self, user, num_seconds):
         return [
             job
-            for job in self.jobs.get_items()
-            if job.user_id == user.id and (job.created_at.timestamp() > (time.time() - num_seconds))
+            for job in self.jobs.get_all(user.id, index="user_id")
+            if job.created_at.timestamp() > (time.time() - num_seconds)
         ]
 
+    #
+    # USAGE (QUOTAS)
+    #
+    async def add_user_usage(
+        self,
+        user_id: str,
+        timestamp: datetime,
+        num_fresh_jobs: int = 0,
+        num_entries: int = 0,
+    ) -> None:
+        bucket = self._get_usage_bucket(timestamp.timestamp())
+        usage = self.user_usage.setdefault((user_id, bucket), UserUsage())
+        usage.num_fresh_jobs += num_fresh_jobs
+        usage.num_entries += num_entries
+
+    async def get_user_usage(self, user_id: str, num_seconds: int) -> UserUsage:
+        result = UserUsage()
+        now = time.time()
+        for bucket in range(
+            self._get_usage_bucket(now - num_seconds), self._get_usage_bucket(now) + 1
+        ):
+            usage = self.user_usage.get((user_id, bucket))
+            if usage is not None:
+                result.num_fresh_jobs += usage.num_fresh_jobs
+                result.num_entries += usage.num_entries
+        return result
+
+    async def delete_user_usage(self, before: datetime, limit: Optional[int] = None) -> int:
+        # buckets before this one end before the given time
+        bucket = self._get_usage_bucket(before.timestamp())
+        keys = [key for key in self.user_usage if key[1] < bucket][:limit]
+        for key in keys:
+            del self.user_usage[key]
+        return len(keys)
+
     #
     # CHALLENGES
     #
     async def get_challenge_by_salt(self, salt: str) -> Challenge:
-        try:
-            return next((challenge for challenge in self.challenges if challenge.salt == salt))
-        except StopIteration as e:
-            raise RecordNotFoundError(Challenge, salt) from e
+        challenges = self.challenges.get_all(salt, index="salt")
+        if len(challenges) == 0:
+            raise RecordNotFoundError(Challenge, salt)
+        return challenges[0]
 
     # Note: this method is not mandatory for the repository interface.
     async def get_challenge_by_id(self, id: str) -> User:
-        try:
-            return next((challenge for challenge in self.challenges if challenge.id == id))
-        except StopIteration as e:
-            raise RecordNotFoundError(Challenge, id) from e
+        challenge = self.challenges.get(id)
+        if challenge is None:
+            raise RecordNotFoundError(Challenge, id)
+        return challenge
 
     async def create_challenge(self, challenge: Challenge) -> Challenge:
         async with self.transaction_lock:
@@ -265,8 +447,23 @@ class MemoryRepository(Repository):
             existing_challenge = await self.get_challenge_by_id(id)
             self.challenges.remove(existing_challenge)
 
-    async def delete_expired_challenges(self, deadline: datetime) -> None:
+    async def delete_challenge_by_salt(self, salt: str, deadline: datetime) -> Challenge:
         async with self.transaction_lock:
-            for challenge in self.challenges:
-                if challenge.expires_at < deadline:
+            for challenge in self.challenges.get_all(salt, index="salt"):
+                if challenge.expires_at > deadline:
                     self.challenges.remove(challenge)
+                    return challenge
+            raise RecordNotFoundError(Challenge, salt)
+
+    async def delete_expired_challenges(
+        self, deadline: datetime, limit: Optional[int] = None
+    ) -> int:
+        async with self.transaction_lock:
+            expired_challenges = [
+                challenge
+                for challenge in self.challenges.get_items()
+                if challenge.expires_at < deadline
+            ][:limit]
+            for challenge in expired_challenges:
+                self.challenges.remove(challenge)
+            return len(expired_challenges)
@@ -2,7 +2,17 @@ from abc import ABC, abstractmethod
 from datetime import datetime
 from typing import AsyncIterable, List, Optional, Tuple
 
-from ..models import AnonymousUser, Challenge, JobInternal, JobUpdate, Module, Result, Source, User
+from ..models import (
+    AnonymousUser,
+    Challenge,
+    JobInternal,
+    JobUpdate,
+    Module,
+    Result,
+    Source,
+    User,
+    UserUsage,
+)
 
 __all__ = ["Repository"]
 
@@ -15,6 +25,11 @@ class Repository(ABC):
     async def initialize(self):
         pass
 
+    @abstractmethod
+    async def close(self) -> None:
+        # releases resources (e.g. connections and background tasks) on shutdown
+        pass
+
     #
     # MODULES
     #
@@ -57,6 +72,15 @@ class Repository(ABC):
     async def update_job(self, job_update: JobUpdate) -> JobInternal:
         pass
 
+    @abstractmethod
+    async def update_job_size(
+        self, job_id: str, num_entries_total: int, num_checkpoints_total: int
+    ) -> JobInternal:
+        # Sets the size of a job. If the size was not known before, the job stops counting as a
+        # fresh job of its user and its entries are counted instead (see add_user_usage). Both
+        # happen at most once per job, even if the size is reported several times.
+        pass
+
     @abstractmethod
     async def get_job_by_id(self, job_id: str) -> JobInternal:
         pass
@@ -65,6 +89,37 @@ class Repository(ABC):
     async def delete_job_by_id(self, job_id: str) -> None:
         pass
 
+    @abstractmethod
+    async def get_jobs_by_reuse_key(self, reuse_key: str) -> List[JobInternal]:
+        pass
+
+    @abstractmethod
+    async def mark_job_deleted(self, job_id: str) -> JobInternal:
+        # Sets the status of a job to "deleted". Deleted jobs are not returned by get_job_by_id
+        # anymore and are removed (with their results) by the JobReaperLifespan. If the size of
+        # the job is not known yet, it stops counting as a fresh job of its user.
+        pass
+
+    @abstractmethod
+    async def mark_jobs_deleted(self, created_before: datetime) -> int:
+        # Marks all jobs created before the given time as deleted (see mark_job_deleted). Returns
+        # the number of jobs.
+        pass
+
+    @abstractmethod
+    async def get_deleted_jobs(self, limit: int) -> List[JobInternal]:
+        pass
+
+    @abstractmethod
+    async def get_jobs_created_before(
+        self,
+        created_before: datetime,
+        job_type: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[JobInternal]:
+        # Returns the oldest jobs (not marked as deleted) created before the given time.
+        pass
+
     #
     # SOURCES
     #
@@ -80,9 +135,30 @@ class Repository(ABC):
     async def delete_source_by_id(self, source_id: str) -> None:
         pass
 
+    @abstractmethod
+    async def add_source_reference(self, source_id: str, owner: str) -> Source:
+        # Records atomically that the owner (e.g. a job) uses the source.
+        pass
+
+    @abstractmethod
+    async def release_source(self, source_id: str, owner: str) -> bool:
+        # Removes the reference of the owner atomically and deletes the source if it was the last
+        # reference. Returns True if the source was deleted. Releasing a reference that does not
+        # exist (e.g. twice) does not change anything.
+        pass
+
     #
     # RESULTS
     #
+    @abstractmethod
+    async def delete_results_by_job_id(self, job_id: str, limit: Optional[int] = None) -> int:
+        # Deletes (at most limit) results of a job. Returns the number of deleted results.
+        pass
+
+    @abstractmethod
+    async def count_results_by_job_id(self, job_id: str) -> int:
+        pass
+
     @abstractmethod
     async def get_num_processed_entries_by_job_id(self, job_id: str) -> int:
         pass
@@ -93,13 +169,33 @@ class Repository(ABC):
         job_id: str,
         start_mol_id: Optional[int] = None,
         end_mol_id: Optional[int] = None,
+        limit: Optional[int] = None,
     ) -> List[Result]:
+        # Returns the results of a job with start_mol_id <= mol_id <= end_mol_id ordered by mol_id
+        # (at most limit results).
+        pass
+
+    @abstractmethod
+    def iter_results_by_job_id(
+        self,
+        job_id: str,
+        start_mol_id: Optional[int] = None,
+        end_mol_id: Optional[int] = None,
+    ) -> AsyncIterable[Result]:
+        # Iterates over the results of a job ordered by mol_id (like get_results_by_job_id), but
+        # without loading all results into memory at once.
         pass
 
     @abstractmethod
     async def create_result(self, result: Result) -> Result:
         pass
 
+    @abstractmethod
+    async def create_results(self, results: List[Result]) -> List[Result]:
+        # Inserts multiple results at once. Results that can not be inserted (e.g. because a result
+        # with the same id exists already) are skipped. Returns the list of inserted results.
+        pass
+
     @abstractmethod
     def get_result_changes(
         self,
@@ -124,6 +220,37 @@ class Repository(ABC):
     async def get_recent_jobs_by_user(self, user: User, num_seconds: int) -> List[JobInternal]:
         pass
 
+    #
+    # USAGE (QUOTAS)
+    #
+    @abstractmethod
+    async def add_user_usage(
+        self,
+        user_id: str,
+        timestamp: datetime,
+        num_fresh_jobs: int = 0,
+        num_entries: int = 0,
+    ) -> None:
+        # Adds the given numbers to the usage counters of a user. Counters are bucketed by the hour
+        # of the timestamp (see _get_usage_bucket) and incremented atomically.
+        pass
+
+    @abstractmethod
+    async def get_user_usage(self, user_id: str, num_seconds: int) -> UserUsage:
+        # Sums up the usage counters of a user in all buckets within the last num_seconds. Note:
+        # the oldest bucket is included completely, i.e. the window is rounded up to full hours.
+        pass
+
+    @abstractmethod
+    async def delete_user_usage(self, before: datetime, limit: Optional[int] = None) -> int:
+        # Deletes (at most limit) usage buckets that end before the given time and returns the
+        # number of deleted buckets.
+        pass
+
+    def _get_usage_bucket(self, timestamp: float) -> int:
+        # usage counters are bucketed by hour (number of hours since epoch)
+        return int(timestamp // 3600)
+
     #
     # CHALLENGES (CAPTCHAS)
     #
@@ -140,5 +267,16 @@ class Repository(ABC):
         pass
 
     @abstractmethod
-    async def delete_expired_challenges(self, deadline: datetime) -> None:
+    async def delete_challenge_by_salt(self, salt: str, deadline: datetime) -> Challenge:
+        # Deletes the challenge with the given salt atomically, but only if it expires after the
+        # deadline. Raises RecordNotFoundError if there is no such challenge (e.g. because it was
+        # solved before). This way, each challenge can be used exactly once.
+        pass
+
+    @abstractmethod
+    async def delete_expired_challenges(
+        self, deadline: datetime, limit: Optional[int] = None
+    ) -> int:
+        # Deletes (at most limit) challenges that expire before the deadline and returns the number
+        # of deleted challenges.
         pass
@@ -0,0 +1,251 @@
+import logging
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import AsyncIterable, Dict, List, Optional, Set
+
+from nerdd_link import FileSystem
+from starlette.concurrency import run_in_threadpool
+
+from ..models import JobInternal, JobUpdate, Result
+from ..util import BackgroundTasks, CompressedSet, ResultArchive, ResultArchiveWriter
+from .repository import Repository
+
+__all__ = ["ARCHIVE_FILE_NAME", "ResultStore"]
+
+logger = logging.getLogger(__name__)
+
+
+ARCHIVE_FILE_NAME = "results.archive"
+
+
+class ResultStore:
+    # Results of running jobs are stored in the database (one record per result). Once a job is
+    # complete, archive_results moves its results into a single compressed file in the job
+    # directory (see ResultArchive). This class reads results from the right place.
+    def __init__(
+        self,
+        repository: Repository,
+        filesystem: FileSystem,
+        row_group_size: int = 1000,
+        compress_level: int = 6,
+        batch_size: int = 1000,
+        max_open_archives: int = 128,
+    ) -> None:
+        self.repository = repository
+        self.filesystem = filesystem
+        self.row_group_size = row_group_size
+        self.compress_level = compress_level
+        self.batch_size = batch_size
+        # ids of jobs that are archived right now
+        self._archiving: Set[str] = set()
+        # Archives stay mapped into memory (least recently used first), so that reading a page
+        # does not parse the footer again. The operating system keeps the frequently read parts
+        # of the files in its page cache. Evicted archives are closed as soon as no thread reads
+        # from them anymore.
+        self.max_open_archives = max_open_archives
+        self._archives: OrderedDict[str, ResultArchive] = OrderedDict()
+        self._num_readers: Dict[ResultArchive, int] = {}
+        self._evicted: Set[ResultArchive] = set()
+        self._archives_lock = Lock()
+
+    def get_archive_path(self, job_id: str) -> str:
+        return os.path.join(self.filesystem.get_job_dir(job_id), ARCHIVE_FILE_NAME)
+
+    def _acquire_archive(self, job_id: str) -> ResultArchive:
+        # called from worker threads (every call has to be followed by _release_archive)
+        with self._archives_lock:
+            archive = self._archives.get(job_id)
+            if archive is not None:
+                self._archives.move_to_end(job_id)
+                self._num_readers[archive] = self._num_readers.get(archive, 0) + 1
+                return archive
+
+        archive = ResultArchive(self.get_archive_path(job_id))
+
+        with self._archives_lock:
+            existing = self._archives.get(job_id)
+            if existing is not None:
+                # opened by another thread in the meantime
+                archive.close()
+                archive = existing
+            self._archives[job_id] = archive
+            self._archives.move_to_end(job_id)
+            self._num_readers[archive] = self._num_readers.get(archive, 0) + 1
+            while len(self._archives) > self.max_open_archives:
+                _, evicted = self._archives.popitem(last=False)
+                self._close_if_unused(evicted)
+        return archive
+
+    def _release_archive(self, archive: ResultArchive) -> None:
+        with self._archives_lock:
+            self._num_readers[archive] -= 1
+            if self._num_readers[archive] == 0:
+                del self._num_readers[archive]
+                if archive in self._evicted:
+                    self._evicted.discard(archive)
+                    archive.close()
+
+    def _close_if_unused(self, archive: ResultArchive) -> None:
+        # called with the lock held
+        if archive in self._num_readers:
+            # closed by the last reader
+            self._evicted.add(archive)
+        else:
+            archive.close()
+
+    def num_open_archives(self) -> int:
+        return len(self._archives) + len(self._evicted)
+
+    def invalidate(self, job_id: str) -> None:
+        # forget the archive of a job (e.g. because it is deleted)
+        with self._archives_lock:
+            archive = self._archives.pop(job_id, None)
+            if archive is not None:
+                self._close_if_unused(archive)
+
+    def _read_archive(
+        self,
+        job_id: str,
+        start_mol_id: Optional[int],
+        end_mol_id: Optional[int],
+        limit: Optional[int],
+    ) -> List[Result]:
+        # only decompresses the row groups overlapping the range (one row group per page)
+        archive = self._acquire_archive(job_id)
+        try:
+            records = archive.read(start_mol_id, end_mol_id, limit)
+        finally:
+            self._release_archive(archive)
+        return [Result(**record) for record in records]
+
+    async def get_results(
+        self,
+        job: JobInternal,
+        start_mol_id: Optional[int] = None,
+        end_mol_id: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Result]:
+        if not job.results_archived:
+            return await self.repository.get_results_by_job_id(
+                job.id, start_mol_id, end_mol_id, limit
+            )
+
+        return await run_in_threadpool(self._read_archive, job.id, start_mol_id, end_mol_id, limit)
+
+    async def iter_results(
+        self,
+        job: JobInternal,
+        start_mol_id: Optional[int] = None,
+        end_mol_id: Optional[int] = None,
+    ) -> AsyncIterable[Result]:
+        if not job.results_archived:
+            async for result in self.repository.iter_results_by_job_id(
+                job.id, start_mol_id, end_mol_id
+            ):
+                yield result
+            return
+
+        # read one row group at a time
+        archive = await run_in_threadpool(self._acquire_archive, job.id)
+        try:
+            row_groups = archive.iter_row_groups(start_mol_id, end_mol_id)
+            while True:
+                records = await run_in_threadpool(next, row_groups, None)
+                if records is None:
+                    break
+                for record in records:
+                    yield Result(**record)
+        finally:
+            self._release_archive(archive)
+
+    @staticmethod
+    def is_complete(job: JobInternal) -> bool:
+        # all checkpoints were processed (see SaveResultCheckpointToDb) and all results were saved
+        # (see SaveResultToDb)
+        return (
+            job.num_checkpoints_total is not None
+            and len(set(job.checkpoints_processed)) == job.num_checkpoints_total
+            and job.num_entries_total is not None
+            and CompressedSet(job.entries_processed).count() == job.num_entries_total
+        )
+
+    async def archive_results(self, job: JobInternal) -> bool:
+        # Writes all results of a complete job into its archive and deletes them from the
+        # database. Returns True if the results were archived (and False if the job is not complete
+        # yet or was archived already).
+        if job.results_archived or job.id in self._archiving or not self.is_complete(job):
+            return False
+
+        self._archiving.add(job.id)
+        try:
+            return await self._archive_results(job)
+        finally:
+            self._archiving.discard(job.id)
+
+    def archive_results_later(self, job: JobInternal, background_tasks: BackgroundTasks) -> None:
+        # Archiving reads and rewrites all results of a job, which must not delay the consumer
+        # that completed the job (see SaveResultToDb and SaveResultCheckpointToDb).
+        if job.results_archived or job.id in self._archiving or not self.is_complete(job):
+            return
+
+        # the job is marked right away, so that it is not scheduled twice
+        self._archiving.add(job.id)
+
+        async def archive():
+            try:
+                await self._archive_results(job)
+            finally:
+                self._archiving.discard(job.id)
+
+        background_tasks.start(archive(), f"archive results of job {job.id}")
+
+    async def _archive_results(self, job: JobInternal) -> bool:
+        writer = await run_in_threadpool(
+            ResultArchiveWriter,
+            self.get_archive_path(job.id),
+            self.row_group_size,
+            self.compress_level,
+            # a page of results is read from a single row group
+            job.page_size,
+        )
+        try:
+            num_molecules = 0
+            last_mol_id = None
+            batch = []
+            async for result in self.repository.iter_results_by_job_id(job.id):
+                if result.mol_id != last_mol_id:
+                    num_molecules += 1
+                    last_mol_id = result.mol_id
+                batch.append(result.model_dump())
+                if len(batch) >= self.row_group_size:
+                    await run_in_threadpool(writer.write, batch)
+                    batch = []
+            await run_in_threadpool(writer.write, batch)
+
+            # another process might have archived (and deleted) the results in the meantime
+            if num_molecules != job.num_entries_total:
+                logger.warning(
+                    f"Could not archive results of job {job.id}: found results of "
+                    f"{num_molecules} of {job.num_entries_total} molecules"
+                )
+                await run_in_threadpool(writer.abort)
+                return False
+
+            num_bytes = await run_in_threadpool(writer.close)
+        except BaseException:
+            await run_in_threadpool(writer.abort)
+            raise
+
+        # from now on, results are read from the archive
+        await self.repository.update_job(JobUpdate(id=job.id, results_archived=True))
+
+        # delete in batches to keep each query (and the lock in MemoryRepository) short
+        num_deleted = self.batch_size
+        while num_deleted >= self.batch_size:
+            num_deleted = await self.repository.delete_results_by_job_id(
+                job.id, limit=self.batch_size
+            )
+
+        logger.info(f"Archived results of job {job.id} ({num_bytes} bytes)")
+        return True
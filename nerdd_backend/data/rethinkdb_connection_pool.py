@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+
+from rethinkdb import RethinkDB
+from rethinkdb.errors import ReqlDriverError
+
+__all__ = ["RethinkDbConnectionPool"]
+
+logger = logging.getLogger(__name__)
+
+
+class RethinkDbConnectionPool:
+    # Connections for request/response queries are checked out exclusively (at most max_size at
+    # the same time). Changefeeds are long-lived and would block pooled connections for a long
+    # time. Therefore, they use a separate, fixed set of connections that are shared by all feeds
+    # (the driver multiplexes queries on a connection). Streams (e.g. exports) last as long as the
+    # client downloads, so they get their own set of shared connections, too (at most max_streams
+    # at the same time), and slow clients never starve request/response queries.
+    def __init__(
+        self,
+        r: RethinkDB,
+        host: str,
+        port: int,
+        database_name: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        num_changefeed_connections: int = 1,
+        num_stream_connections: int = 1,
+        max_streams: int = 100,
+        connect_retries: int = 5,
+        reconnect_delay_seconds: float = 0.5,
+        max_reconnect_delay_seconds: float = 10,
+    ) -> None:
+        assert 0 <= min_size <= max_size and max_size > 0
+        assert num_changefeed_connections > 0
+        assert num_stream_connections > 0 and max_streams > 0
+
+        self.r = r
+        self.host = host
+        self.port = port
+        self.database_name = database_name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.num_changefeed_connections = num_changefeed_connections
+        self.num_stream_connections = num_stream_connections
+        self.max_streams = max_streams
+        self.connect_retries = connect_retries
+        self.reconnect_delay_seconds = reconnect_delay_seconds
+        self.max_reconnect_delay_seconds = max_reconnect_delay_seconds
+
+    async def initialize(self) -> None:
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(self.max_size)
+
+        for _ in range(self.min_size):
+            self._idle.put_nowait(await self._connect())
+
+        self._changefeed_connections: List = [
+            await self._connect() for _ in range(self.num_changefeed_connections)
+        ]
+        self._next_changefeed_connection = 0
+
+        self._stream_connections: List = [
+            await self._connect() for _ in range(self.num_stream_connections)
+        ]
+        self._next_stream_connection = 0
+        self._stream_semaphore = asyncio.Semaphore(self.max_streams)
+
+    async def close(self) -> None:
+        while not self._idle.empty():
+            await self._idle.get_nowait().close(noreply_wait=False)
+        for connection in [*self._changefeed_connections, *self._stream_connections]:
+            await connection.close(noreply_wait=False)
+
+    async def _connect(self):
+        delay = self.reconnect_delay_seconds
+        for attempt in range(self.connect_retries + 1):
+            try:
+                return await self.r.connect(self.host, self.port, db=self.database_name)
+            except ReqlDriverError as e:
+                if attempt == self.connect_retries:
+                    raise
+                logger.warning(
+                    f"Could not connect to RethinkDB at {self.host}:{self.port} ({e}). "
+                    f"Retrying in {delay} seconds."
+                )
+                await asyncio.sleep(delay)
+                delay = min(2 * delay, self.max_reconnect_delay_seconds)
+
+    async def _ensure_open(self, connection):
+        # health check: replace connections that were closed (e.g. after a network error)
+        if connection.is_open():
+            return connection
+
+        logger.info("Replacing closed RethinkDB connection")
+        return await self._connect()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator:
+        async with self._semaphore:
+            # the semaphore guarantees that at most max_size connections are open
+            if self._idle.empty():
+                connection = await self._connect()
+            else:
+                connection = await self._ensure_open(self._idle.get_nowait())
+
+            try:
+                yield connection
+            finally:
+                # broken connections are dropped (and replaced on demand)
+                if connection.is_open():
+                    self._idle.put_nowait(connection)
+
+    async def acquire_changefeed_connection(self):
+        # distribute changefeeds over the dedicated connections (round robin)
+        i = self._next_changefeed_connection
+        self._next_changefeed_connection = (i + 1) % len(self._changefeed_connections)
+
+        connection = await self._ensure_open(self._changefeed_connections[i])
+        self._changefeed_connections[i] = connection
+        return connection
+
+    @asynccontextmanager
+    async def acquire_stream_connection(self) -> AsyncIterator:
+        async with self._stream_semaphore:
+            # distribute streams over the dedicated connections (round robin)
+            i = self._next_stream_connection
+            self._next_stream_connection = (i + 1) % len(self._stream_connections)
+
+            connection = await self._ensure_open(self._stream_connections[i])
+            self._stream_connections[i] = connection
+            yield connection
@@ -1,11 +1,14 @@
 import hashlib
 import json
 import logging
+import time
 from datetime import datetime
 from typing import Any, AsyncIterable, Dict, List, Optional, Tuple
 
 from rethinkdb import RethinkDB
+from rethinkdb.ast import RqlQuery
 from rethinkdb.errors import ReqlOpFailedError
+from rethinkdb.net import Cursor
 
 from ..models import (
     AnonymousUser,
@@ -18,10 +21,12 @@ from ..models import (
     Source,
     User,
     UserType,
+    UserUsage,
 )
 from ..util import CompressedSet
 from .exceptions import RecordAlreadyExistsError, RecordNotFoundError
 from .repository import Repository
+from .rethinkdb_connection_pool import RethinkDbConnectionPool
 
 __all__ = ["RethinkDbRepository"]
 
@@ -29,7 +34,7 @@ logger = logging.getLogger(__name__)
 
 
 class RethinkDbRepository(Repository):
-    def __init__(self, host: str, port: int, database_name: str) -> None:
+    def __init__(self, host: str, port: int, database_name: str, **pool_options: Any) -> None:
         self.r = RethinkDB()
         self.r.set_loop_type("asyncio")
 
@@ -37,22 +42,24 @@ class RethinkDbRepository(Repository):
         self.port = port
         self.database_name = database_name
 
+        # pool_options are passed to RethinkDbConnectionPool (min_size, max_size, ...)
+        self.pool = RethinkDbConnectionPool(self.r, host, port, database_name, **pool_options)
+
     #
     # INITIALIZATION
     #
     async def initialize(self) -> None:
-        self.connection = await self.r.connect(self.host, self.port)
+        # Note: all connections use the database self.database_name (even if it does not exist
+        # yet)
+        await self.pool.initialize()
 
         # create database
         try:
-            await self.r.db_create(self.database_name).run(self.connection)
+            await self.run(self.r.db_create(self.database_name))
         except ReqlOpFailedError as e:
             if not str(e).startswith("Database `nerdd` already exists"):
                 logger.exception("Failed to create database", exc_info=e)
 
-        # use the same database for all queries
-        self.connection.use(self.database_name)
-
         # create tables
         await self.create_module_table()
         await self.create_sources_table()
@@ -60,33 +67,101 @@ class RethinkDbRepository(Repository):
         await self.create_results_table()
         await self.create_users_table()
         await self.create_challenges_table()
+        await self.create_user_usage_table()
 
         # create an index on job_id in results table
-        try:
-            await self.r.table("results").index_create("job_id").run(self.connection)
+        await self.create_index("results", "job_id")
 
-            # wait for index to be ready
-            await self.r.table("results").index_wait("job_id").run(self.connection)
-        except ReqlOpFailedError as e:
-            if not str(e).startswith("Index `job_id` already exists"):
-                logger.exception("Failed to create index", exc_info=e)
+        # create a compound index on (job_id, mol_id) in results table
+        # (used to read a range of results of a job ordered by mol_id)
+        await self.create_index(
+            "results", "job_id_mol_id", [self.r.row["job_id"], self.r.row["mol_id"]]
+        )
 
         # create an index on ip_address in anonymous_users table
+        await self.create_index("users", "ip_address")
+
+        # create a compound index on (user_id, created_at) in jobs table
+        # (used to find the recent jobs of a user when checking the quota)
+        await self.create_index(
+            "jobs", "user_id_created_at", [self.r.row["user_id"], self.r.row["created_at"]]
+        )
+
+        # create an index on reuse_key in jobs table (used to find jobs with identical results)
+        await self.create_index("jobs", "reuse_key")
+
+        # create indexes on status and created_at in jobs table
+        # (used to find deleted jobs and to delete old jobs in bulk)
+        await self.create_index("jobs", "status")
+        await self.create_index("jobs", "created_at")
+
+        # create a compound index on (job_type, created_at) in jobs table
+        # (used to find expired jobs of a module)
+        await self.create_index(
+            "jobs", "job_type_created_at", [self.r.row["job_type"], self.r.row["created_at"]]
+        )
+
+        # create indexes on salt and expires_at in challenges table
+        await self.create_index("challenges", "salt")
+        await self.create_index("challenges", "expires_at")
+
+        # create a compound index on (user_id, bucket) in user_usage table
+        await self.create_index(
+            "user_usage", "user_id_bucket", [self.r.row["user_id"], self.r.row["bucket"]]
+        )
+        await self.create_index("user_usage", "bucket")
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    async def create_index(self, table: str, index: str, *args: Any) -> None:
         try:
-            await self.r.table("users").index_create("ip_address").run(self.connection)
-            # wait for index to be ready
-            await self.r.table("users").index_wait("ip_address").run(self.connection)
+            await self.run(self.r.table(table).index_create(index, *args))
         except ReqlOpFailedError as e:
-            if not str(e).startswith("Index `ip_address` already exists"):
+            if not str(e).startswith(f"Index `{index}` already exists"):
                 logger.exception("Failed to create index", exc_info=e)
 
+        # wait for index to be ready
+        await self.run(self.r.table(table).index_wait(index))
+
+    async def run(self, query: RqlQuery) -> Any:
+        # run a request/response query on a pooled connection
+        # Note: cursors are consumed completely before the connection is returned to the pool.
+        async with self.pool.acquire() as connection:
+            result = await query.run(connection)
+            if isinstance(result, Cursor):
+                result = [item async for item in result]
+            return result
+
+    async def run_stream(self, query: RqlQuery) -> AsyncIterable[Any]:
+        # run a query and iterate over its cursor lazily (the server sends the items in batches)
+        # Note: streams share dedicated connections, because the iteration lasts as long as the
+        # consumer (e.g. a client downloading an export) needs.
+        async with self.pool.acquire_stream_connection() as connection:
+            cursor = await query.run(connection)
+            try:
+                async for item in cursor:
+                    yield item
+            finally:
+                await cursor.close()
+
+    async def run_changefeed(self, query: RqlQuery) -> AsyncIterable[Dict[str, Any]]:
+        # run a (long-lived) changefeed query on one of the dedicated changefeed connections
+        connection = await self.pool.acquire_changefeed_connection()
+        cursor = await query.run(connection)
+        try:
+            async for change in cursor:
+                yield change
+        finally:
+            await cursor.close()
+
     #
     # MODULES
     #
     async def get_module_changes(
         self,
     ) -> AsyncIterable[Tuple[Optional[Module], Optional[Module]]]:
-        cursor = await self.r.table("modules").changes(include_initial=True).run(self.connection)
+        cursor = self.run_changefeed(self.r.table("modules").changes(include_initial=True))
 
         async for change in cursor:
             if "old_val" not in change or change["old_val"] is None:
@@ -102,11 +177,11 @@ class RethinkDbRepository(Repository):
             yield old_module, new_module
 
     async def get_all_modules(self) -> List[Module]:
-        cursor = await self.r.table("modules").run(self.connection)
-        return [Module(**item) async for item in cursor]
+        cursor = await self.run(self.r.table("modules"))
+        return [Module(**item) for item in cursor]
 
     async def get_module_by_id(self, module_id: str) -> Module:
-        result = await self.r.table("modules").get(module_id).run(self.connection)
+        result = await self.run(self.r.table("modules").get(module_id))
 
         if result is None:
             raise RecordNotFoundError(Module, module_id)
@@ -115,7 +190,7 @@ class RethinkDbRepository(Repository):
 
     async def create_module_table(self) -> None:
         try:
-            await self.r.table_create("modules", primary_key="id").run(self.connection)
+            await self.run(self.r.table_create("modules", primary_key="id"))
         except ReqlOpFailedError:
             pass
 
@@ -133,10 +208,10 @@ class RethinkDbRepository(Repository):
     #     return Module(**result)
 
     async def create_module(self, module: Module) -> Module:
-        result = await (
-            self.r.table("modules")
-            .insert(module.model_dump(), conflict="error", return_changes=True)
-            .run(self.connection)
+        result = await self.run(
+            self.r.table("modules").insert(
+                module.model_dump(), conflict="error", return_changes=True
+            )
         )
 
         if len(result["changes"]) == 0:
@@ -145,11 +220,8 @@ class RethinkDbRepository(Repository):
         return Module(**result["changes"][0]["new_val"])
 
     async def update_module(self, module: Module) -> Module:
-        result = await (
-            self.r.table("modules")
-            .get(module.id)
-            .update(module.model_dump(), return_changes=True)
-            .run(self.connection)
+        result = await self.run(
+            self.r.table("modules").get(module.id).update(module.model_dump(), return_changes=True)
         )
 
         if result["skipped"] == 1:
@@ -163,11 +235,8 @@ class RethinkDbRepository(Repository):
     async def get_job_changes(
         self, job_id: str
     ) -> AsyncIterable[Tuple[Optional[JobInternal], Optional[JobInternal]]]:
-        cursor = (
-            await self.r.table("jobs")
-            .get(job_id)
-            .changes(include_initial=False)
-            .run(self.connection)
+        cursor = self.run_changefeed(
+            self.r.table("jobs").get(job_id).changes(include_initial=False)
         )
 
         async for change in cursor:
@@ -185,88 +254,59 @@ class RethinkDbRepository(Repository):
 
     async def create_jobs_table(self) -> None:
         try:
-            await self.r.table_create("jobs", primary_key="id").run(self.connection)
+            await self.run(self.r.table_create("jobs", primary_key="id"))
         except ReqlOpFailedError:
             pass
 
     async def create_job(self, job: JobInternal) -> JobInternal:
-        result = await (
-            self.r.table("jobs")
-            .insert(job.model_dump(), conflict="error", return_changes=True)
-            .run(self.connection)
+        result = await self.run(
+            self.r.table("jobs").insert(job.model_dump(), conflict="error", return_changes=True)
         )
         return JobInternal(**result["changes"][0]["new_val"])
 
     async def update_job(self, job_update: JobUpdate) -> JobInternal:
-        # all fields (except entries_processed) can be updated in a single query
+        # The field entries_processed is tricky: it contains a sorted list of disjoint intervals
+        # [start, end) and has to be updated atomically, because several consumers might write
+        # results of the same job at the same time. We compress the new entries into intervals
+        # and merge them with the stored intervals on the server (see _merge_intervals). This way,
+        # each update is a single query, no matter how many consumers update the same job.
+        new_intervals = None
+        if job_update.entries_processed is not None or job_update.intervals_processed is not None:
+            # Note: intervals_processed are merged as they are (without expanding them)
+            new_entries = CompressedSet(job_update.intervals_processed)
+            if job_update.entries_processed is not None:
+                new_entries.update(job_update.entries_processed)
+            new_intervals = new_entries.to_intervals()
+
+        # all fields can be updated in a single query
         # --> prepare an object with all fields that should be updated
-        update_set = {}
-        if job_update.status is not None:
-            update_set["status"] = job_update.status
-        if job_update.num_entries_total is not None:
-            update_set["num_entries_total"] = job_update.num_entries_total
-        if job_update.num_checkpoints_total is not None:
-            update_set["num_checkpoints_total"] = job_update.num_checkpoints_total
-        if job_update.new_checkpoints_processed is not None:
-            update_set["checkpoints_processed"] = self.r.row["checkpoints_processed"].set_union(
-                job_update.new_checkpoints_processed
-            )
-        if job_update.new_output_formats is not None:
-            update_set["output_formats"] = self.r.row["output_formats"].set_union(
-                job_update.new_output_formats
-            )
-
-        if job_update.entries_processed is None:
-            changes = (
-                await self.r.table("jobs")
-                .get(job_update.id)
-                .update(update_set, return_changes=True)
-                .run(self.connection)
-            )
-        else:
-            # The field entries_processed is tricky: we need to update the slightly complex data
-            # structure containing the processed entries in a way that is atomic.
-            while True:
-                # get old value
-                old_job = (
-                    await self.r.table("jobs")
-                    .get(job_update.id)
-                    .pluck("entries_processed")
-                    .run(self.connection)
+        def update_set(job):
+            result = {}
+            if job_update.status is not None:
+                result["status"] = job_update.status
+            if new_intervals is not None:
+                result["entries_processed"] = self._merge_intervals(
+                    job["entries_processed"], new_intervals
                 )
-                old_intervals = old_job["entries_processed"]
-
-                # update the old value
-                compressed_set = CompressedSet(intervals=old_intervals)
-                for entry in job_update.entries_processed:
-                    compressed_set.add(entry)
-                new_intervals = compressed_set.to_intervals()
-
-                if old_intervals == new_intervals:
-                    changes = {"unchanged": 1}
-                    break
-
-                # this is the important part: before updating we check if the value has changed
-                # * if yes: start over
-                # * if no: update the value
-                changes = (
-                    await self.r.table("jobs")
-                    .get(job_update.id)
-                    .update(
-                        lambda record: self.r.branch(
-                            record["entries_processed"] == old_intervals,
-                            # update:
-                            {**update_set, "entries_processed": new_intervals},
-                            # do not update:
-                            {},
-                        ),
-                        return_changes=True,
-                    )
-                    .run(self.connection)
+            if job_update.num_entries_total is not None:
+                result["num_entries_total"] = job_update.num_entries_total
+            if job_update.num_checkpoints_total is not None:
+                result["num_checkpoints_total"] = job_update.num_checkpoints_total
+            if job_update.new_checkpoints_processed is not None:
+                result["checkpoints_processed"] = job["checkpoints_processed"].set_union(
+                    job_update.new_checkpoints_processed
+                )
+            if job_update.new_output_formats is not None:
+                result["output_formats"] = job["output_formats"].set_union(
+                    job_update.new_output_formats
                 )
+            if job_update.results_archived is not None:
+                result["results_archived"] = job_update.results_archived
+            return result
 
-                if changes["replaced"] > 0:
-                    break
+        changes = await self.run(
+            self.r.table("jobs").get(job_update.id).update(update_set, return_changes=True)
+        )
 
         if changes["unchanged"] == 1:
             return None
@@ -276,31 +316,183 @@ class RethinkDbRepository(Repository):
 
         return JobInternal(**changes["changes"][0]["new_val"])
 
+    async def update_job_size(
+        self, job_id: str, num_entries_total: int, num_checkpoints_total: int
+    ) -> JobInternal:
+        # the old job tells (atomically) whether the size was unknown before this update
+        changes = await self.run(
+            self.r.table("jobs")
+            .get(job_id)
+            .update(
+                lambda job: self.r.branch(
+                    job["status"] != "deleted",
+                    {
+                        "num_entries_total": num_entries_total,
+                        "num_checkpoints_total": num_checkpoints_total,
+                    },
+                    {},
+                ),
+                return_changes="always",
+            )
+        )
+
+        if len(changes["changes"]) == 0 or changes["changes"][0]["old_val"] is None:
+            raise RecordNotFoundError(Job, job_id)
+
+        # Note: deleted jobs were released by mark_job_deleted already
+        old_job = JobInternal(**changes["changes"][0]["old_val"])
+        if old_job.status == "deleted":
+            raise RecordNotFoundError(Job, job_id)
+
+        if old_job.num_entries_total is None and old_job.user_id is not None:
+            await self.add_user_usage(
+                old_job.user_id,
+                old_job.created_at,
+                num_fresh_jobs=-1,
+                num_entries=num_entries_total,
+            )
+
+        return JobInternal(**changes["changes"][0]["new_val"])
+
+    def _merge_intervals(self, intervals, new_intervals: List[Tuple[int, int]]):
+        # ReQL expression computing the union of two lists of intervals. Each new interval is
+        # merged into the stored (sorted and disjoint) list on its own: the intervals before and
+        # after it are kept as they are and the ones overlapping or touching it are replaced by
+        # their union. This way, an update takes a few linear passes over the stored list per new
+        # interval (instead of rebuilding the whole list interval by interval).
+        def merge(start, end):
+            # Note: the function passed to do must only take the ReQL argument (the driver
+            # inspects its parameters)
+            return lambda current: merge_interval(current, start, end)
+
+        def merge_interval(current, start, end):
+            overlapping = current.filter(
+                lambda interval: (interval.nth(1) >= start) & (interval.nth(0) <= end)
+            )
+            merged = [
+                self.r.expr([start]).add(overlapping.map(lambda interval: interval.nth(0))).min(),
+                self.r.expr([end]).add(overlapping.map(lambda interval: interval.nth(1))).max(),
+            ]
+            return (
+                current.filter(lambda interval: interval.nth(1) < start)
+                .add([merged])
+                .add(current.filter(lambda interval: interval.nth(0) > end))
+            )
+
+        result = intervals.default([])
+        for start, end in new_intervals:
+            result = result.do(merge(start, end))
+        return result
+
     async def get_job_by_id(self, job_id: str) -> JobInternal:
-        result = await self.r.table("jobs").get(job_id).run(self.connection)
+        result = await self.run(self.r.table("jobs").get(job_id))
 
-        if result is None:
+        # jobs marked as deleted are only visible to the JobReaperLifespan
+        if result is None or result["status"] == "deleted":
             raise RecordNotFoundError(Job, job_id)
 
         return JobInternal(**result)
 
     async def delete_job_by_id(self, job_id: str) -> None:
-        await self.r.table("jobs").get(job_id).delete().run(self.connection)
+        await self.run(self.r.table("jobs").get(job_id).delete())
+
+    async def mark_job_deleted(self, job_id: str) -> JobInternal:
+        changes = await self.run(
+            self.r.table("jobs")
+            .get(job_id)
+            .update(
+                lambda job: self.r.branch(job["status"] != "deleted", {"status": "deleted"}, {}),
+                return_changes=True,
+            )
+        )
+
+        if len(changes["changes"]) == 0:
+            raise RecordNotFoundError(Job, job_id)
+
+        # the status changed in this query, so the job is released exactly once
+        await self._release_fresh_job(JobInternal(**changes["changes"][0]["old_val"]))
+
+        return JobInternal(**changes["changes"][0]["new_val"])
+
+    async def mark_jobs_deleted(self, created_before: datetime) -> int:
+        jobs = (
+            self.r.table("jobs")
+            .between(self.r.minval, created_before, index="created_at")
+            .filter(lambda job: job["status"] != "deleted")
+        )
+
+        # Jobs with unknown size are released one by one (see mark_job_deleted). There are only
+        # a few of them and no new ones show up, because the range only contains past jobs.
+        fresh_job_ids = await self.run(
+            jobs.filter(lambda job: job["num_entries_total"].default(None).eq(None))["id"]
+        )
+        num_jobs = 0
+        for job_id in fresh_job_ids:
+            try:
+                await self.mark_job_deleted(job_id)
+                num_jobs += 1
+            except RecordNotFoundError:
+                # deleted concurrently
+                pass
+
+        # all other jobs are marked in a single bulk update on the range of the created_at index
+        result = await self.run(jobs.update({"status": "deleted"}))
+        return num_jobs + result["replaced"]
+
+    async def _release_fresh_job(self, job: JobInternal) -> None:
+        if job.num_entries_total is None and job.user_id is not None:
+            await self.add_user_usage(job.user_id, job.created_at, num_fresh_jobs=-1)
+
+    async def get_deleted_jobs(self, limit: int) -> List[JobInternal]:
+        cursor = await self.run(
+            self.r.table("jobs").get_all("deleted", index="status").limit(limit)
+        )
+        return [JobInternal(**item) for item in cursor]
+
+    async def get_jobs_created_before(
+        self,
+        created_before: datetime,
+        job_type: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[JobInternal]:
+        if job_type is None:
+            query = self.r.table("jobs").between(self.r.minval, created_before, index="created_at")
+            index = "created_at"
+        else:
+            query = self.r.table("jobs").between(
+                [job_type, self.r.minval], [job_type, created_before], index="job_type_created_at"
+            )
+            index = "job_type_created_at"
+
+        query = query.order_by(index=index).filter(lambda job: job["status"] != "deleted")
+        if limit is not None:
+            query = query.limit(limit)
+
+        cursor = await self.run(query)
+        return [JobInternal(**item) for item in cursor]
+
+    async def get_jobs_by_reuse_key(self, reuse_key: str) -> List[JobInternal]:
+        cursor = await self.run(
+            self.r.table("jobs")
+            .get_all(reuse_key, index="reuse_key")
+            .filter(lambda job: job["status"] != "deleted")
+        )
+        return [JobInternal(**item) for item in cursor]
 
     #
     # SOURCES
     #
     async def create_sources_table(self) -> None:
         try:
-            await self.r.table_create("sources", primary_key="id").run(self.connection)
+            await self.run(self.r.table_create("sources", primary_key="id"))
         except ReqlOpFailedError:
             pass
 
     async def create_source(self, source: Source) -> Source:
-        result = await (
-            self.r.table("sources")
-            .insert(source.model_dump(), conflict="error", return_changes=True)
-            .run(self.connection)
+        result = await self.run(
+            self.r.table("sources").insert(
+                source.model_dump(), conflict="error", return_changes=True
+            )
         )
 
         if len(result["changes"]) == 0:
@@ -309,7 +501,7 @@ class RethinkDbRepository(Repository):
         return Source(**result["changes"][0]["new_val"])
 
     async def get_source_by_id(self, source_id: str) -> Source:
-        result = await self.r.table("sources").get(source_id).run(self.connection)
+        result = await self.run(self.r.table("sources").get(source_id))
 
         if result is None:
             raise RecordNotFoundError(Source, source_id)
@@ -317,29 +509,91 @@ class RethinkDbRepository(Repository):
         return Source(**result)
 
     async def delete_source_by_id(self, source_id: str) -> None:
-        await self.r.table("sources").get(source_id).delete().run(self.connection)
+        await self.run(self.r.table("sources").get(source_id).delete())
+
+    async def add_source_reference(self, source_id: str, owner: str) -> Source:
+        result = await self.run(
+            self.r.table("sources")
+            .get(source_id)
+            .update(
+                lambda source: {"references": source["references"].default([]).set_insert(owner)},
+                return_changes="always",
+            )
+        )
+
+        if result["skipped"] == 1:
+            raise RecordNotFoundError(Source, source_id)
+
+        return Source(**result["changes"][0]["new_val"])
+
+    async def release_source(self, source_id: str, owner: str) -> bool:
+        # replacing a document with None deletes it (and a missing document is skipped)
+        def release(source):
+            references = source["references"].default([])
+            return self.r.branch(
+                source.eq(None),
+                None,
+                references.contains(owner).not_(),
+                source,
+                references.difference([owner]).is_empty(),
+                None,
+                source.merge({"references": references.difference([owner])}),
+            )
+
+        result = await self.run(self.r.table("sources").get(source_id).replace(release))
+
+        if result["skipped"] == 1:
+            raise RecordNotFoundError(Source, source_id)
+
+        return result["deleted"] == 1
 
     #
     # RESULTS
     #
     async def create_results_table(self) -> None:
         try:
-            await self.r.table_create("results", primary_key="id").run(self.connection)
+            await self.run(self.r.table_create("results", primary_key="id"))
         except ReqlOpFailedError:
             pass
 
     async def get_all_results_by_job_id(self, job_id: str) -> List[Result]:
-        cursor = await self.r.table("results").get_all(job_id, index="job_id").run(self.connection)
-        return [Result(**item) async for item in cursor]
+        cursor = await self.run(self.r.table("results").get_all(job_id, index="job_id"))
+        return [Result(**item) for item in cursor]
+
+    async def delete_results_by_job_id(self, job_id: str, limit: Optional[int] = None) -> int:
+        query = self.r.table("results").get_all(job_id, index="job_id")
+        if limit is not None:
+            query = query.limit(limit)
+
+        # Note: soft durability is fine here, because the reaper retries until no result is left
+        result = await self.run(query.delete(durability="soft"))
+        return result["deleted"]
+
+    async def count_results_by_job_id(self, job_id: str) -> int:
+        return await self.run(self.r.table("results").get_all(job_id, index="job_id").count())
 
     async def get_num_processed_entries_by_job_id(self, job_id: str) -> int:
-        return (
-            await self.r.table("results")
+        return await self.run(
+            self.r.table("results")
             .get_all(job_id, index="job_id")
             .pluck("mol_id")
             .distinct()
             .count()
-            .run(self.connection)
+        )
+
+    def _results_between(
+        self,
+        job_id: str,
+        start_mol_id: Optional[int] = None,
+        end_mol_id: Optional[int] = None,
+    ):
+        # range scan on the compound index (job_id, mol_id) that reads only the requested results
+        # (instead of all results of the job)
+        return self.r.table("results").between(
+            [job_id, start_mol_id if start_mol_id is not None else self.r.minval],
+            [job_id, end_mol_id if end_mol_id is not None else self.r.maxval],
+            index="job_id_mol_id",
+            right_bound="closed",
         )
 
     async def get_results_by_job_id(
@@ -347,50 +601,93 @@ class RethinkDbRepository(Repository):
         job_id: str,
         start_mol_id: Optional[int] = None,
         end_mol_id: Optional[int] = None,
+        limit: Optional[int] = None,
     ) -> List[Result]:
-        start_condition = (
-            (self.r.row["mol_id"] >= start_mol_id) if start_mol_id is not None else True
+        query = self._results_between(job_id, start_mol_id, end_mol_id).order_by(
+            index="job_id_mol_id"
         )
-        end_condition = (self.r.row["mol_id"] <= end_mol_id) if end_mol_id is not None else True
+        if limit is not None:
+            query = query.limit(limit)
 
-        cursor = (
-            await self.r.table("results")
-            .get_all(job_id, index="job_id")
-            .filter(start_condition & end_condition)
-            .order_by("mol_id")
-            .run(self.connection)
-        )
+        cursor = await self.run(query)
 
         if cursor is None:
             raise RecordNotFoundError(Result, job_id)
 
         return [Result(**item) for item in cursor]
 
+    async def iter_results_by_job_id(
+        self,
+        job_id: str,
+        start_mol_id: Optional[int] = None,
+        end_mol_id: Optional[int] = None,
+    ) -> AsyncIterable[Result]:
+        cursor = self.run_stream(
+            self._results_between(job_id, start_mol_id, end_mol_id).order_by(index="job_id_mol_id")
+        )
+
+        async for item in cursor:
+            yield Result(**item)
+
     async def create_result(self, result: Result) -> Result:
         # TODO: return result
-        await (
+        await self.run(self.r.table("results").insert(result.model_dump(), conflict="error"))
+
+    async def create_results(self, results: List[Result]) -> List[Result]:
+        # A batch might contain a result twice (e.g. a message that was delivered twice). Only the
+        # first one is inserted (as in MemoryRepository), because failed documents are matched by
+        # their id below.
+        unique_results: Dict[str, Result] = {}
+        for result in results:
+            if result.id in unique_results:
+                logger.warning(f"Could not insert result {result.id}: duplicate primary key")
+                continue
+            unique_results[result.id] = result
+        results = list(unique_results.values())
+
+        if len(results) == 0:
+            return []
+
+        # Insert all documents in a single query. With return_changes="always", RethinkDB reports
+        # a change for every document (including the ones that could not be inserted), but not
+        # necessarily in the order of the input list. Only the ids of failed documents are sent
+        # back (instead of all inserted documents).
+        failed = await self.run(
             self.r.table("results")
-            .insert(result.model_dump(), conflict="error")
-            .run(self.connection)
+            .insert(
+                [result.model_dump() for result in results],
+                conflict="error",
+                return_changes="always",
+            )
+            .do(
+                lambda summary: (
+                    summary["changes"]
+                    .filter(lambda change: change.has_fields("error"))
+                    .map(
+                        lambda change: [
+                            change["new_val"].default(change["old_val"])["id"],
+                            change["error"],
+                        ]
+                    )
+                )
+            )
         )
 
+        failed_ids = set()
+        for result_id, error in failed:
+            logger.warning(f"Could not insert result {result_id}: {error}")
+            failed_ids.add(result_id)
+
+        return [result for result in results if result.id not in failed_ids]
+
     async def get_result_changes(
         self,
         job_id: str,
         start_mol_id: Optional[int] = None,
         end_mol_id: Optional[int] = None,
     ) -> AsyncIterable[Tuple[Optional[Result], Optional[Result]]]:
-        start_condition = (
-            (self.r.row["mol_id"] >= start_mol_id) if start_mol_id is not None else True
-        )
-        end_condition = (self.r.row["mol_id"] <= end_mol_id) if end_mol_id is not None else True
-
-        cursor = (
-            await self.r.table("results")
-            .get_all(job_id, index="job_id")
-            .filter(start_condition & end_condition)
-            .changes(include_initial=True)
-            .run(self.connection)
+        cursor = self.run_changefeed(
+            self._results_between(job_id, start_mol_id, end_mol_id).changes(include_initial=True)
         )
 
         async for change in cursor:
@@ -411,28 +708,26 @@ class RethinkDbRepository(Repository):
     #
     async def create_users_table(self) -> None:
         try:
-            await self.r.table_create("users", primary_key="id").run(self.connection)
+            await self.run(self.r.table_create("users", primary_key="id"))
         except ReqlOpFailedError:
             pass
 
     async def get_user_by_ip_address(self, ip_address: str) -> AnonymousUser:
-        result = (
-            await self.r.table("users")
-            .filter(lambda user: user["ip_address"] == ip_address)
-            .run(self.connection)
+        result = await self.run(
+            self.r.table("users").get_all(ip_address, index="ip_address").limit(1)
         )
 
         if result is None:
             raise RecordNotFoundError(AnonymousUser, ip_address)
 
-        users = [AnonymousUser(**item) async for item in result]
+        users = [AnonymousUser(**item) for item in result]
         if len(users) == 0:
             raise RecordNotFoundError(AnonymousUser, ip_address)
 
         return users[0]
 
     async def get_user_by_id(self, user_id: str) -> User:
-        result = await self.r.table("users").get(user_id).run(self.connection)
+        result = await self.run(self.r.table("users").get(user_id))
 
         if result is None:
             raise RecordNotFoundError(User, user_id)
@@ -443,10 +738,8 @@ class RethinkDbRepository(Repository):
             raise ValueError(f"Unknown user type: {result['user_type']}")
 
     async def create_user(self, user: User) -> User:
-        result = await (
-            self.r.table("users")
-            .insert(user.model_dump(), conflict="error", return_changes=True)
-            .run(self.connection)
+        result = await self.run(
+            self.r.table("users").insert(user.model_dump(), conflict="error", return_changes=True)
         )
 
         if len(result["changes"]) == 0:
@@ -455,32 +748,96 @@ class RethinkDbRepository(Repository):
         return user
 
     async def get_recent_jobs_by_user(self, user, num_seconds):
-        cursor = (
-            await self.r.table("jobs")
-            .filter(
-                lambda job: job["user_id"] == user.id
-                and job["created_at"] > self.r.now().sub(num_seconds)
+        cursor = await self.run(
+            self.r.table("jobs")
+            .between(
+                [user.id, self.r.now().sub(num_seconds)],
+                [user.id, self.r.maxval],
+                index="user_id_created_at",
+                left_bound="open",
             )
-            .order_by(self.r.desc("created_at"))
-            .run(self.connection)
+            .order_by(index=self.r.desc("user_id_created_at"))
         )
 
         return [JobInternal(**item) for item in cursor]
 
+    #
+    # USAGE (QUOTAS)
+    #
+    async def create_user_usage_table(self) -> None:
+        try:
+            await self.run(self.r.table_create("user_usage", primary_key="id"))
+        except ReqlOpFailedError:
+            pass
+
+    async def add_user_usage(
+        self,
+        user_id: str,
+        timestamp: datetime,
+        num_fresh_jobs: int = 0,
+        num_entries: int = 0,
+    ) -> None:
+        bucket = self._get_usage_bucket(timestamp.timestamp())
+
+        # insert a new bucket or add the numbers to the existing one (atomically on the server)
+        await self.run(
+            self.r.table("user_usage").insert(
+                {
+                    "id": f"{user_id}_{bucket}",
+                    "user_id": user_id,
+                    "bucket": bucket,
+                    "num_fresh_jobs": num_fresh_jobs,
+                    "num_entries": num_entries,
+                },
+                conflict=lambda id, old, new: old.merge(
+                    {
+                        "num_fresh_jobs": old["num_fresh_jobs"] + new["num_fresh_jobs"],
+                        "num_entries": old["num_entries"] + new["num_entries"],
+                    }
+                ),
+            )
+        )
+
+    async def get_user_usage(self, user_id: str, num_seconds: int) -> UserUsage:
+        # the window spans at most num_seconds / 3600 + 1 buckets
+        cursor = await self.run(
+            self.r.table("user_usage").between(
+                [user_id, self._get_usage_bucket(time.time() - num_seconds)],
+                [user_id, self.r.maxval],
+                index="user_id_bucket",
+            )
+        )
+
+        result = UserUsage()
+        for item in cursor:
+            result.num_fresh_jobs += item["num_fresh_jobs"]
+            result.num_entries += item["num_entries"]
+        return result
+
+    async def delete_user_usage(self, before: datetime, limit: Optional[int] = None) -> int:
+        # buckets before this one end before the given time
+        bucket = self._get_usage_bucket(before.timestamp())
+        query = self.r.table("user_usage").between(self.r.minval, bucket, index="bucket")
+        if limit is not None:
+            query = query.limit(limit)
+
+        result = await self.run(query.delete())
+        return result["deleted"]
+
     #
     # CHALLENGES
     #
     async def create_challenges_table(self) -> None:
         try:
-            await self.r.table_create("challenges", primary_key="id").run(self.connection)
+            await self.run(self.r.table_create("challenges", primary_key="id"))
         except ReqlOpFailedError:
             pass
 
     async def create_challenge(self, challenge: Challenge) -> Challenge:
-        result = await (
-            self.r.table("challenges")
-            .insert(challenge.model_dump(), conflict="error", return_changes=True)
-            .run(self.connection)
+        result = await self.run(
+            self.r.table("challenges").insert(
+                challenge.model_dump(), conflict="error", return_changes=True
+            )
         )
 
         if len(result["changes"]) == 0:
@@ -489,31 +846,42 @@ class RethinkDbRepository(Repository):
         return Challenge(**result["changes"][0]["new_val"])
 
     async def get_challenge_by_salt(self, salt: str) -> Challenge:
-        result = (
-            await self.r.table("challenges")
-            .filter(lambda challenge: challenge["salt"] == salt)
-            .run(self.connection)
-        )
+        result = await self.run(self.r.table("challenges").get_all(salt, index="salt").limit(1))
 
         if result is None:
             raise RecordNotFoundError(Challenge, salt)
 
-        challenges = [Challenge(**item) async for item in result]
+        challenges = [Challenge(**item) for item in result]
         if len(challenges) == 0:
             raise RecordNotFoundError(Challenge, salt)
 
         return challenges[0]
 
     async def delete_challenge_by_id(self, id: str) -> None:
-        result = await self.r.table("challenges").get(id).delete().run(self.connection)
+        result = await self.run(self.r.table("challenges").get(id).delete())
 
         if result["deleted"] == 0:
             raise RecordNotFoundError(Challenge, id)
 
-    async def delete_expired_challenges(self, deadline: datetime) -> None:
-        await (
+    async def delete_challenge_by_salt(self, salt: str, deadline: datetime) -> Challenge:
+        result = await self.run(
             self.r.table("challenges")
-            .filter(lambda challenge: challenge["expires_at"] < deadline)
-            .delete()
-            .run(self.connection)
+            .get_all(salt, index="salt")
+            .filter(lambda challenge: challenge["expires_at"] > deadline)
+            .delete(return_changes=True)
         )
+
+        if result["deleted"] == 0:
+            raise RecordNotFoundError(Challenge, salt)
+
+        return Challenge(**result["changes"][0]["old_val"])
+
+    async def delete_expired_challenges(
+        self, deadline: datetime, limit: Optional[int] = None
+    ) -> int:
+        query = self.r.table("challenges").between(self.r.minval, deadline, index="expires_at")
+        if limit is not None:
+            query = query.limit(limit)
+
+        result = await self.run(query.delete())
+        return result["deleted"]
@@ -1,2 +1,6 @@
 from .action_lifespan import *
 from .create_module_lifespan import *
+from .delete_expired_challenges_lifespan import *
+from .delete_old_user_usage_lifespan import *
+from .job_reaper_lifespan import *
+from .retention_lifespan import *
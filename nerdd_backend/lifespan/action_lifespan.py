@@ -1,5 +1,8 @@
+import functools
 import logging
+import time
 
+from ..actions import SaveResultToDb
 from .abstract_lifespan import AbstractLifespan
 
 __all__ = ["ActionLifespan"]
@@ -7,6 +10,63 @@ __all__ = ["ActionLifespan"]
 logger = logging.getLogger(__name__)
 
 
+def instrument_action(action, metrics):
+    # Counts and times all messages processed by the action. _process_message is replaced on the
+    # instance, because Action.run catches (and only logs) all errors.
+    labels = {"action": type(action).__name__, "group": action._get_group_name()}
+    messages = metrics.counter(
+        "nerdd_action_messages_total", "Number of messages processed by actions", labels.keys()
+    )
+    durations = metrics.histogram(
+        "nerdd_action_message_duration_seconds",
+        "Duration of processing a message in actions",
+        labels.keys(),
+    )
+    errors = metrics.counter(
+        "nerdd_action_errors_total",
+        "Number of messages that could not be processed by actions",
+        labels.keys(),
+    )
+    process_message = action._process_message
+
+    @functools.wraps(process_message)
+    async def wrapper(message):
+        start = time.perf_counter()
+        try:
+            await process_message(message)
+        except Exception:
+            errors.inc(**labels)
+            raise
+        finally:
+            messages.inc(**labels)
+            durations.observe(time.perf_counter() - start, **labels)
+
+    action._process_message = wrapper
+
+    # SaveResultToDb writes most batches outside of _process_message (e.g. after a timeout)
+    if isinstance(action, SaveResultToDb):
+        instrument_batch_writes(action, metrics, labels)
+
+
+def instrument_batch_writes(action, metrics, labels):
+    batch_durations = metrics.histogram(
+        "nerdd_result_batch_write_duration_seconds",
+        "Duration of writing a batch of results",
+        labels.keys(),
+    )
+    write = action._write
+
+    @functools.wraps(write)
+    async def wrapper(job_id, messages):
+        start = time.perf_counter()
+        try:
+            await write(job_id, messages)
+        finally:
+            batch_durations.observe(time.perf_counter() - start, **labels)
+
+    action._write = wrapper
+
+
 class ActionLifespan(AbstractLifespan):
     def __init__(self, action_creator):
         super().__init__()
@@ -14,6 +74,9 @@ class ActionLifespan(AbstractLifespan):
 
     async def start(self, app):
         self.action = self.action_creator(app)
+        metrics = getattr(app.state, "metrics", None)
+        if metrics is not None:
+            instrument_action(self.action, metrics)
         logger.info(f"Start action {self.action}")
 
     async def run(self):
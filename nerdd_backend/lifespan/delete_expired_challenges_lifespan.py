@@ -0,0 +1,41 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from .abstract_lifespan import AbstractLifespan
+
+__all__ = ["DeleteExpiredChallengesLifespan"]
+
+logger = logging.getLogger(__name__)
+
+
+class DeleteExpiredChallengesLifespan(AbstractLifespan):
+    def __init__(self, interval_seconds: float = 60, batch_size: int = 1000):
+        super().__init__()
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+
+    async def start(self, app):
+        self.app = app
+
+    async def run(self):
+        logger.info("Starting DeleteExpiredChallengesLifespan")
+        repository = self.app.state.repository
+
+        while True:
+            try:
+                # delete in batches to keep each query (and the lock in MemoryRepository) short
+                deadline = datetime.now(timezone.utc)
+                num_deleted = self.batch_size
+                while num_deleted >= self.batch_size:
+                    num_deleted = await repository.delete_expired_challenges(
+                        deadline, limit=self.batch_size
+                    )
+                    if num_deleted > 0:
+                        logger.info(f"Deleted {num_deleted} expired challenges")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(e)
+
+            await asyncio.sleep(self.interval_seconds)
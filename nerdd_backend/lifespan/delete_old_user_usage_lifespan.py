@@ -0,0 +1,47 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from .abstract_lifespan import AbstractLifespan
+
+__all__ = ["DeleteOldUserUsageLifespan"]
+
+logger = logging.getLogger(__name__)
+
+
+class DeleteOldUserUsageLifespan(AbstractLifespan):
+    # Usage buckets are only read within the quota window (see check_quota). Older buckets are
+    # deleted, because the user_usage table would grow forever otherwise.
+    def __init__(
+        self,
+        interval_seconds: float = 3600,
+        batch_size: int = 1000,
+        window_seconds: float = 24 * 60 * 60,
+    ):
+        super().__init__()
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.window_seconds = window_seconds
+
+    async def start(self, app):
+        self.app = app
+
+    async def run(self):
+        logger.info("Starting DeleteOldUserUsageLifespan")
+        repository = self.app.state.repository
+
+        while True:
+            try:
+                # delete in batches to keep each query (and the lock in MemoryRepository) short
+                before = datetime.now(timezone.utc) - timedelta(seconds=self.window_seconds)
+                num_deleted = self.batch_size
+                while num_deleted >= self.batch_size:
+                    num_deleted = await repository.delete_user_usage(before, limit=self.batch_size)
+                    if num_deleted > 0:
+                        logger.info(f"Deleted {num_deleted} old usage buckets")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(e)
+
+            await asyncio.sleep(self.interval_seconds)
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import os
+import shutil
+from typing import Dict, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from ..data import RecordNotFoundError
+from ..models import JobInternal
+from ..routers import release_source
+from ..util import get_disk_usage
+from .abstract_lifespan import AbstractLifespan
+
+__all__ = ["JobReaperLifespan"]
+
+logger = logging.getLogger(__name__)
+
+
+def _remove_dir(path: str) -> int:
+    num_bytes = get_disk_usage(path)
+    shutil.rmtree(path, ignore_errors=True)
+    return num_bytes
+
+
+class JobReaperLifespan(AbstractLifespan):
+    def __init__(self, interval_seconds: float = 10, batch_size: int = 1000):
+        super().__init__()
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        # totals since startup
+        self.num_jobs_purged = 0
+        self.num_results_purged = 0
+        self.num_bytes_purged = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "num_jobs_purged": self.num_jobs_purged,
+            "num_results_purged": self.num_results_purged,
+            "num_bytes_purged": self.num_bytes_purged,
+        }
+
+    async def start(self, app):
+        self.app = app
+        app.state.job_reaper = self
+
+    async def reap_job(self, job: JobInternal) -> Tuple[int, int]:
+        # Removes a deleted job with its results, files and source. Returns the number of deleted
+        # results and the number of bytes freed on disk.
+        repository = self.app.state.repository
+        filesystem = self.app.state.filesystem
+
+        # delete results in batches to keep each query (and the lock in MemoryRepository) short
+        num_results = 0
+        num_deleted = self.batch_size
+        while num_deleted >= self.batch_size:
+            num_deleted = await repository.delete_results_by_job_id(job.id, limit=self.batch_size)
+            num_results += num_deleted
+
+        # Note: filesystem.get_job_dir would create the directory
+        self.app.state.result_store.invalidate(job.id)
+        job_dir = os.path.join(filesystem.get_jobs_dir(), job.id)
+        num_bytes = await run_in_threadpool(_remove_dir, job_dir)
+
+        # the job record is deleted last so that an interrupted cleanup is retried
+        # Note: the source is only removed if no other job (or combined source) references it and
+        # releasing the reference of the job twice does not change anything
+        num_bytes += await release_source(
+            job.source_id, job.id, repository, filesystem, self.app.state.blob_store
+        )
+        try:
+            await repository.delete_job_by_id(job.id)
+        except RecordNotFoundError:
+            # removed concurrently (e.g. by another instance)
+            pass
+        self.app.state.page_cache.invalidate(job.id)
+
+        self.num_jobs_purged += 1
+        self.num_results_purged += num_results
+        self.num_bytes_purged += num_bytes
+
+        return num_results, num_bytes
+
+    async def run(self):
+        logger.info("Starting JobReaperLifespan")
+        repository = self.app.state.repository
+
+        while True:
+            try:
+                jobs = await repository.get_deleted_jobs(limit=self.batch_size)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(e)
+                jobs = []
+
+            # a job that can not be removed (e.g. because a file is not accessible) does not stop
+            # the removal of the other jobs and is retried in the next run
+            num_failed = 0
+            num_results = 0
+            num_bytes = 0
+            for job in jobs:
+                try:
+                    job_num_results, job_num_bytes = await self.reap_job(job)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception(f"Failed to remove deleted job {job.id}")
+                    num_failed += 1
+                    continue
+                num_results += job_num_results
+                num_bytes += job_num_bytes
+            if len(jobs) > num_failed:
+                logger.info(
+                    f"Removed {len(jobs) - num_failed} deleted jobs "
+                    f"({num_results} results, {num_bytes} bytes on disk)"
+                )
+
+            # continue immediately if there might be more deleted jobs (that can be removed)
+            if len(jobs) < self.batch_size or num_failed > 0:
+                await asyncio.sleep(self.interval_seconds)
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from ..data import RecordNotFoundError
+from ..util import get_disk_usage
+from .abstract_lifespan import AbstractLifespan
+
+__all__ = ["RetentionLifespan"]
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionLifespan(AbstractLifespan):
+    def __init__(
+        self,
+        interval_seconds: float = 60,
+        batch_size: int = 100,
+        default_ttl_seconds: Optional[float] = None,
+        module_ttl_seconds: Optional[Dict[str, Optional[float]]] = None,
+        dry_run: bool = False,
+    ):
+        super().__init__()
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.default_ttl_seconds = default_ttl_seconds
+        self.module_ttl_seconds = module_ttl_seconds or {}
+        self.dry_run = dry_run
+        # totals since startup
+        self.num_jobs_expired = 0
+        # maps module ids to the result of the last dry run
+        self.last_report: Dict[str, Dict[str, int]] = {}
+
+    def get_ttl_seconds(self, module_id: str) -> Optional[float]:
+        # None means that the jobs of the module never expire
+        return self.module_ttl_seconds.get(module_id, self.default_ttl_seconds)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"num_jobs_expired": self.num_jobs_expired}
+
+    async def start(self, app):
+        self.app = app
+        app.state.retention = self
+
+    async def report(self, module_id: str, created_before: datetime) -> Dict[str, int]:
+        # Estimates how much would be purged in the next interval, i.e. of at most batch_size jobs
+        # (without the source files, which might be shared).
+        repository = self.app.state.repository
+        filesystem = self.app.state.filesystem
+
+        jobs = await repository.get_jobs_created_before(
+            created_before, module_id, limit=self.batch_size
+        )
+        num_results = 0
+        num_bytes = 0
+        for job in jobs:
+            num_results += await repository.count_results_by_job_id(job.id)
+            job_dir = os.path.join(filesystem.get_jobs_dir(), job.id)
+            num_bytes += await run_in_threadpool(get_disk_usage, job_dir)
+
+        return {"num_jobs": len(jobs), "num_results": num_results, "num_bytes": num_bytes}
+
+    async def expire(self, module_id: str, created_before: datetime) -> int:
+        # Marks at most batch_size expired jobs as deleted. The JobReaperLifespan removes them
+        # with their results and files.
+        repository = self.app.state.repository
+
+        jobs = await repository.get_jobs_created_before(
+            created_before, module_id, limit=self.batch_size
+        )
+        num_expired = 0
+        for job in jobs:
+            try:
+                await repository.mark_job_deleted(job.id)
+                num_expired += 1
+            except RecordNotFoundError:
+                # deleted concurrently
+                pass
+
+        self.num_jobs_expired += num_expired
+        return num_expired
+
+    async def run(self):
+        logger.info("Starting RetentionLifespan")
+        repository = self.app.state.repository
+
+        while True:
+            try:
+                now = datetime.now(timezone.utc)
+                for module in await repository.get_all_modules():
+                    ttl_seconds = self.get_ttl_seconds(module.id)
+                    if ttl_seconds is None:
+                        continue
+
+                    created_before = now - timedelta(seconds=ttl_seconds)
+                    if self.dry_run:
+                        report = await self.report(module.id, created_before)
+                        self.last_report[module.id] = report
+                        logger.info(
+                            f"Retention (dry run): would purge {report['num_jobs']} jobs of module "
+                            f"{module.id} ({report['num_results']} results, "
+                            f"{report['num_bytes']} bytes on disk)"
+                        )
+                    else:
+                        num_expired = await self.expire(module.id, created_before)
+                        if num_expired > 0:
+                            logger.info(f"Expired {num_expired} jobs of module {module.id}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(e)
+
+            # at most batch_size jobs per module and interval are expired (rate limit)
+            await asyncio.sleep(self.interval_seconds)
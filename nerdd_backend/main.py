@@ -2,6 +2,7 @@ import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
+from typing import Optional
 
 import hydra
 import uvicorn
@@ -19,18 +20,34 @@ from .actions import (
     SaveResultToDb,
     UpdateJobSize,
 )
-from .data import MemoryRepository, RethinkDbRepository
-from .lifespan import ActionLifespan, CreateModuleLifespan
+from .data import (
+    CachingRepository,
+    MemoryRepository,
+    ResultStore,
+    RethinkDbRepository,
+    instrument_repository,
+)
+from .lifespan import (
+    ActionLifespan,
+    CreateModuleLifespan,
+    DeleteExpiredChallengesLifespan,
+    DeleteOldUserUsageLifespan,
+    JobReaperLifespan,
+    RetentionLifespan,
+)
 from .routers import (
     challenges_router,
     files_router,
     get_dynamic_router,
     jobs_router,
+    metrics_router,
     modules_router,
+    register_app_metrics,
     results_router,
     sources_router,
     websockets_router,
 )
+from .util import BackgroundTasks, BlobStore, ChangefeedHub, MetricsRegistry, PageCache
 
 logging.basicConfig(level=logging.INFO)
 
@@ -48,7 +65,12 @@ def get_channel(config: DictConfig):
 
 def get_repository(config: DictConfig):
     if config.db.name == "rethinkdb":
-        return RethinkDbRepository(config.db.host, config.db.port, config.db.database_name)
+        # optional connection pool settings (see RethinkDbConnectionPool)
+        pool_options = config.db.get("pool")
+        pool_options = OmegaConf.to_container(pool_options) if pool_options is not None else {}
+        return RethinkDbRepository(
+            config.db.host, config.db.port, config.db.database_name, **pool_options
+        )
     elif config.db.name == "memory":
         return MemoryRepository()
     else:
@@ -56,6 +78,10 @@ def get_repository(config: DictConfig):
 
 
 async def create_app(cfg: DictConfig):
+    def get_result_archiver(app: FastAPI) -> Optional[ResultStore]:
+        # results of complete jobs are only archived if enabled
+        return app.state.result_store if cfg.archive_results else None
+
     lifespans = [
         ActionLifespan(lambda app: UpdateJobSize(app.state.channel, app.state.repository, cfg)),
         ActionLifespan(
@@ -63,9 +89,23 @@ async def create_app(cfg: DictConfig):
                 app.state.channel, app.state.repository, app.state.filesystem
             )
         ),
-        ActionLifespan(lambda app: SaveResultToDb(app.state.channel, app.state.repository)),
         ActionLifespan(
-            lambda app: SaveResultCheckpointToDb(app.state.channel, app.state.repository, cfg)
+            lambda app: SaveResultToDb(
+                app.state.channel,
+                app.state.repository,
+                cfg,
+                get_result_archiver(app),
+                app.state.background_tasks,
+            )
+        ),
+        ActionLifespan(
+            lambda app: SaveResultCheckpointToDb(
+                app.state.channel,
+                app.state.repository,
+                cfg,
+                get_result_archiver(app),
+                app.state.background_tasks,
+            )
         ),
         ActionLifespan(
             lambda app: ProcessSerializationResult(app.state.channel, app.state.repository)
@@ -78,6 +118,60 @@ async def create_app(cfg: DictConfig):
         cfg.challenge_hmac_key = getattr(cfg, "challenge_hmac_key", os.urandom(32).hex())
         cfg.challenge_difficulty = getattr(cfg, "challenge_difficulty", 1_000_000)
         cfg.challenge_expiration_seconds = getattr(cfg, "challenge_expiration_seconds", 3600)
+        cfg.challenge_cleanup_interval_seconds = getattr(
+            cfg, "challenge_cleanup_interval_seconds", 60
+        )
+        cfg.challenge_cleanup_batch_size = getattr(cfg, "challenge_cleanup_batch_size", 1000)
+        cfg.usage_cleanup_interval_seconds = getattr(cfg, "usage_cleanup_interval_seconds", 3600)
+        cfg.usage_cleanup_batch_size = getattr(cfg, "usage_cleanup_batch_size", 1000)
+        cfg.result_batch_size = getattr(cfg, "result_batch_size", 1)
+        cfg.result_batch_timeout_seconds = getattr(cfg, "result_batch_timeout_seconds", 1.0)
+        cfg.changefeed_queue_size = getattr(cfg, "changefeed_queue_size", 1000)
+        cfg.websocket_job_update_interval_seconds = getattr(
+            cfg, "websocket_job_update_interval_seconds", 0
+        )
+        cfg.cache_max_size = getattr(cfg, "cache_max_size", 1000)
+        cfg.cache_module_ttl_seconds = getattr(cfg, "cache_module_ttl_seconds", 600)
+        cfg.cache_job_ttl_seconds = getattr(cfg, "cache_job_ttl_seconds", 2)
+        cfg.page_cache_max_bytes = getattr(cfg, "page_cache_max_bytes", 64 * 1024 * 1024)
+        cfg.page_cache_compress = getattr(cfg, "page_cache_compress", True)
+        cfg.upload_chunk_size = getattr(cfg, "upload_chunk_size", 1024 * 1024)
+        cfg.max_upload_size = getattr(cfg, "max_upload_size", None)
+        cfg.upload_checksum_algorithm = getattr(cfg, "upload_checksum_algorithm", None)
+        cfg.deduplicate_sources = getattr(cfg, "deduplicate_sources", False)
+        cfg.reuse_job_results = getattr(cfg, "reuse_job_results", False)
+        cfg.job_reaper_interval_seconds = getattr(cfg, "job_reaper_interval_seconds", 10)
+        cfg.job_reaper_batch_size = getattr(cfg, "job_reaper_batch_size", 1000)
+        cfg.admin_api_key = getattr(cfg, "admin_api_key", None)
+        cfg.retention_interval_seconds = getattr(cfg, "retention_interval_seconds", 60)
+        cfg.retention_batch_size = getattr(cfg, "retention_batch_size", 100)
+        cfg.retention_default_ttl_seconds = getattr(cfg, "retention_default_ttl_seconds", None)
+        cfg.retention_module_ttl_seconds = getattr(cfg, "retention_module_ttl_seconds", {})
+        cfg.retention_dry_run = getattr(cfg, "retention_dry_run", False)
+        cfg.archive_results = getattr(cfg, "archive_results", False)
+        cfg.archive_row_group_size = getattr(cfg, "archive_row_group_size", 1000)
+        cfg.archive_compress_level = getattr(cfg, "archive_compress_level", 6)
+        cfg.archive_max_open_files = getattr(cfg, "archive_max_open_files", 128)
+        cfg.metrics_enabled = getattr(cfg, "metrics_enabled", False)
+
+    lifespans.append(
+        DeleteExpiredChallengesLifespan(
+            cfg.challenge_cleanup_interval_seconds, cfg.challenge_cleanup_batch_size
+        )
+    )
+    lifespans.append(
+        DeleteOldUserUsageLifespan(cfg.usage_cleanup_interval_seconds, cfg.usage_cleanup_batch_size)
+    )
+    lifespans.append(JobReaperLifespan(cfg.job_reaper_interval_seconds, cfg.job_reaper_batch_size))
+    lifespans.append(
+        RetentionLifespan(
+            cfg.retention_interval_seconds,
+            cfg.retention_batch_size,
+            cfg.retention_default_ttl_seconds,
+            dict(cfg.retention_module_ttl_seconds),
+            cfg.retention_dry_run,
+        )
+    )
 
     if cfg.mock_infra:
         from nerdd_link import (
@@ -128,6 +222,9 @@ async def create_app(cfg: DictConfig):
 
         yield
 
+        # e.g. results that are copied for reused jobs
+        await app.state.background_tasks.wait()
+
         logger.info("Attempting to cancel all tasks")
         run_tasks.cancel()
 
@@ -136,12 +233,43 @@ async def create_app(cfg: DictConfig):
         except asyncio.CancelledError:
             logger.info("Tasks successfully cancelled")
 
+        # e.g. archives of jobs that were completed by the last results written on shutdown
+        await app.state.background_tasks.wait()
+
+        await app.state.repository.close()
+
     app = FastAPI(lifespan=global_lifespan, root_path=cfg.root_path)
-    app.state.repository = repository = get_repository(cfg)
+    repository = get_repository(cfg)
+    if cfg.metrics_enabled:
+        app.state.metrics = metrics = MetricsRegistry()
+        # instrument the database (and not the cache in front of it)
+        repository = instrument_repository(repository, metrics)
+    if cfg.cache_max_size > 0:
+        repository = CachingRepository(
+            repository,
+            max_size=cfg.cache_max_size,
+            module_ttl_seconds=cfg.cache_module_ttl_seconds,
+            job_ttl_seconds=cfg.cache_job_ttl_seconds,
+        )
+    app.state.repository = repository
     app.state.channel = channel = get_channel(cfg)
     app.state.filesystem = FileSystem(cfg.media_root)
+    app.state.background_tasks = BackgroundTasks()
+    app.state.blob_store = BlobStore(os.path.join(cfg.media_root, "blobs"))
+    app.state.changefeed_hub = ChangefeedHub(cfg.changefeed_queue_size)
+    app.state.page_cache = PageCache(cfg.page_cache_max_bytes, cfg.page_cache_compress)
+    app.state.result_store = ResultStore(
+        repository,
+        app.state.filesystem,
+        row_group_size=cfg.archive_row_group_size,
+        compress_level=cfg.archive_compress_level,
+        max_open_archives=cfg.archive_max_open_files,
+    )
     app.state.config = cfg
 
+    if cfg.metrics_enabled:
+        register_app_metrics(app, metrics)
+
     await channel.start()
 
     await repository.initialize()
@@ -176,6 +304,8 @@ async def create_app(cfg: DictConfig):
     app.include_router(websockets_router)
     app.include_router(files_router)
     app.include_router(challenges_router)
+    if cfg.metrics_enabled:
+        app.include_router(metrics_router)
 
     for module in await repository.get_all_modules():
         app.include_router(get_dynamic_router(module))
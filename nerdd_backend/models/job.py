@@ -1,7 +1,7 @@
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional, Tuple
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 __all__ = ["Job", "JobCreate", "JobPublic", "JobUpdate", "JobInternal", "OutputFile"]
 
@@ -16,7 +16,7 @@ class Job(BaseModel):
     job_type: str
     source_id: str
     params: dict
-    created_at: datetime = datetime.now(timezone.utc)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     page_size: int = 10
     status: str
     entries_processed: List[Tuple[int, int]] = []
@@ -29,6 +29,10 @@ class JobInternal(Job):
     checkpoints_processed: List[int] = []
     num_checkpoints_total: Optional[int] = None
     output_formats: List[str] = []
+    # jobs with the same reuse_key compute the same results (see routers/reuse.py)
+    reuse_key: Optional[str] = None
+    # results of finished jobs are moved from the database to a file (see ResultStore)
+    results_archived: bool = False
 
 
 class JobCreate(BaseModel):
@@ -50,9 +54,13 @@ class JobUpdate(BaseModel):
     id: str
     status: Optional[str] = None
     entries_processed: Optional[List[int]] = None
+    # the same as entries_processed, but given as sorted, disjoint intervals [start, end) (e.g. the
+    # entries_processed of another job)
+    intervals_processed: Optional[List[Tuple[int, int]]] = None
     num_entries_total: Optional[int] = None
     num_checkpoints_total: Optional[int] = None
     # checkpoint list update
     new_checkpoints_processed: Optional[List[int]] = None
     # output formats update
     new_output_formats: Optional[List[str]] = None
+    results_archived: Optional[bool] = None
@@ -4,7 +4,7 @@ from pydantic import BaseModel, ConfigDict
 
 from .job import JobPublic
 
-__all__ = ["Result", "Pagination", "ResultSet"]
+__all__ = ["Result", "Pagination", "ResultSet", "KeysetPagination", "KeysetResultSet"]
 
 
 class Result(BaseModel):
@@ -29,3 +29,17 @@ class ResultSet(BaseModel):
     data: List[Result]
     job: JobPublic
     pagination: Pagination
+
+
+class KeysetPagination(BaseModel):
+    after_mol_id: Optional[int]  # None: start at the first result
+    limit: int
+    is_incomplete: bool
+    last_mol_id_on_page: Optional[int]
+    next_url: Optional[str]
+
+
+class KeysetResultSet(BaseModel):
+    data: List[Result]
+    job: Optional[JobPublic] = None
+    pagination: KeysetPagination
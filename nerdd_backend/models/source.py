@@ -1,7 +1,7 @@
 from datetime import datetime, timezone
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 __all__ = ["Source", "SourcePublic"]
 
@@ -10,10 +10,17 @@ class Source(BaseModel):
     id: str
     format: Optional[str] = None
     # The filename that was provided by the user. The value None indicates that the source was
-    # generated by the system as a container to hold multiple other sources.
+    # generated by the system as a container to hold multiple other sources (or inputs).
     filename: Optional[str] = None
-    created_at: datetime = datetime.now(timezone.utc)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # size and checksum (hex digest, see upload_checksum_algorithm) of the file
+    size: Optional[int] = None
+    checksum: Optional[str] = None
+    # owners (jobs and sources generated by put_multiple_sources) that use the source, which is
+    # deleted when the last owner releases it (see Repository.release_source)
+    references: List[str] = []
 
 
 class SourcePublic(Source):
-    pass
+    # the owners are not revealed (job ids grant access to jobs)
+    references: List[str] = Field(default=[], exclude=True)
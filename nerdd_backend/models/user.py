@@ -2,7 +2,7 @@ from enum import IntEnum
 
 from pydantic import BaseModel
 
-__all__ = ["User", "AnonymousUser", "UserType"]
+__all__ = ["User", "AnonymousUser", "UserType", "UserUsage"]
 
 
 class UserType(IntEnum):
@@ -16,3 +16,11 @@ class User(BaseModel):
 
 class AnonymousUser(User):
     ip_address: str
+
+
+class UserUsage(BaseModel):
+    # aggregated usage of a user within a time window (see Repository.get_user_usage)
+    # * num_fresh_jobs: jobs whose size (number of entries) is not known yet
+    # * num_entries: total number of entries of all jobs with known size
+    num_fresh_jobs: int = 0
+    num_entries: int = 0
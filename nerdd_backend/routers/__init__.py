@@ -2,6 +2,7 @@ from .challenges import *
 from .dynamic import *
 from .files import *
 from .jobs import *
+from .metrics import *
 from .modules import *
 from .results import *
 from .sources import *
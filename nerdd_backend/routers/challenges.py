@@ -22,8 +22,7 @@ async def create_challenge(request: Request = None):
     config = app.state.config
     repository = app.state.repository
 
-    # delete all expired challenges
-    await repository.delete_expired_challenges(datetime.now(timezone.utc))
+    # Note: expired challenges are deleted by DeleteExpiredChallengesLifespan
 
     # create new altcha challenge
     options = altcha.ChallengeOptions(
@@ -58,9 +57,6 @@ async def verify_solution(
     config = app.state.config
     repository: Repository = app.state.repository
 
-    # delete all expired challenges
-    await repository.delete_expired_challenges(datetime.now(timezone.utc))
-
     # check that the solution is valid
     valid, error = altcha.verify_solution(
         payload, hmac_key=config.challenge_hmac_key, check_expires=False
@@ -83,15 +79,15 @@ async def verify_solution(
         ) from e
 
     # check that the solution wasn't solved before (to prevent replay attacks)
+    # --> delete the challenge (if not expired) in a single atomic operation
     try:
-        challenge = await repository.get_challenge_by_salt(salt=payload_data["salt"])
+        await repository.delete_challenge_by_salt(
+            salt=payload_data["salt"], deadline=datetime.now(timezone.utc)
+        )
     except RecordNotFoundError as e:
         raise HTTPException(
             status_code=400,
             detail="Challenge not found or already solved.",
         ) from e
 
-    # delete the challenge from the repository
-    await repository.delete_challenge_by_id(challenge.id)
-
     return "Challenge verified successfully."
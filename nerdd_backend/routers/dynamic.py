@@ -18,7 +18,7 @@ from stringcase import pascalcase
 
 from ..models import JobCreate, Module
 from .jobs import create_job, delete_job, get_job
-from .results import get_results
+from .results import export_results, get_results
 from .sources import put_multiple_sources
 from .websockets import get_job_ws, get_results_ws
 
@@ -179,6 +179,14 @@ def get_dynamic_router(module: Module):
     router.get(f"/{module.id}/jobs/{{job_id}}/results/", include_in_schema=False)(get_results)
     router.get(f"/{module.id}/jobs/{{job_id}}/results")(get_results)
 
+    #
+    # GET /jobs/{job_id}/results/export
+    #
+    router.get(f"/{module.id}/jobs/{{job_id}}/results/export/", include_in_schema=False)(
+        export_results
+    )
+    router.get(f"/{module.id}/jobs/{{job_id}}/results/export")(export_results)
+
     #
     # websocket endpoints
     #
@@ -1,5 +1,8 @@
+import hmac
+import logging
 import math
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Union
 from uuid import uuid4
 
 from fastapi import APIRouter, Body, Header, HTTPException, Request
@@ -9,12 +12,24 @@ from nerdd_link import FileSystem, JobMessage
 from ..data import RecordNotFoundError, Repository
 from ..models import Job, JobCreate, JobInternal, JobPublic, OutputFile
 from ..util import CompressedSet
+from .reuse import get_reuse_key, reuse_job_results
 from .users import check_quota, get_user
 
 __all__ = ["jobs_router"]
 
 jobs_router = APIRouter(prefix="/jobs")
 
+logger = logging.getLogger(__name__)
+
+
+def is_job_final(job: JobInternal, output_formats: List[str]) -> bool:
+    # a job does not change anymore if all entries were processed and all output files were written
+    return (
+        job.num_entries_total is not None
+        and CompressedSet(job.entries_processed).count() == job.num_entries_total
+        and set(output_formats).issubset(job.output_formats)
+    )
+
 
 async def augment_job(job: JobInternal, request: Request) -> JobPublic:
     # compute number of processed entries
@@ -52,6 +67,38 @@ async def augment_job(job: JobInternal, request: Request) -> JobPublic:
     )
 
 
+async def process_job(job: JobInternal, channel) -> None:
+    # send job to kafka
+    await channel.jobs_topic().send(
+        JobMessage(
+            id=job.id,
+            # user_id=user.id,
+            job_type=job.job_type,
+            source_id=job.source_id,
+            params=job.params,
+        )
+    )
+
+
+async def reuse_or_process_job(job: JobInternal, candidates: List[JobInternal], app) -> None:
+    # copies the results of the first finished job that is still available or processes the job
+    for candidate in candidates:
+        try:
+            reused = await reuse_job_results(
+                candidate, job, app.state.repository, app.state.filesystem, app.state.result_store
+            )
+        except RecordNotFoundError:
+            # the job was deleted in the meantime
+            return
+        except Exception:
+            logger.exception(f"Failed to reuse the results of job {candidate.id} for {job.id}")
+            continue
+        if reused:
+            return
+
+    await process_job(job, app.state.channel)
+
+
 @jobs_router.post("/", include_in_schema=False)
 @jobs_router.post("")
 async def create_job(
@@ -92,9 +139,9 @@ async def create_job(
         # task == "molecular_property_prediction" or unknown task
         page_size = app.state.config.page_size_molecular_property_prediction
 
-    # check if source exists
+    # check if source exists and keep it until the job is removed (see JobReaperLifespan)
     try:
-        await repository.get_source_by_id(job.source_id)
+        await repository.add_source_reference(job.source_id, str(job_id))
     except RecordNotFoundError as e:
         raise HTTPException(status_code=404, detail="Source not found") from e
 
@@ -109,20 +156,34 @@ async def create_job(
         status="created",
     )
 
+    # reuse the results of a finished job with the same module, parameters and input molecules
+    candidates = []
+    if app.state.config.reuse_job_results:
+        job_new.reuse_key = await get_reuse_key(
+            module, job.params, job.source_id, repository, app.state.filesystem
+        )
+        if job_new.reuse_key is not None:
+            candidates = [
+                candidate
+                for candidate in await repository.get_jobs_by_reuse_key(job_new.reuse_key)
+                if is_job_final(candidate, app.state.config.output_formats)
+            ]
+
     # We have to create the job in the database, because the user will fetch the created job
     # in the next request. There is no time for sending it to Kafka and consuming the job record.
     job_internal = await repository.create_job(job_new)
 
-    # send job to kafka
-    await channel.jobs_topic().send(
-        JobMessage(
-            id=str(job_id),
-            # user_id=user.id,
-            job_type=job.job_type,
-            source_id=job.source_id,
-            params=job.params,
+    # the job counts as fresh until its size is known (see check_quota)
+    await repository.add_user_usage(user.id, job_internal.created_at, num_fresh_jobs=1)
+
+    if len(candidates) > 0:
+        # copying the results takes a while, the job stays without progress until it is done
+        app.state.background_tasks.start(
+            reuse_or_process_job(job_internal, candidates, app),
+            f"reuse results for job {job_internal.id}",
         )
-    )
+    else:
+        await process_job(job_internal, channel)
 
     # return the response
     return await augment_job(job_internal, request)
@@ -134,16 +195,48 @@ async def delete_job(job_id: str, request: Request):
     app = request.app
     repository = app.state.repository
 
+    # the job is hidden immediately, its results and files are removed by the JobReaperLifespan
     try:
-        await repository.get_job_by_id(job_id)
+        await repository.mark_job_deleted(job_id)
     except RecordNotFoundError as e:
         raise HTTPException(status_code=404, detail="Job not found") from e
 
-    await repository.delete_job_by_id(job_id)
+    app.state.page_cache.invalidate(job_id)
 
     return {"message": "Job deleted successfully"}
 
 
+@jobs_router.delete("/", include_in_schema=False)
+@jobs_router.delete("", include_in_schema=False)
+async def delete_old_jobs(
+    # number of seconds or ISO 8601 duration (e.g. P30D)
+    older_than: Union[float, timedelta],
+    request: Request,
+    admin_api_key: Optional[str] = Header(None, alias="X-Admin-Api-Key"),
+):
+    app = request.app
+    repository = app.state.repository
+    config = app.state.config
+
+    # bulk deletion is reserved for operators
+    if config.admin_api_key is None or admin_api_key is None:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    # Note: compare_digest only accepts ASCII strings (but any bytes)
+    if not hmac.compare_digest(admin_api_key.encode(), config.admin_api_key.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    if not isinstance(older_than, timedelta):
+        older_than = timedelta(seconds=older_than)
+    # otherwise, all jobs (including the ones that are still running) would be deleted
+    if older_than <= timedelta(0):
+        raise HTTPException(status_code=422, detail="older_than must be positive")
+    created_before = datetime.now(timezone.utc) - older_than
+    # Note: cached result pages are dropped by the JobReaperLifespan
+    num_jobs = await repository.mark_jobs_deleted(created_before)
+
+    return {"message": f"{num_jobs} jobs deleted successfully", "num_jobs": num_jobs}
+
+
 @jobs_router.get("/{job_id}/output.{format}/", include_in_schema=False)
 @jobs_router.get("/{job_id}/output.{format}")
 async def get_output_file(job_id: str, format: str, request: Request):
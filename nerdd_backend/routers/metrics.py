@@ -0,0 +1,129 @@
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import PlainTextResponse
+
+from ..util import MetricsRegistry
+
+__all__ = ["metrics_router", "register_app_metrics"]
+
+metrics_router = APIRouter(prefix="")
+
+# content type of the Prometheus text exposition format (Starlette appends the charset)
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def register_app_metrics(app: FastAPI, metrics: MetricsRegistry) -> None:
+    # Statistics that are collected anyway (e.g. by caches and background tasks) are read on every
+    # scrape instead of being updated on the hot path.
+    state = app.state
+
+    def changefeeds():
+        hub = state.changefeed_hub
+        yield {}, hub.num_feeds()
+
+    def changefeed_subscribers():
+        hub = state.changefeed_hub
+        yield {}, hub.num_subscribers()
+
+    def repository_cache(key):
+        def callback():
+            get_cache_stats = getattr(state.repository, "get_cache_stats", None)
+            if get_cache_stats is None:
+                return
+            for cache, stats in get_cache_stats().items():
+                yield {"cache": cache}, stats[key]
+
+        return callback
+
+    def page_cache(key):
+        def callback():
+            yield {}, state.page_cache.get_stats()[key]
+
+        return callback
+
+    def lifespan_stats(name, key):
+        # the lifespans register themselves on startup
+        def callback():
+            lifespan = getattr(state, name, None)
+            if lifespan is not None:
+                yield {}, lifespan.get_stats()[key]
+
+        return callback
+
+    def open_archives():
+        yield {}, state.result_store.num_open_archives()
+
+    metrics.gauge("nerdd_changefeeds", "Number of open changefeeds", callback=changefeeds)
+    metrics.gauge(
+        "nerdd_changefeed_subscribers",
+        "Number of subscribers of shared changefeeds",
+        callback=changefeed_subscribers,
+    )
+    metrics.counter(
+        "nerdd_repository_cache_hits_total",
+        "Number of hits of the repository cache",
+        ["cache"],
+        callback=repository_cache("hits"),
+    )
+    metrics.counter(
+        "nerdd_repository_cache_misses_total",
+        "Number of misses of the repository cache",
+        ["cache"],
+        callback=repository_cache("misses"),
+    )
+    metrics.gauge(
+        "nerdd_repository_cache_entries",
+        "Number of entries in the repository cache",
+        ["cache"],
+        callback=repository_cache("size"),
+    )
+    metrics.counter(
+        "nerdd_page_cache_hits_total",
+        "Number of hits of the page cache",
+        callback=page_cache("hits"),
+    )
+    metrics.counter(
+        "nerdd_page_cache_misses_total",
+        "Number of misses of the page cache",
+        callback=page_cache("misses"),
+    )
+    metrics.gauge(
+        "nerdd_page_cache_pages",
+        "Number of pages in the page cache",
+        callback=page_cache("num_pages"),
+    )
+    metrics.gauge(
+        "nerdd_page_cache_bytes",
+        "Size of the page cache in bytes",
+        callback=page_cache("num_bytes"),
+    )
+    metrics.counter(
+        "nerdd_jobs_purged_total",
+        "Number of deleted jobs purged by the job reaper",
+        callback=lifespan_stats("job_reaper", "num_jobs_purged"),
+    )
+    metrics.counter(
+        "nerdd_results_purged_total",
+        "Number of results of deleted jobs purged by the job reaper",
+        callback=lifespan_stats("job_reaper", "num_results_purged"),
+    )
+    metrics.counter(
+        "nerdd_purged_bytes_total",
+        "Number of bytes on disk freed by the job reaper",
+        callback=lifespan_stats("job_reaper", "num_bytes_purged"),
+    )
+    metrics.counter(
+        "nerdd_jobs_expired_total",
+        "Number of jobs expired by the retention policy",
+        callback=lifespan_stats("retention", "num_jobs_expired"),
+    )
+    metrics.gauge(
+        "nerdd_result_archives_open",
+        "Number of result archives mapped into memory",
+        callback=open_archives,
+    )
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    metrics: MetricsRegistry = request.app.state.metrics
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
@@ -1,20 +1,77 @@
-from fastapi import APIRouter, HTTPException, Request
+import csv
+import hashlib
+import io
+import json
+from typing import Any, AsyncIterable, Iterable, List, Optional, Union
 
-from ..data import RecordNotFoundError, Repository
-from ..models import Pagination, ResultSet
-from .jobs import augment_job
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 
-__all__ = ["results_router"]
+from ..data import RecordNotFoundError, Repository, ResultStore
+from ..models import (
+    JobInternal,
+    KeysetPagination,
+    KeysetResultSet,
+    Pagination,
+    Result,
+    ResultSet,
+)
+from ..util import CachedPage, PageCache
+from .jobs import augment_job, is_job_final
+
+__all__ = ["results_router", "export_results"]
 
 results_router = APIRouter(prefix="")
 
 
+# maximum number of results per request in keyset pagination
+MAX_RESULTS_LIMIT = 1000
+
+
+def compute_etag(request: Request, *parts: Any) -> str:
+    # strong ETag for a response that is fully determined by the given parts
+    key = "|".join(str(part) for part in (request.base_url, *parts))
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+
+    # a reverse proxy might weaken our ETag (e.g. when compressing the response)
+    # Note: "*" is not accepted, because it would match any version of the page
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    candidates = [c[2:] if c.startswith("W/") else c for c in candidates]
+    return etag in candidates
+
+
+def cached_page_response(request: Request, page: CachedPage) -> Response:
+    headers = {"ETag": page.etag, "Vary": "Accept-Encoding"}
+    if page.gzipped_body is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(
+            page.gzipped_body,
+            media_type="application/json",
+            headers={**headers, "Content-Encoding": "gzip"},
+        )
+    return Response(page.body, media_type="application/json", headers=headers)
+
+
 @results_router.get("/jobs/{job_id}/results")
 async def get_results(
-    job_id: str, page: int = 1, return_incomplete: bool = False, request: Request = None
-) -> ResultSet:
+    job_id: str,
+    page: int = 1,
+    return_incomplete: bool = False,
+    after_mol_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    include_job: bool = False,
+    request: Request = None,
+    response: Response = None,
+) -> Union[ResultSet, KeysetResultSet]:
     app = request.app
     repository: Repository = app.state.repository
+    result_store: ResultStore = app.state.result_store
+    config = app.state.config
 
     page_zero_based = page - 1
 
@@ -23,6 +80,36 @@ async def get_results(
     except RecordNotFoundError as e:
         raise HTTPException(status_code=404, detail="Job not found") from e
 
+    # Complete pages never change, but the embedded job changes until the job is final. If the
+    # job is final, every page is complete and we can answer conditional requests without reading
+    # any results.
+    job_is_final = is_job_final(job, config.output_formats)
+
+    # use keyset pagination if after_mol_id or limit is given
+    if after_mol_id is not None or limit is not None:
+        return await get_results_after(
+            job,
+            after_mol_id,
+            limit,
+            return_incomplete,
+            include_job,
+            job_is_final,
+            request,
+            response,
+        )
+
+    etag = compute_etag(request, job_id, "page", page, job.num_entries_total)
+    if job_is_final and etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    # pages of final jobs are cached as serialized (and compressed) bytes
+    page_cache: PageCache = app.state.page_cache
+    cache_key = (page, job.page_size, str(request.base_url))
+    if job_is_final:
+        cached_page = page_cache.get(job_id, cache_key)
+        if cached_page is not None:
+            return cached_page_response(request, cached_page)
+
     page_size = job.page_size
 
     # num_entries might not be available, yet
@@ -38,7 +125,7 @@ async def get_results(
 
     first_mol_id = page_zero_based * page_size
     last_mol_id = min(first_mol_id + page_size, num_entries) - 1
-    results = await repository.get_results_by_job_id(job_id, first_mol_id, last_mol_id)
+    results = await result_store.get_results(job, first_mol_id, last_mol_id)
     is_incomplete = len(results) < last_mol_id - first_mol_id + 1
 
     # if return_incomplete is not set, then we need to have all results on that page
@@ -61,4 +148,205 @@ async def get_results(
 
     job_public = await augment_job(job, request)
 
-    return ResultSet(data=results, pagination=pagination, job=job_public)
+    result_set = ResultSet(data=results, pagination=pagination, job=job_public)
+
+    # Note: a page might be incomplete while the results of a final job are archived
+    if job_is_final and not is_incomplete:
+        cached_page = page_cache.put(
+            job_id, cache_key, result_set.model_dump_json().encode("utf-8"), etag
+        )
+        return cached_page_response(request, cached_page)
+
+    return result_set
+
+
+async def get_results_after(
+    job: JobInternal,
+    after_mol_id: Optional[int],
+    limit: Optional[int],
+    return_incomplete: bool,
+    include_job: bool,
+    job_is_final: bool,
+    request: Request,
+    response: Response,
+) -> KeysetResultSet:
+    # Keyset pagination: returns the results of (at most limit) molecules with mol_id >
+    # after_mol_id. A molecule might have several results (e.g. one per atom). In contrast to
+    # page-based pagination, the job is only embedded if requested.
+    app = request.app
+    result_store: ResultStore = app.state.result_store
+
+    if limit is None:
+        limit = job.page_size
+
+    if limit < 1 or limit > MAX_RESULTS_LIMIT:
+        raise HTTPException(
+            status_code=400, detail=f"The limit must be between 1 and {MAX_RESULTS_LIMIT}"
+        )
+
+    first_mol_id = 0 if after_mol_id is None else after_mol_id + 1
+
+    # pages of final jobs never change (every other page might still receive results)
+    etag = compute_etag(
+        request, job.id, "after", after_mol_id, limit, include_job, job.num_entries_total
+    )
+    if job_is_final and etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    # read the range of molecules on the page (not beyond the last entry, if known)
+    last_mol_id = first_mol_id + limit - 1
+    if job.num_entries_total is not None:
+        last_mol_id = min(last_mol_id, job.num_entries_total - 1)
+
+    results = await result_store.get_results(job, first_mol_id, last_mol_id)
+
+    # the page is complete if all molecules have results
+    mol_ids = {result.mol_id for result in results}
+    is_incomplete = len(mol_ids) < last_mol_id - first_mol_id + 1
+
+    if not return_incomplete and is_incomplete:
+        raise HTTPException(status_code=202, detail="Results not yet available")
+
+    if is_incomplete:
+        # only return the results before the first missing molecule (next_url would skip it
+        # otherwise)
+        last_mol_id_on_page = first_mol_id - 1
+        while last_mol_id_on_page + 1 in mol_ids:
+            last_mol_id_on_page += 1
+        results = [result for result in results if result.mol_id <= last_mol_id_on_page]
+    else:
+        last_mol_id_on_page = last_mol_id
+
+    if len(results) == 0:
+        last_mol_id_on_page = after_mol_id
+    has_next = len(results) > 0 and (
+        job.num_entries_total is None or last_mol_id_on_page < job.num_entries_total - 1
+    )
+
+    if has_next:
+        next_url = (
+            f"{request.base_url}{job.job_type}/jobs/{job.id}/results"
+            f"?after_mol_id={last_mol_id_on_page}&limit={limit}"
+        )
+        if include_job:
+            next_url += "&include_job=true"
+    else:
+        next_url = None
+
+    pagination = KeysetPagination(
+        after_mol_id=after_mol_id,
+        limit=limit,
+        is_incomplete=is_incomplete,
+        last_mol_id_on_page=last_mol_id_on_page,
+        next_url=next_url,
+    )
+
+    job_public = await augment_job(job, request) if include_job else None
+
+    if not is_incomplete and job_is_final:
+        response.headers["ETag"] = etag
+
+    return KeysetResultSet(data=results, pagination=pagination, job=job_public)
+
+
+# number of results that are serialized and sent as one chunk in export_results
+EXPORT_CHUNK_SIZE = 1000
+
+export_media_types = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+async def chunk_results(
+    results: AsyncIterable[Result], chunk_size: int
+) -> AsyncIterable[List[Result]]:
+    chunk = []
+    async for result in results:
+        chunk.append(result)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+async def to_ndjson(chunks: AsyncIterable[List[Result]]) -> AsyncIterable[str]:
+    async for chunk in chunks:
+        yield "".join(f"{result.model_dump_json()}\n" for result in chunk)
+
+
+async def to_csv(chunks: AsyncIterable[List[Result]], header: bool) -> AsyncIterable[str]:
+    columns: Optional[List[str]] = None
+
+    def format_value(value):
+        # nested values (e.g. atom properties) are encoded as json
+        return json.dumps(value) if isinstance(value, (list, dict)) else value
+
+    def write_rows(rows: Iterable[list]) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+
+    async for chunk in chunks:
+        records = [result.model_dump() for result in chunk]
+
+        # the columns are derived from the first result (all results of a job have the same
+        # fields)
+        if columns is None:
+            columns = list(records[0].keys())
+            if header:
+                yield write_rows([columns])
+
+        yield write_rows(
+            [format_value(record.get(column)) for column in columns] for record in records
+        )
+
+
+@results_router.get("/jobs/{job_id}/results/export")
+async def export_results(
+    job_id: str,
+    format: str = "ndjson",
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    header: bool = True,
+    request: Request = None,
+) -> StreamingResponse:
+    # Streams all results of a job (ordered by mol_id) with bounded memory. The range of mol_ids
+    # can be restricted by start and end (both inclusive). Every record contains its mol_id, so
+    # an interrupted download can be resumed with start=<last received mol_id + 1> (and
+    # header=false for csv).
+    app = request.app
+    repository: Repository = app.state.repository
+    result_store: ResultStore = app.state.result_store
+
+    if format not in export_media_types:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"Format {format} not supported. "
+                f"Valid options are: {', '.join(export_media_types.keys())}"
+            ),
+        )
+
+    try:
+        job = await repository.get_job_by_id(job_id)
+    except RecordNotFoundError as e:
+        raise HTTPException(status_code=404, detail="Job not found") from e
+
+    # do not read beyond the last entry of the job (if known)
+    if job.num_entries_total is not None:
+        end = job.num_entries_total - 1 if end is None else min(end, job.num_entries_total - 1)
+
+    chunks = chunk_results(result_store.iter_results(job, start, end), EXPORT_CHUNK_SIZE)
+
+    if format == "ndjson":
+        content = to_ndjson(chunks)
+    else:
+        content = to_csv(chunks, header)
+
+    return StreamingResponse(
+        content,
+        media_type=export_media_types[format],
+        headers={"Content-Disposition": f'attachment; filename="{job.job_type}-{job_id}.{format}"'},
+    )
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import List, Optional
+
+from nerdd_link import FileSystem
+from starlette.concurrency import run_in_threadpool
+
+from ..data import ARCHIVE_FILE_NAME, RecordNotFoundError, Repository, ResultStore
+from ..models import JobInternal, JobUpdate, Module, Result
+
+__all__ = ["get_reuse_key", "reuse_job_results"]
+
+
+def _read_json(path: str):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+async def get_input_hash(
+    source_id: str, repository: Repository, filesystem: FileSystem
+) -> Optional[str]:
+    # Hash of the molecules in a source. Sources generated by put_multiple_sources (format json,
+    # no filename) only reference other sources and are hashed by the checksums of these sources.
+    # Returns None if there is no checksum (e.g. because checksums are disabled).
+    try:
+        source = await repository.get_source_by_id(source_id)
+    except RecordNotFoundError:
+        return None
+
+    if source.format != "json" or source.filename is not None:
+        return source.checksum
+
+    path = filesystem.get_source_file_path(source_id)
+    referenced_sources = await run_in_threadpool(_read_json, path)
+
+    checksums = []
+    for referenced_source in referenced_sources:
+        try:
+            checksum = (await repository.get_source_by_id(referenced_source["id"])).checksum
+        except RecordNotFoundError:
+            checksum = None
+        if checksum is None:
+            return None
+        checksums.append(checksum)
+
+    return hashlib.sha256("\n".join(checksums).encode("utf-8")).hexdigest()
+
+
+async def get_reuse_key(
+    module: Module,
+    params: dict,
+    source_id: str,
+    repository: Repository,
+    filesystem: FileSystem,
+) -> Optional[str]:
+    # Jobs with the same module (and version), the same parameters and the same input molecules
+    # produce the same results.
+    input_hash = await get_input_hash(source_id, repository, filesystem)
+    if input_hash is None:
+        return None
+
+    key = json.dumps(
+        [module.id, getattr(module, "version", None), params, input_hash],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _link_or_copy(source: str, destination: str) -> None:
+    # files of finished jobs are never modified, so they can be shared (hard link) between jobs
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def _copy_result(result: Result, source_job_id: str, job_id: str) -> Result:
+    # results contain the job id in their id and in the urls of files (see SaveResultToDb)
+    record = result.model_dump()
+    record["id"] = job_id + record["id"][len(source_job_id) :]
+    record["job_id"] = job_id
+    source_url = f"/api/jobs/{source_job_id}/files/"
+    for k, v in record.items():
+        if isinstance(v, str) and v.startswith(source_url):
+            record[k] = f"/api/jobs/{job_id}/files/" + v[len(source_url) :]
+    return Result(**record)
+
+
+async def reuse_job_results(
+    source_job: JobInternal,
+    job: JobInternal,
+    repository: Repository,
+    filesystem: FileSystem,
+    result_store: ResultStore,
+    batch_size: int = 1000,
+) -> bool:
+    # Copies all files and results of a finished job to a job that was created without progress
+    # and completes the job afterwards. This way, the job never looks finished without its
+    # results. Returns False if the results could not be copied.
+    # Note: the result archive of the finished job (if any) contains its job id, so the results
+    # are copied to the database instead (see below)
+    await run_in_threadpool(
+        shutil.copytree,
+        filesystem.get_job_dir(source_job.id),
+        filesystem.get_job_dir(job.id),
+        copy_function=_link_or_copy,
+        dirs_exist_ok=True,
+        ignore=shutil.ignore_patterns(f"{ARCHIVE_FILE_NAME}*"),
+    )
+
+    num_molecules = 0
+    last_mol_id = None
+    batch: List[Result] = []
+    async for result in result_store.iter_results(source_job):
+        if result.mol_id != last_mol_id:
+            num_molecules += 1
+            last_mol_id = result.mol_id
+        batch.append(_copy_result(result, source_job.id, job.id))
+        if len(batch) >= batch_size:
+            await repository.create_results(batch)
+            batch = []
+    if len(batch) > 0:
+        await repository.create_results(batch)
+
+    # the results of the finished job might have been archived (and removed from the database)
+    # while we were reading them
+    if num_molecules != source_job.num_entries_total:
+        await repository.delete_results_by_job_id(job.id)
+        await run_in_threadpool(shutil.rmtree, filesystem.get_job_dir(job.id), ignore_errors=True)
+        return False
+
+    # the job switches from a fresh job to its size in the user usage (see check_quota)
+    await repository.update_job_size(
+        job.id, source_job.num_entries_total, source_job.num_checkpoints_total
+    )
+    await repository.update_job(
+        JobUpdate(
+            id=job.id,
+            intervals_processed=source_job.entries_processed,
+            new_checkpoints_processed=source_job.checkpoints_processed,
+            new_output_formats=source_job.output_formats,
+        )
+    )
+    return True
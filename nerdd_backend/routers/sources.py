@@ -1,19 +1,21 @@
 import asyncio
 import json
 import os
+import zipfile
 from io import BytesIO
 from typing import List, Optional
 from uuid import uuid4
 
-import aiofiles
 from fastapi import APIRouter, HTTPException, Request, UploadFile
 from fastapi.encoders import jsonable_encoder
 from nerdd_link import FileSystem
+from starlette.concurrency import run_in_threadpool
 
 from ..data import RecordNotFoundError, Repository
 from ..models import Source, SourcePublic
+from ..util import BlobStore, UploadTooLargeError, get_disk_usage, hash_upload, store_upload
 
-__all__ = ["sources_router", "put_multiple_sources"]
+__all__ = ["sources_router", "put_multiple_sources", "release_source", "remove_source_file"]
 
 sources_router = APIRouter(prefix="/sources")
 
@@ -24,6 +26,8 @@ async def put_source(file: UploadFile, format: Optional[str] = None, request: Re
     app = request.app
     repository: Repository = app.state.repository
     filesystem: FileSystem = app.state.filesystem
+    blob_store: BlobStore = app.state.blob_store
+    config = app.state.config
 
     # create uuid
     uuid = uuid4()
@@ -31,22 +35,108 @@ async def put_source(file: UploadFile, format: Optional[str] = None, request: Re
     # create path to new file
     path = filesystem.get_source_file_path(str(uuid))
 
-    # store file
-    async with aiofiles.open(path, "wb") as out_file:
-        while content := await file.read(1024):  # async read chunk
-            await out_file.write(content)  # async write chunk
+    try:
+        # compute checksum before writing anything
+        if config.upload_checksum_algorithm is not None:
+            hashed_upload = await hash_upload(
+                file,
+                config.upload_checksum_algorithm,
+                chunk_size=config.upload_chunk_size,
+                max_size=config.max_upload_size,
+            )
+            checksum = hashed_upload.checksum
+        else:
+            checksum = None
+
+        # Identical uploads are separate sources, but share one file on disk (see BlobStore). If
+        # the content is known already, nothing is written.
+        deduplicate = config.deduplicate_sources and checksum is not None
+        if deduplicate and await run_in_threadpool(blob_store.link, checksum, path):
+            num_bytes = hashed_upload.num_bytes
+        else:
+            # store file
+            stored_upload = await store_upload(
+                file,
+                path,
+                chunk_size=config.upload_chunk_size,
+                max_size=config.max_upload_size,
+            )
+            num_bytes = stored_upload.num_bytes
+            if deduplicate:
+                await run_in_threadpool(blob_store.add, checksum, path)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e)) from e
 
     # create media object
     source = Source(
         id=str(uuid),
         format=format,
         filename=file.filename,
+        size=num_bytes,
+        checksum=checksum,
     )
     source = await repository.create_source(source)
 
     return SourcePublic(**source.model_dump())
 
 
+def _read_referenced_sources(path: str) -> List[dict]:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def _remove_file(path: str) -> int:
+    num_bytes = get_disk_usage(path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+    return num_bytes
+
+
+async def remove_source_file(
+    source: Source, repository: Repository, filesystem: FileSystem, blob_store: BlobStore
+) -> int:
+    # Removes the file of a deleted source. Sources generated by put_multiple_sources (format json,
+    # no filename) release the sources they reference. Returns the number of bytes freed on disk.
+    path = filesystem.get_source_file_path(source.id)
+    num_bytes = 0
+    if source.format == "json" and source.filename is None:
+        referenced_sources = await run_in_threadpool(_read_referenced_sources, path)
+        for referenced_source in referenced_sources:
+            num_bytes += await release_source(
+                referenced_source["id"], source.id, repository, filesystem, blob_store
+            )
+
+    num_bytes += await run_in_threadpool(_remove_file, path)
+    if source.checksum is not None:
+        num_bytes += await run_in_threadpool(blob_store.release, source.checksum)
+    return num_bytes
+
+
+async def release_source(
+    source_id: str,
+    owner: str,
+    repository: Repository,
+    filesystem: FileSystem,
+    blob_store: BlobStore,
+) -> int:
+    # Releases the reference of the owner (e.g. a job) on a source and removes the source if it was
+    # the last reference. Returns the number of bytes freed on disk.
+    try:
+        source = await repository.get_source_by_id(source_id)
+        if not await repository.release_source(source_id, owner):
+            return 0
+    except RecordNotFoundError:
+        # the source was deleted via DELETE /sources/{id}
+        return 0
+
+    return await remove_source_file(source, repository, filesystem, blob_store)
+
+
 @sources_router.get("/{uuid}")
 async def get_source(uuid: str, request: Request):
     app = request.app
@@ -66,20 +156,33 @@ async def delete_source(uuid: str, request: Request):
     filesystem: FileSystem = app.state.filesystem
 
     try:
-        await repository.get_source_by_id(uuid)
+        source = await repository.get_source_by_id(uuid)
+        await repository.delete_source_by_id(uuid)
     except RecordNotFoundError as e:
         raise HTTPException(status_code=404, detail="Source not found") from e
 
-    # delete file from disk
-    path = filesystem.get_source_file_path(str(uuid))
-    os.remove(path)
-
-    # delete source from database
-    await repository.delete_source_by_id(uuid)
+    # Note: the content might still be shared with identical uploads (see BlobStore)
+    await remove_source_file(source, repository, filesystem, app.state.blob_store)
 
     return {"message": "Source deleted successfully"}
 
 
+def pack_inputs(inputs: List[str]) -> bytes:
+    # Packs all inputs into a single zip archive with one member per input. The members are named
+    # user_input_{i} (just like the files that were stored for each input before), so that every
+    # molecule is still labeled with the input it was read from. The file format is detected per
+    # member, i.e. SMILES, InChI and multi-line inputs (e.g. mol blocks) can be mixed. Note: the
+    # timestamps of the members are fixed so that identical inputs result in identical archives
+    # (and checksums).
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        for i, input in enumerate(inputs):
+            info = zipfile.ZipInfo(f"user_input_{i}", date_time=(1980, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            zip_file.writestr(info, input)
+    return buffer.getvalue()
+
+
 async def put_multiple_sources(
     inputs: List[str],
     sources: List[str],
@@ -91,18 +194,11 @@ async def put_multiple_sources(
 
     all_sources = []
 
-    # create source from inputs list
+    # create one source from inputs list (packed into a single archive)
     if len(inputs) > 0:
-
-        async def _put_input(index: int, input: str):
-            file_stream = BytesIO(input.encode("utf-8"))
-            file = UploadFile(file_stream, filename=f"user_input_{index}")
-            return await put_source(file=file, request=request)
-
-        sources_from_inputs = await asyncio.gather(
-            *[_put_input(i, input) for i, input in enumerate(inputs)]
-        )
-        all_sources += sources_from_inputs
+        # Note: the archive has no file name, so that results are labeled with the member names
+        file = UploadFile(BytesIO(pack_inputs(inputs)), filename=None)
+        all_sources.append(await put_source(file=file, format="zip", request=request))
 
     # create source from sources list
     for source_id in sources:
@@ -119,11 +215,18 @@ async def put_multiple_sources(
     all_sources += sources_from_files
 
     # create one json file referencing all sources
-    all_sources_objects = [source.model_dump() for source in all_sources]
+    all_sources_objects = [source.model_dump(exclude={"references"}) for source in all_sources]
 
     # create a merged file with all sources
     file_stream = BytesIO(json.dumps(jsonable_encoder(all_sources_objects)).encode("utf-8"))
     file = UploadFile(file_stream, filename=None)
     result_source = await put_source(file=file, format="json", request=request)
 
+    # the referenced sources are kept until the merged source is removed (see remove_source_file)
+    for source in all_sources:
+        try:
+            await repository.add_source_reference(source.id, result_source.id)
+        except RecordNotFoundError as e:
+            raise HTTPException(status_code=404, detail=f"Source {source.id} not found") from e
+
     return result_source
@@ -29,13 +29,11 @@ async def check_quota(user, request):
     config = app.state.config
     repository: Repository = app.state.repository
 
-    # get all jobs started in the last 24 hours by the user
-    jobs = await repository.get_recent_jobs_by_user(user, 24 * 60 * 60)
+    # get usage of the user in the last 24 hours (maintained by create_job and the repository)
+    usage = await repository.get_user_usage(user.id, 24 * 60 * 60)
 
-    # get fresh jobs (counting of entries not yet started)
-    jobs_fresh = [job for job in jobs if job.num_entries_total is None]
-
-    if len(jobs_fresh) > 0:
+    # check for fresh jobs (counting of entries not yet started)
+    if usage.num_fresh_jobs > 0:
         raise HTTPException(
             status_code=429,
             detail=(
@@ -46,8 +44,7 @@ async def check_quota(user, request):
 
     # check if the user has reached the maximum number of molecules per day
     if hasattr(config, "quota_anonymous"):
-        num_mols_processed = sum([job.num_entries_total for job in jobs])
-        if num_mols_processed >= config.quota_anonymous:
+        if usage.num_entries >= config.quota_anonymous:
             raise HTTPException(
                 status_code=403,
                 detail=(
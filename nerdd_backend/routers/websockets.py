@@ -1,7 +1,13 @@
+import asyncio
+import functools
+from typing import Awaitable, Optional
+
 from fastapi import APIRouter, HTTPException, Query, WebSocket
 from fastapi.encoders import jsonable_encoder
 
 from ..data import RecordNotFoundError
+from ..models import JobInternal
+from ..util import ChangefeedHub, CompressedSet, coalesce
 from .jobs import augment_job, get_job
 
 __all__ = ["get_job_ws", "get_results_ws", "websockets_router"]
@@ -9,28 +15,111 @@ __all__ = ["get_job_ws", "get_results_ws", "websockets_router"]
 websockets_router = APIRouter(prefix="/websocket")
 
 
+async def run_until_disconnected(websocket: WebSocket, sender: Awaitable[None]) -> None:
+    # A websocket only notices that the client left when sending a message. If there are no
+    # changes, this might never happen and the (shared) changefeed would never be released.
+    # Therefore, we listen for the disconnect message and stop sending when it arrives.
+    async def wait_for_disconnect() -> None:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    send_task = asyncio.ensure_future(sender)
+    disconnect_task = asyncio.ensure_future(wait_for_disconnect())
+    done, pending = await asyncio.wait(
+        [send_task, disconnect_task], return_when=asyncio.FIRST_COMPLETED
+    )
+
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+    # propagate errors that occurred while sending
+    if send_task in done:
+        send_task.result()
+
+
+def count_connections(endpoint: str):
+    # tracks the number of open websocket connections per endpoint (see /metrics)
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(websocket: WebSocket, **kwargs):
+            metrics = getattr(websocket.app.state, "metrics", None)
+            if metrics is None:
+                return await handler(websocket, **kwargs)
+
+            connections = metrics.gauge(
+                "nerdd_websocket_connections", "Number of open websocket connections", ["endpoint"]
+            )
+            connections.inc(endpoint=endpoint)
+            try:
+                return await handler(websocket, **kwargs)
+            finally:
+                connections.dec(endpoint=endpoint)
+
+        return wrapper
+
+    return decorator
+
+
+def is_important_job_update(previous: Optional[JobInternal], job: JobInternal) -> bool:
+    # updates that are sent to the client immediately (even if progress updates are throttled)
+    if previous is None:
+        return True
+
+    if previous.status != job.status or previous.output_formats != job.output_formats:
+        return True
+
+    # job finished (all entries processed)
+    num_entries_processed = CompressedSet(job.entries_processed).count()
+    return num_entries_processed == job.num_entries_total
+
+
 @websockets_router.websocket("/jobs/{job_id}")
 @websockets_router.websocket("/jobs/{job_id}/")
+@count_connections("jobs")
 async def get_job_ws(websocket: WebSocket, job_id: str):
     app = websocket.app
+    config = app.state.config
     repository = app.state.repository
+    changefeed_hub: ChangefeedHub = app.state.changefeed_hub
 
     await websocket.accept()
 
     job = await get_job(job_id, websocket)
     await websocket.send_json(jsonable_encoder(job))
 
-    async for _, new in repository.get_job_changes(job_id):
-        if new is not None:
-            new = await augment_job(new, websocket)
-            await websocket.send_json(jsonable_encoder(new))
+    # all websockets watching the same job share a single changefeed
+    changes = changefeed_hub.subscribe(("jobs", job_id), lambda: repository.get_job_changes(job_id))
+
+    # During processing, the job changes with every processed entry. We send progress updates at
+    # most every websocket_job_update_interval_seconds (but important updates immediately).
+    jobs = coalesce(
+        (new async for _, new in changes if new is not None),
+        config.websocket_job_update_interval_seconds,
+        is_important_job_update,
+    )
+
+    async def send_jobs() -> None:
+        try:
+            async for new in jobs:
+                new = await augment_job(new, websocket)
+                await websocket.send_json(jsonable_encoder(new))
+        finally:
+            # closes changes as well
+            await jobs.aclose()
+
+    await run_until_disconnected(websocket, send_jobs())
 
 
 @websockets_router.websocket("/jobs/{job_id}/results")
 @websockets_router.websocket("/jobs/{job_id}/results/")
+@count_connections("results")
 async def get_results_ws(websocket: WebSocket, job_id: str, page: int = Query()):
     app = websocket.app
     repository = app.state.repository
+    changefeed_hub: ChangefeedHub = app.state.changefeed_hub
 
     await websocket.accept()
 
@@ -57,6 +146,33 @@ async def get_results_ws(websocket: WebSocket, job_id: str, page: int = Query())
     first_mol_id = page_zero_based * page_size
     last_mol_id = min(first_mol_id + page_size, num_entries) - 1
 
-    async for _, new in repository.get_result_changes(job_id, first_mol_id, last_mol_id):
-        if new is not None:
-            await websocket.send_json(jsonable_encoder(new))
+    # archived results do not change anymore (and there is no changefeed to follow)
+    if job.results_archived:
+        results = await app.state.result_store.get_results(job, first_mol_id, last_mol_id)
+
+        async def send_archived_results() -> None:
+            for result in results:
+                await websocket.send_json(jsonable_encoder(result))
+            # keep the connection open (like for pages of all other jobs)
+            await asyncio.Future()
+
+        await run_until_disconnected(websocket, send_archived_results())
+        return
+
+    # All websockets watching the same page share a single changefeed. The hub remembers the
+    # results on the page and sends them to websockets joining later.
+    changes = changefeed_hub.subscribe(
+        ("results", job_id, first_mol_id, last_mol_id),
+        lambda: repository.get_result_changes(job_id, first_mol_id, last_mol_id),
+        state_key=lambda result: result.id,
+    )
+
+    async def send_results() -> None:
+        try:
+            async for _, new in changes:
+                if new is not None:
+                    await websocket.send_json(jsonable_encoder(new))
+        finally:
+            await changes.aclose()
+
+    await run_until_disconnected(websocket, send_results())
@@ -1 +1,12 @@
+from .background_tasks import *
+from .blob_store import *
+from .changefeed_hub import *
+from .coalesce import *
 from .compressed_set import *
+from .disk_usage import *
+from .indexed_observable_list import *
+from .journal import *
+from .metrics import *
+from .page_cache import *
+from .result_archive import *
+from .upload import *
@@ -0,0 +1,33 @@
+import asyncio
+import logging
+from typing import Awaitable, Set
+
+__all__ = ["BackgroundTasks"]
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundTasks:
+    # Runs work in the background that must not delay a response (or a consumer). The event loop
+    # only keeps weak references to tasks, so the running tasks are kept here until they finish.
+    def __init__(self) -> None:
+        self._tasks: Set[asyncio.Task] = set()
+
+    def start(self, coroutine: Awaitable, name: str) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(lambda task: self._on_done(task, name))
+        return task
+
+    def _on_done(self, task: asyncio.Task, name: str) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background task {name} failed", exc_info=task.exception())
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    async def wait(self) -> None:
+        # waits for all tasks (e.g. on shutdown), including the ones started in the meantime
+        while len(self._tasks) > 0:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,54 @@
+import os
+from uuid import uuid4
+
+__all__ = ["BlobStore"]
+
+
+class BlobStore:
+    # Content-addressed storage for deduplicating files (see deduplicate_sources). Every blob is a
+    # file named by the checksum of its content and every file with that content is a hard link to
+    # it. This way, the file system counts the references: the content is freed when the last file
+    # is removed. Creating a link fails if the target exists already, so looking up and inserting
+    # a blob is a single atomic operation (concurrent identical uploads end up sharing one blob).
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get_path(self, checksum: str) -> str:
+        return os.path.join(self.directory, checksum)
+
+    def link(self, checksum: str, path: str) -> bool:
+        # creates a file at path with the content of the blob (returns False if there is no blob)
+        try:
+            os.link(self.get_path(checksum), path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def add(self, checksum: str, path: str) -> None:
+        # makes the file at path the blob with the given checksum or, if there is one already,
+        # replaces the file with a link to the existing blob
+        try:
+            os.link(path, self.get_path(checksum))
+            return
+        except FileExistsError:
+            pass
+
+        tmp_path = f"{path}.{uuid4().hex}"
+        if self.link(checksum, tmp_path):
+            os.replace(tmp_path, path)
+        # otherwise, the blob was removed in the meantime (the file keeps its own copy)
+
+    def release(self, checksum: str) -> int:
+        # Removes the blob if no other file links to it. Returns the number of bytes freed.
+        # Note: if a new file is linked to the blob right now, only the blob name is removed (the
+        # file keeps the content).
+        path = self.get_path(checksum)
+        try:
+            stat = os.stat(path)
+            if stat.st_nlink > 1:
+                return 0
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        return stat.st_size
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import (
+    Any,
+    AsyncIterable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+__all__ = ["ChangefeedHub"]
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+Change = Tuple[Optional[T], Optional[T]]
+
+# marks the end of a feed in the subscriber queues
+_END = object()
+
+
+class _Feed(Generic[T]):
+    def __init__(self, state_key: Optional[Callable[[T], Hashable]]) -> None:
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+        # latest version of every item seen on the feed (only if state_key is given)
+        self.state_key = state_key
+        self.state: Dict[Hashable, T] = {}
+
+    def publish(self, item: Any) -> None:
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # The subscriber is too slow. Instead of blocking all other subscribers (or
+                # silently dropping changes), we end its subscription.
+                logger.warning("Subscriber of changefeed is too slow, closing subscription")
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(_END)
+
+
+class ChangefeedHub:
+    # Shares changefeeds between multiple subscribers (e.g. all websockets watching the same job).
+    # The first subscriber of a key starts the underlying feed, every change is pushed to the
+    # (bounded) queues of all subscribers and the feed is stopped when the last subscriber leaves.
+    def __init__(self, max_queue_size: int = 1000) -> None:
+        self.max_queue_size = max_queue_size
+        self._feeds: Dict[Hashable, _Feed] = {}
+
+    def num_feeds(self) -> int:
+        return len(self._feeds)
+
+    def num_subscribers(self) -> int:
+        return sum(len(feed.subscribers) for feed in self._feeds.values())
+
+    async def subscribe(
+        self,
+        key: Hashable,
+        create_feed: Callable[[], AsyncIterable[Change]],
+        state_key: Optional[Callable[[Any], Hashable]] = None,
+    ) -> AsyncIterable[Change]:
+        # If state_key is provided, the hub remembers the latest version of every item (identified
+        # by state_key) and replays them to subscribers joining later. This is necessary for feeds
+        # that include the initial state (e.g. include_initial=True in RethinkDB).
+        feed = self._feeds.get(key)
+        if feed is None:
+            feed = self._feeds[key] = _Feed(state_key)
+            feed.task = asyncio.create_task(self._run_feed(key, feed, create_feed))
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue_size + len(feed.state))
+        for item in feed.state.values():
+            queue.put_nowait((None, item))
+        feed.subscribers.add(queue)
+
+        try:
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            feed.subscribers.discard(queue)
+            if len(feed.subscribers) == 0 and self._feeds.get(key) is feed:
+                del self._feeds[key]
+                feed.task.cancel()
+
+    async def _run_feed(
+        self, key: Hashable, feed: _Feed, create_feed: Callable[[], AsyncIterable[Change]]
+    ) -> None:
+        try:
+            async for change in create_feed():
+                if feed.state_key is not None:
+                    old, new = change
+                    if new is not None:
+                        feed.state[feed.state_key(new)] = new
+                    elif old is not None:
+                        feed.state.pop(feed.state_key(old), None)
+                feed.publish(change)
+            feed.publish(_END)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error in changefeed {key}", exc_info=True)
+            feed.publish(e)
+        finally:
+            # new subscribers have to start a new feed
+            if self._feeds.get(key) is feed:
+                del self._feeds[key]
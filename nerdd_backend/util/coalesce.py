@@ -0,0 +1,70 @@
+import asyncio
+from typing import AsyncIterable, Callable, Optional, TypeVar
+
+__all__ = ["coalesce"]
+
+T = TypeVar("T")
+
+# marks that there is no pending item
+_NONE = object()
+
+
+async def coalesce(
+    items: AsyncIterable[T],
+    min_interval: float,
+    is_urgent: Callable[[Optional[T], T], bool] = lambda previous, item: False,
+) -> AsyncIterable[T]:
+    # Yields the most recent item of the given iterable, but at most once every min_interval
+    # seconds. Intermediate items are dropped. Urgent items (is_urgent(previous, item) where
+    # previous is the last yielded item) and the last item of the iterable are yielded immediately.
+    loop = asyncio.get_running_loop()
+    event = asyncio.Event()
+    latest = _NONE
+    done = False
+    error: Optional[BaseException] = None
+
+    async def consume() -> None:
+        nonlocal latest, done, error
+        try:
+            async for item in items:
+                latest = item
+                event.set()
+        except Exception as e:
+            error = e
+        finally:
+            done = True
+            event.set()
+
+    task = asyncio.create_task(consume())
+
+    previous = None
+    last_yielded_at = float("-inf")
+    try:
+        while not done or latest is not _NONE:
+            await event.wait()
+            event.clear()
+
+            while latest is not _NONE:
+                item = latest
+                remaining = last_yielded_at + min_interval - loop.time()
+                if remaining > 0 and not done and not is_urgent(previous, item):
+                    try:
+                        # wait until the interval is over (or a new item arrives)
+                        await asyncio.wait_for(event.wait(), remaining)
+                        event.clear()
+                        continue
+                    except asyncio.TimeoutError:
+                        item = latest
+
+                latest = _NONE
+                previous = item
+                last_yielded_at = loop.time()
+                yield item
+
+        if error is not None:
+            raise error
+    finally:
+        # Wait until the consumer stopped iterating. Cancelling it closes the underlying iterable,
+        # so callers must not close it themselves (it might still be running otherwise).
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -1,45 +1,105 @@
-from typing import List, Optional, Tuple
+from bisect import bisect_right
+from heapq import merge
+from typing import Iterable, List, Optional, Tuple
 
 __all__ = ["CompressedSet"]
 
 
 class CompressedSet:
+    # A set of integers stored as a sorted list of disjoint, non-adjacent intervals [start, end).
+    # For example, the set {0, 1, 2, 5} is stored as [(0, 3), (5, 6)].
     def __init__(self, intervals: Optional[List[Tuple[int, int]]] = None):
         if intervals is None or len(intervals) == 0:
             intervals = []
-        # copy the list of intervals
-        self.intervals = list(intervals)
+        # copy the list of intervals (intervals might be lists if they were loaded from json)
+        self.intervals = [(start, end) for start, end in intervals]
+        self._count = sum(end - start for start, end in self.intervals)
 
     def add(self, x: int) -> "CompressedSet":
-        i = 0
-        while i < len(self.intervals) and self.intervals[i][0] <= x:
-            i += 1
-        i = max(0, i - 1)
-        if i >= len(self.intervals):
-            self.intervals.append((x, x + 1))
+        # find the first interval that starts after x
+        i = bisect_right(self.intervals, (x, float("inf")))
+
+        # x is already contained in the previous interval
+        if i > 0 and x < self.intervals[i - 1][1]:
+            return self
+
+        extends_left = i > 0 and self.intervals[i - 1][1] == x
+        extends_right = i < len(self.intervals) and self.intervals[i][0] == x + 1
+
+        if extends_left and extends_right:
+            # x closes the gap between two intervals
+            self.intervals[i - 1] = (self.intervals[i - 1][0], self.intervals[i][1])
+            del self.intervals[i]
+        elif extends_left:
+            self.intervals[i - 1] = (self.intervals[i - 1][0], x + 1)
+        elif extends_right:
+            self.intervals[i] = (x, self.intervals[i][1])
         else:
-            left, right = self.intervals[i]
-            if left <= x < right:
-                return self
-            elif x < left:
-                self.intervals.insert(i, (x, x + 1))
+            self.intervals.insert(i, (x, x + 1))
+
+        self._count += 1
+        return self
+
+    def update(self, xs: Iterable[int]) -> "CompressedSet":
+        # compress the new elements into intervals and merge them with the existing ones
+        new_intervals: List[Tuple[int, int]] = []
+        for x in sorted(set(xs)):
+            if len(new_intervals) > 0 and new_intervals[-1][1] == x:
+                new_intervals[-1] = (new_intervals[-1][0], x + 1)
             else:
-                self.intervals.insert(i + 1, (x, x + 1))
-                i += 1
-        if i > 0 and self.intervals[i - 1][1] == self.intervals[i][0]:
-            self.intervals[i - 1] = (self.intervals[i - 1][0], self.intervals[i][1])
-            self.intervals.pop(i)
-            i -= 1
-        if i < len(self.intervals) - 1 and self.intervals[i][1] == self.intervals[i + 1][0]:
-            self.intervals[i] = (self.intervals[i][0], self.intervals[i + 1][1])
-            self.intervals.pop(i + 1)
+                new_intervals.append((x, x + 1))
+
+        return self._merge(new_intervals)
+
+    def union(self, other: "CompressedSet") -> "CompressedSet":
+        return CompressedSet(self.intervals)._merge(other.intervals)
+
+    def _add_interval(self, start: int, end: int) -> None:
+        # find the range [lo, hi) of intervals that overlap or touch [start, end)
+        lo = bisect_right(self.intervals, (start, float("inf")))
+        if lo > 0 and self.intervals[lo - 1][1] >= start:
+            lo -= 1
+        hi = bisect_right(self.intervals, (end, float("inf")), lo)
+
+        if lo < hi:
+            start = min(start, self.intervals[lo][0])
+            end = max(end, self.intervals[hi - 1][1])
+            self._count -= sum(e - s for s, e in self.intervals[lo:hi])
+
+        self.intervals[lo:hi] = [(start, end)]
+        self._count += end - start
+
+    def _merge(self, intervals: List[Tuple[int, int]]) -> "CompressedSet":
+        # few intervals are inserted one by one (binary search), many are merged in a single pass
+        if len(intervals) * 16 < len(self.intervals):
+            for start, end in intervals:
+                self._add_interval(start, end)
+            return self
+
+        merged: List[Tuple[int, int]] = []
+        for start, end in merge(self.intervals, intervals):
+            if len(merged) > 0 and start <= merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+
+        self.intervals = merged
+        self._count = sum(end - start for start, end in merged)
         return self
 
     def count(self) -> int:
-        return sum(j - i for i, j in self.intervals)
+        return self._count
 
     def to_intervals(self) -> List[Tuple[int, int]]:
         return self.intervals
 
+    def __contains__(self, x: int) -> bool:
+        i = bisect_right(self.intervals, (x, float("inf")))
+        return i > 0 and x < self.intervals[i - 1][1]
+
+    def __len__(self) -> int:
+        return self._count
+
     def __repr__(self) -> str:
         return f"CompressedSet({self.intervals})"
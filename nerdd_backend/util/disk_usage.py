@@ -0,0 +1,23 @@
+import os
+
+__all__ = ["get_disk_usage"]
+
+
+def get_disk_usage(path: str) -> int:
+    # Number of bytes that are freed when deleting a file or a directory (recursively). Files
+    # with other hard links (e.g. shared with reused jobs) are not counted, because deleting them
+    # does not free any space. Missing paths (e.g. deleted concurrently) count as 0 bytes.
+    num_bytes = 0
+    if os.path.isdir(path):
+        paths = (os.path.join(root, file) for root, _, files in os.walk(path) for file in files)
+    else:
+        paths = iter([path])
+
+    for file_path in paths:
+        try:
+            stat = os.lstat(file_path)
+        except OSError:
+            continue
+        if stat.st_nlink == 1:
+            num_bytes += stat.st_size
+    return num_bytes
@@ -0,0 +1,126 @@
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from nerdd_link.utils import ObservableList
+
+__all__ = ["Index", "IndexedObservableList"]
+
+T = TypeVar("T")
+
+
+class Index(Generic[T]):
+    # A secondary index mapping a key (e.g. the job id of a result) to all items with that key. If
+    # order_by is provided, the items of each key are kept sorted by that value and can be queried
+    # by range.
+    def __init__(
+        self,
+        key: Callable[[T], Any],
+        order_by: Optional[Callable[[T], Any]] = None,
+    ) -> None:
+        self.key = key
+        self.order_by = order_by
+        self._items: Dict[Any, Dict[str, T]] = {}
+        # sorted order values and the corresponding ids (for each key)
+        self._values: Dict[Any, List[Any]] = {}
+        self._ids: Dict[Any, List[str]] = {}
+
+    def add(self, id: str, item: T) -> None:
+        key = self.key(item)
+        self._items.setdefault(key, {})[id] = item
+
+        if self.order_by is not None:
+            value = self.order_by(item)
+            values = self._values.setdefault(key, [])
+            i = bisect_right(values, value)
+            values.insert(i, value)
+            self._ids.setdefault(key, []).insert(i, id)
+
+    def remove(self, id: str, item: T) -> None:
+        key = self.key(item)
+        items = self._items[key]
+        del items[id]
+        if len(items) == 0:
+            del self._items[key]
+
+        if self.order_by is not None:
+            values = self._values[key]
+            ids = self._ids[key]
+            i = bisect_left(values, self.order_by(item))
+            while ids[i] != id:
+                i += 1
+            del values[i]
+            del ids[i]
+            if len(values) == 0:
+                del self._values[key]
+                del self._ids[key]
+
+    def get_all(self, key: Any) -> List[T]:
+        if self.order_by is not None:
+            return self.get_range(key)
+        return list(self._items.get(key, {}).values())
+
+    def get_range(self, key: Any, start: Any = None, end: Any = None) -> List[T]:
+        # returns all items with the given key and start <= order_by(item) <= end (sorted)
+        assert self.order_by is not None, "range queries require an ordered index"
+        if key not in self._items:
+            return []
+
+        values = self._values[key]
+        lo = 0 if start is None else bisect_left(values, start)
+        hi = len(values) if end is None else bisect_right(values, end)
+
+        items = self._items[key]
+        return [items[id] for id in self._ids[key][lo:hi]]
+
+
+class IndexedObservableList(ObservableList[T]):
+    # An ObservableList that stores its items by primary key and maintains secondary indexes.
+    # All modifications (append, update, remove) go through _apply_change, so the indexes are
+    # always consistent with the change feed.
+    def __init__(
+        self,
+        primary_key: Callable[[T], str] = lambda item: item.id,  # type: ignore
+        indexes: Optional[Dict[str, Index[T]]] = None,
+    ) -> None:
+        super().__init__()
+        self.primary_key = primary_key
+        self.indexes = indexes or {}
+        self._items_by_id: Dict[str, T] = {}
+
+    def _apply_change(self, change: Tuple[Optional[T], Optional[T]]) -> None:
+        old, new = change
+
+        if old is not None:
+            old_id = self.primary_key(old)
+            for index in self.indexes.values():
+                index.remove(old_id, old)
+            # keep the position of the item if it is replaced by an item with the same id
+            if new is None or self.primary_key(new) != old_id:
+                del self._items_by_id[old_id]
+
+        if new is not None:
+            new_id = self.primary_key(new)
+            self._items_by_id[new_id] = new
+            for index in self.indexes.values():
+                index.add(new_id, new)
+
+        # add change to the list of changes
+        self._changes.append(change)
+
+    def get(self, id: str) -> Optional[T]:
+        return self._items_by_id.get(id)
+
+    def get_all(self, key: Any, index: str) -> List[T]:
+        return self.indexes[index].get_all(key)
+
+    def get_range(self, key: Any, start: Any = None, end: Any = None, *, index: str) -> List[T]:
+        return self.indexes[index].get_range(key, start, end)
+
+    def __len__(self) -> int:
+        return len(self._items_by_id)
+
+    def get_items(self) -> List[T]:
+        return list(self._items_by_id.values())
+
+    def __getitem__(self, index: int) -> T:
+        return self.get_items()[index]
@@ -0,0 +1,67 @@
+import fcntl
+import json
+import os
+from typing import Any, Dict, Iterator, List, Tuple
+from uuid import uuid4
+
+__all__ = ["Journal", "JournalFile"]
+
+# A journal makes messages durable that were received (and acknowledged) but are only processed
+# later, e.g. results that are buffered to be written in batches. Every buffer gets its own file
+# that is removed once the buffer was processed. Writers hold an exclusive lock on their files, so
+# that files that can be locked by someone else were left behind by a process that stopped before
+# processing them (and can be recovered).
+
+
+class JournalFile:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BaseException:
+            self._file.close()
+            raise
+
+    def append(self, record: Dict[str, Any]) -> None:
+        # Note: the record is handed to the operating system (but not synced to disk), which
+        # survives a crash of the process and is cheap enough to be done on the event loop
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def remove(self) -> None:
+        os.remove(self.path)
+        self._file.close()
+
+    def close(self) -> None:
+        # keeps the file (it is recovered later)
+        self._file.close()
+
+
+class Journal:
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def open(self) -> JournalFile:
+        return JournalFile(os.path.join(self.directory, f"{uuid4().hex}.ndjson"))
+
+    def recover(self) -> Iterator[Tuple[JournalFile, List[Dict[str, Any]]]]:
+        # yields the files of stopped writers (locked, remove them after processing the records)
+        for name in sorted(os.listdir(self.directory)):
+            try:
+                journal_file = JournalFile(os.path.join(self.directory, name))
+            except BlockingIOError:
+                # still in use (or recovered by another process right now)
+                continue
+
+            with open(journal_file.path, encoding="utf-8") as f:
+                # the last line might be incomplete if the writer stopped while appending
+                records = []
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        pass
+
+            yield journal_file, records
@@ -0,0 +1,225 @@
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+__all__ = ["Counter", "Gauge", "Histogram", "MetricsRegistry"]
+
+# Metrics in the Prometheus text exposition format (version 0.0.4). Metrics are only updated from
+# the event loop, so no locking is needed.
+
+Labels = Dict[str, str]
+Sample = Tuple[str, Labels, float]
+Callback = Callable[[], Iterable[Tuple[Labels, float]]]
+
+# default buckets of Prometheus client libraries (in seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name: str, labels: Labels, value: float) -> str:
+    if len(labels) == 0:
+        return f"{name} {_format_value(value)}"
+    formatted_labels = ",".join(f'{key}="{_escape(str(v))}"' for key, v in labels.items())
+    return f"{name}{{{formatted_labels}}} {_format_value(value)}"
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        callback: Optional[Callback] = None,
+    ) -> None:
+        # If callback is given, values are also computed on every scrape (e.g. from the statistics
+        # of a cache that are collected anyway).
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.callback = callback
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels[label_name]) for label_name in self.label_names)
+
+    def _labels(self, key: Tuple[str, ...]) -> Labels:
+        return {label_name: key[i] for i, label_name in enumerate(self.label_names)}
+
+    def _collect_callback(self) -> Iterable[Sample]:
+        if self.callback is not None:
+            for labels, value in self.callback():
+                yield self.name, labels, value
+
+    def collect(self) -> Iterable[Sample]:
+        return self._collect_callback()
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(_format_sample(*sample) for sample in self.collect())
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        callback: Optional[Callback] = None,
+    ) -> None:
+        super().__init__(name, documentation, label_names, callback)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: object) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> Iterable[Sample]:
+        yield from self._collect_callback()
+        for key, value in self._values.items():
+            yield self.name, self._labels(key), value
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        callback: Optional[Callback] = None,
+    ) -> None:
+        super().__init__(name, documentation, label_names, callback)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: object) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: object) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: object) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels: object) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self) -> Iterable[Sample]:
+        yield from self._collect_callback()
+        for key, value in self._values.items():
+            yield self.name, self._labels(key), value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self.buckets = sorted(buckets)
+        # maps labels to (counts per bucket (not cumulative, last one is +Inf), sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = entry
+        # buckets are inclusive upper bounds (le)
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def get_count(self, **labels: object) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry is not None else 0
+
+    def collect(self) -> Iterable[Sample]:
+        for key, (counts, total) in self._values.items():
+            labels = self._labels(key)
+            cumulative = 0
+            upper_bounds = [*self.buckets, math.inf]
+            for i, count in enumerate(counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    {**labels, "le": _format_value(upper_bounds[i])},
+                    cumulative,
+                )
+            yield f"{self.name}_sum", labels, total[0]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        # registering a metric twice returns the existing one (e.g. one metric for all actions)
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+                raise ValueError(f"Metric {metric.name} was registered with another definition")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        callback: Optional[Callback] = None,
+    ) -> Counter:
+        return self._register(Counter(name, documentation, label_names, callback))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        callback: Optional[Callback] = None,
+    ) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names, callback))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
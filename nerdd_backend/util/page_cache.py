@@ -0,0 +1,87 @@
+import gzip
+from collections import OrderedDict
+from typing import Dict, Hashable, NamedTuple, Optional, Set, Tuple
+
+__all__ = ["CachedPage", "PageCache"]
+
+
+class CachedPage(NamedTuple):
+    body: bytes
+    # gzip compressed body (None if compression is disabled)
+    gzipped_body: Optional[bytes]
+    etag: str
+
+    @property
+    def num_bytes(self) -> int:
+        return len(self.body) + (len(self.gzipped_body) if self.gzipped_body is not None else 0)
+
+
+class PageCache:
+    # LRU cache of serialized pages that never change again (e.g. result pages of finished jobs).
+    # The memory is bounded by the total number of bytes of all cached bodies. Pages are grouped by
+    # job, so that all pages of a job can be invalidated at once.
+    def __init__(self, max_bytes: int, compress: bool = True, compress_level: int = 6) -> None:
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.compress_level = compress_level
+
+        self._pages: OrderedDict[Tuple[str, Hashable], CachedPage] = OrderedDict()
+        self._keys_by_job: Dict[str, Set[Hashable]] = {}
+        self._num_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, job_id: str, key: Hashable) -> Optional[CachedPage]:
+        page = self._pages.get((job_id, key))
+        if page is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._pages.move_to_end((job_id, key))
+        return page
+
+    def put(self, job_id: str, key: Hashable, body: bytes, etag: str) -> CachedPage:
+        gzipped_body = gzip.compress(body, self.compress_level) if self.compress else None
+        page = CachedPage(body, gzipped_body, etag)
+
+        # pages larger than the cache are not stored
+        if page.num_bytes > self.max_bytes:
+            return page
+
+        self._remove(job_id, key)
+        self._pages[(job_id, key)] = page
+        self._keys_by_job.setdefault(job_id, set()).add(key)
+        self._num_bytes += page.num_bytes
+
+        while self._num_bytes > self.max_bytes:
+            (evicted_job_id, evicted_key) = next(iter(self._pages))
+            self._remove(evicted_job_id, evicted_key)
+
+        return page
+
+    def invalidate(self, job_id: str) -> None:
+        for key in list(self._keys_by_job.get(job_id, [])):
+            self._remove(job_id, key)
+
+    def _remove(self, job_id: str, key: Hashable) -> None:
+        page = self._pages.pop((job_id, key), None)
+        if page is None:
+            return
+
+        self._num_bytes -= page.num_bytes
+        keys = self._keys_by_job[job_id]
+        keys.discard(key)
+        if len(keys) == 0:
+            del self._keys_by_job[job_id]
+
+    def get_stats(self) -> Dict[str, float]:
+        num_requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / num_requests if num_requests > 0 else 0.0,
+            "num_pages": len(self._pages),
+            "num_bytes": self._num_bytes,
+        }
@@ -0,0 +1,259 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from uuid import uuid4
+
+__all__ = ["ResultArchive", "ResultArchiveWriter", "RowGroup"]
+
+# File layout:
+#   MAGIC | dictionary | row group 0 | row group 1 | ... | footer (json) | footer length | MAGIC
+# Each row group holds the records of consecutive molecules (the records of a molecule are never
+# split across row groups) as zlib-compressed json with one list per column. The footer contains
+# the mol_id range and the byte range of every row group, so that a range of molecules can be read
+# without decompressing the rest of the file. Readers map the file into memory and only touch the
+# byte ranges of the requested row groups.
+# Small row groups (e.g. one per page) compress badly on their own. Therefore, all row groups are
+# compressed with a preset dictionary (a sample of the first row groups) that is stored once.
+MAGIC = b"NRDARCH1"
+TRAILER = struct.Struct("<Q8s")
+# maximum size of a zlib dictionary
+DICTIONARY_SIZE = 32 * 1024
+
+
+class RowGroup(NamedTuple):
+    first_mol_id: int
+    last_mol_id: int
+    offset: int
+    length: int
+    num_records: int
+
+
+def _serialize_row_group(records: List[Dict[str, Any]]) -> bytes:
+    # store the values of each key (column) in a list: similar values are next to each other,
+    # which compresses better than a list of records
+    keys = list(dict.fromkeys(key for record in records for key in record))
+    columns = {key: [record.get(key) for record in records] for key in keys}
+    # keys that are missing in a record are different from keys with value None
+    missing = {
+        key: [i for i, record in enumerate(records) if key not in record]
+        for key in keys
+        if any(key not in record for record in records)
+    }
+    data = {"num_records": len(records), "columns": columns, "missing": missing}
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def _deserialize_row_group(buffer: bytes) -> List[Dict[str, Any]]:
+    data = json.loads(buffer)
+    columns = data["columns"]
+    missing = {key: set(indices) for key, indices in data["missing"].items()}
+    return [
+        {
+            key: values[i]
+            for key, values in columns.items()
+            if key not in missing or i not in missing[key]
+        }
+        for i in range(data["num_records"])
+    ]
+
+
+class ResultArchiveWriter:
+    def __init__(
+        self,
+        path: str,
+        row_group_size: int = 1000,
+        compress_level: int = 6,
+        mol_ids_per_row_group: Optional[int] = None,
+    ) -> None:
+        # A row group ends after row_group_size records (at the next molecule). If
+        # mol_ids_per_row_group is given, a row group also ends at every multiple of it, so that
+        # row groups can be aligned with pages (page i = mol_ids [i * page_size, (i+1) *
+        # page_size)).
+        self.path = path
+        self.row_group_size = row_group_size
+        self.compress_level = compress_level
+        self.mol_ids_per_row_group = mol_ids_per_row_group
+        # write to a temporary file that replaces the archive in close (readers never see a
+        # partially written archive)
+        self._tmp_path = f"{path}.{uuid4().hex}.tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(MAGIC)
+        self._offset = len(MAGIC)
+        self._row_groups: List[RowGroup] = []
+        self._records: List[Dict[str, Any]] = []
+        # row groups are kept (uncompressed) until there is enough data for the dictionary
+        self._dictionary: Optional[bytes] = None
+        self._dictionary_range: Optional[Tuple[int, int]] = None
+        self._pending: List[Tuple[int, int, int, bytes]] = []
+        self._num_pending_bytes = 0
+
+    def write(self, records: Iterable[Dict[str, Any]]) -> None:
+        # records have to be sorted by mol_id
+        for record in records:
+            if len(self._records) > 0 and self._is_new_row_group(
+                self._records[-1]["mol_id"], record["mol_id"]
+            ):
+                self._flush()
+            self._records.append(record)
+
+    def _is_new_row_group(self, last_mol_id: int, mol_id: int) -> bool:
+        if mol_id == last_mol_id:
+            return False
+        if len(self._records) >= self.row_group_size:
+            return True
+        n = self.mol_ids_per_row_group
+        return n is not None and last_mol_id // n != mol_id // n
+
+    def _flush(self) -> None:
+        if len(self._records) == 0:
+            return
+        row_group = (
+            self._records[0]["mol_id"],
+            self._records[-1]["mol_id"],
+            len(self._records),
+            _serialize_row_group(self._records),
+        )
+        self._records = []
+
+        if self._dictionary is not None:
+            self._write_row_group(*row_group)
+            return
+
+        self._pending.append(row_group)
+        self._num_pending_bytes += len(row_group[3])
+        if self._num_pending_bytes >= DICTIONARY_SIZE:
+            self._write_dictionary()
+
+    def _write_dictionary(self) -> None:
+        # zlib prefers the most common strings at the end of the dictionary
+        self._dictionary = b"".join(row_group[3] for row_group in self._pending)[-DICTIONARY_SIZE:]
+        self._file.write(self._dictionary)
+        self._dictionary_range = (self._offset, len(self._dictionary))
+        self._offset += len(self._dictionary)
+        self._write_pending()
+
+    def _write_pending(self) -> None:
+        for row_group in self._pending:
+            self._write_row_group(*row_group)
+        self._pending = []
+
+    def _write_row_group(
+        self, first_mol_id: int, last_mol_id: int, num_records: int, data: bytes
+    ) -> None:
+        if self._dictionary is not None:
+            compressor = zlib.compressobj(self.compress_level, zdict=self._dictionary)
+        else:
+            compressor = zlib.compressobj(self.compress_level)
+        buffer = compressor.compress(data) + compressor.flush()
+        self._file.write(buffer)
+        self._row_groups.append(
+            RowGroup(first_mol_id, last_mol_id, self._offset, len(buffer), num_records)
+        )
+        self._offset += len(buffer)
+
+    def close(self) -> int:
+        # returns the size of the archive in bytes
+        self._flush()
+        # a small archive is compressed as is (a dictionary would be as large as the data)
+        self._write_pending()
+
+        footer = json.dumps(
+            {"version": 1, "dictionary": self._dictionary_range, "row_groups": self._row_groups}
+        ).encode("utf-8")
+        self._file.write(footer)
+        self._file.write(TRAILER.pack(len(footer), MAGIC))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        return self._offset + len(footer) + TRAILER.size
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class ResultArchive:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # Note: the mapping stays valid after closing the file (and after deleting it)
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            size = len(self._mmap)
+            footer_length, magic = TRAILER.unpack(self._mmap[size - TRAILER.size :])
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a result archive")
+            footer = json.loads(
+                self._mmap[size - TRAILER.size - footer_length : size - TRAILER.size]
+            )
+        except Exception:
+            self._mmap.close()
+            raise
+
+        if footer["dictionary"] is not None:
+            offset, length = footer["dictionary"]
+            self._dictionary: Optional[bytes] = self._mmap[offset : offset + length]
+        else:
+            self._dictionary = None
+
+        self.row_groups = [RowGroup(*row_group) for row_group in footer["row_groups"]]
+        self._last_mol_ids = [row_group.last_mol_id for row_group in self.row_groups]
+
+    @property
+    def closed(self) -> bool:
+        return self._mmap.closed
+
+    @property
+    def num_records(self) -> int:
+        return sum(row_group.num_records for row_group in self.row_groups)
+
+    def _read_row_group(self, row_group: RowGroup) -> List[Dict[str, Any]]:
+        # Note: slicing does not move the position of the mapping (safe to use from several
+        # threads) and only reads the pages of the row group from disk
+        buffer = self._mmap[row_group.offset : row_group.offset + row_group.length]
+        if self._dictionary is not None:
+            decompressor = zlib.decompressobj(zdict=self._dictionary)
+        else:
+            decompressor = zlib.decompressobj()
+        return _deserialize_row_group(decompressor.decompress(buffer) + decompressor.flush())
+
+    def iter_row_groups(
+        self, start_mol_id: Optional[int] = None, end_mol_id: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        # yields the records with start_mol_id <= mol_id <= end_mol_id (one list per row group)
+        i = 0 if start_mol_id is None else bisect_left(self._last_mol_ids, start_mol_id)
+        while i < len(self.row_groups):
+            row_group = self.row_groups[i]
+            if end_mol_id is not None and row_group.first_mol_id > end_mol_id:
+                break
+            yield [
+                record
+                for record in self._read_row_group(row_group)
+                if (start_mol_id is None or record["mol_id"] >= start_mol_id)
+                and (end_mol_id is None or record["mol_id"] <= end_mol_id)
+            ]
+            i += 1
+
+    def read(
+        self,
+        start_mol_id: Optional[int] = None,
+        end_mol_id: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        records: List[Dict[str, Any]] = []
+        for row_group_records in self.iter_row_groups(start_mol_id, end_mol_id):
+            records.extend(row_group_records)
+            if limit is not None and len(records) >= limit:
+                break
+        return records[:limit]
+
+    def close(self) -> None:
+        self._mmap.close()
@@ -0,0 +1,149 @@
+import hashlib
+import os
+from typing import BinaryIO, NamedTuple, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+
+__all__ = ["StoredUpload", "UploadTooLargeError", "hash_upload", "store_upload"]
+
+
+class UploadTooLargeError(Exception):
+    def __init__(self, max_size: int):
+        super().__init__(f"The uploaded file exceeds the maximum size of {max_size} bytes")
+        self.max_size = max_size
+
+
+class StoredUpload(NamedTuple):
+    num_bytes: int
+    # hex digest of the file content (None if no hash algorithm was given)
+    checksum: Optional[str]
+
+
+async def store_upload(
+    file: UploadFile,
+    path: str,
+    chunk_size: int = 1024 * 1024,
+    max_size: Optional[int] = None,
+    hash_algorithm: Optional[str] = None,
+) -> StoredUpload:
+    # Stores an uploaded file at path. The file is copied in a single worker thread (instead of
+    # one thread hop per chunk) and the partial file is removed if the upload is too large.
+    if max_size is not None and file.size is not None and file.size > max_size:
+        raise UploadTooLargeError(max_size)
+
+    try:
+        return await run_in_threadpool(
+            _store_file, file.file, path, chunk_size, max_size, hash_algorithm
+        )
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+async def hash_upload(
+    file: UploadFile,
+    hash_algorithm: str,
+    chunk_size: int = 1024 * 1024,
+    max_size: Optional[int] = None,
+) -> StoredUpload:
+    # Computes the checksum of an uploaded file without storing it (e.g. to find duplicates
+    # before writing anything).
+    if max_size is not None and file.size is not None and file.size > max_size:
+        raise UploadTooLargeError(max_size)
+
+    return await run_in_threadpool(_hash_file, file.file, chunk_size, max_size, hash_algorithm)
+
+
+def _hash_file(
+    source: BinaryIO, chunk_size: int, max_size: Optional[int], hash_algorithm: str
+) -> StoredUpload:
+    source.seek(0)
+
+    hash = hashlib.new(hash_algorithm)
+    num_bytes = 0
+    while chunk := source.read(chunk_size):
+        num_bytes += len(chunk)
+        _check_size(num_bytes, max_size)
+        hash.update(chunk)
+
+    return StoredUpload(num_bytes, hash.hexdigest())
+
+
+def _store_file(
+    source: BinaryIO,
+    path: str,
+    chunk_size: int,
+    max_size: Optional[int],
+    hash_algorithm: Optional[str],
+) -> StoredUpload:
+    source.seek(0)
+
+    # Fast paths if the content does not have to be read (no checksum):
+    # * link the file if it exists on disk already (e.g. a named temporary file)
+    # * copy the file in the kernel (sendfile) if it was spooled to an anonymous file on disk
+    if hash_algorithm is None:
+        source_path = _get_path(source)
+        if source_path is not None:
+            num_bytes = os.stat(source_path).st_size
+            _check_size(num_bytes, max_size)
+            try:
+                os.link(source_path, path)
+                return StoredUpload(num_bytes, None)
+            except OSError:
+                # e.g. the file is on a different file system
+                pass
+
+        fileno = _get_fileno(source)
+        if fileno is not None:
+            num_bytes = os.fstat(fileno).st_size
+            _check_size(num_bytes, max_size)
+            with open(path, "wb") as out_file:
+                offset = 0
+                while offset < num_bytes:
+                    num_sent = os.sendfile(
+                        out_file.fileno(), fileno, offset, min(chunk_size, num_bytes - offset)
+                    )
+                    if num_sent == 0:
+                        break
+                    offset += num_sent
+            return StoredUpload(offset, None)
+
+    # general case: copy the content in large chunks (and compute the checksum on the fly)
+    hash = hashlib.new(hash_algorithm) if hash_algorithm is not None else None
+    num_bytes = 0
+    with open(path, "wb") as out_file:
+        while chunk := source.read(chunk_size):
+            num_bytes += len(chunk)
+            _check_size(num_bytes, max_size)
+            if hash is not None:
+                hash.update(chunk)
+            out_file.write(chunk)
+
+    return StoredUpload(num_bytes, hash.hexdigest() if hash is not None else None)
+
+
+def _check_size(num_bytes: int, max_size: Optional[int]) -> None:
+    if max_size is not None and num_bytes > max_size:
+        raise UploadTooLargeError(max_size)
+
+
+def _get_path(source: BinaryIO) -> Optional[str]:
+    # SpooledTemporaryFile wraps the actual file in _file
+    underlying = getattr(source, "_file", source)
+    name = getattr(underlying, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    return None
+
+
+def _get_fileno(source: BinaryIO) -> Optional[int]:
+    # files in memory (e.g. BytesIO or a SpooledTemporaryFile that was not rolled over) do not
+    # have a file descriptor
+    if not hasattr(os, "sendfile") or not getattr(source, "_rolled", True):
+        return None
+    try:
+        return source.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
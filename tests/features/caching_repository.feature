@@ -0,0 +1,26 @@
+Feature: Caching repository
+    Background:
+        Given a caching repository
+        And the repository contains the module 'mol-scale'
+        And the repository contains a job '1' of module 'mol-scale' with 10 entries
+
+    Scenario: Cached jobs are not shared
+        When the status of job '1' read from the cache is changed to 'completed'
+        Then job '1' in the cache has status 'processing'
+
+    Scenario: Reads that started before an update do not overwrite the cache
+        When job '1' is read from the database while its status is changed to 'completed'
+        Then job '1' in the cache has status 'completed'
+
+    Scenario: Cached modules are not shared
+        When the version of module 'mol-scale' read from the cache is changed to '9.9.9'
+        Then the module 'mol-scale' in the cache has version '1.0.0'
+
+    Scenario: Module changes invalidate the cache
+        When the module 'mol-scale' is read from the cache
+        And the version of module 'mol-scale' is changed to '2.0.0' in the database
+        Then the module 'mol-scale' in the cache has version '2.0.0'
+
+    Scenario: Closing stops the module changefeed
+        When the caching repository is closed
+        Then the module changefeed of the caching repository is stopped
@@ -0,0 +1,43 @@
+Feature: Changefeed hub
+    Background:
+        Given a changefeed hub with queue size 3
+        And a source feed
+        And no subscribers
+
+    Scenario: Subscribers of the same key share a feed
+        When 2 subscribers subscribe to the source feed
+        And the source feed emits [1, 2]
+        Then subscriber 1 received [1, 2]
+        And subscriber 2 received [1, 2]
+        And the source feed was started 1 time
+        And the hub has 1 feed and 2 subscribers
+
+    Scenario: Late subscribers receive the current state
+        When 1 subscriber subscribes to the source feed
+        And the source feed emits [1, 2]
+        And 1 subscriber subscribes to the source feed
+        And the source feed emits [3]
+        Then subscriber 1 received [1, 2, 3]
+        And subscriber 2 received [1, 2, 3]
+        And the source feed was started 1 time
+
+    Scenario: The feed stops when the last subscriber leaves
+        When 2 subscribers subscribe to the source feed
+        And subscriber 1 leaves
+        Then the source feed is running 1 time
+        When subscriber 2 leaves
+        Then the source feed is running 0 times
+        And the hub has 0 feeds and 0 subscribers
+        When 1 subscriber subscribes to the source feed
+        Then the source feed was started 2 times
+
+    Scenario: Slow subscribers are closed
+        When 1 subscriber subscribes to the source feed
+        And a paused subscriber subscribes to the source feed
+        And the source feed emits [1, 2, 3, 4, 5]
+        Then the hub has 1 feed and 1 subscriber
+        When subscriber 2 resumes
+        # the queue of subscriber 2 overflowed: the oldest item was replaced by the end marker
+        Then subscriber 1 received [1, 2, 3, 4, 5]
+        And subscriber 2 received [1, 3, 4]
+        And subscriber 2 was closed
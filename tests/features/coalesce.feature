@@ -0,0 +1,26 @@
+Feature: Coalesce
+    Background:
+        Given a source coalesced to one item every 0.5 seconds
+
+    Scenario: Intermediate items are dropped
+        When the source emits [1, 2, 3, 4]
+        Then the coalesced source yielded [1]
+        When the source ends
+        # the last item is yielded immediately
+        Then the coalesced source yielded [1, 4]
+
+    Scenario: Urgent items are yielded immediately
+        When the source emits [1, 2, 10, 3]
+        Then the coalesced source yielded [1, 10]
+        When the source ends
+        Then the coalesced source yielded [1, 10, 3]
+
+    Scenario: Items are yielded after the interval
+        When the source emits [1, 2]
+        And we wait for 1 seconds
+        Then the coalesced source yielded [1, 2]
+
+    Scenario: Cancelling the consumer closes the source
+        When the source emits [1, 2]
+        And the consumer of the coalesced source is cancelled
+        Then the source was closed
@@ -0,0 +1,7 @@
+Feature: Compressed set
+    Scenario: Intervals loaded from json
+        Given a compressed set with intervals [[0, 3], [5, 6]]
+        Then the compressed set contains 4 elements
+
+    Scenario: Compressed sets behave like sets
+        Then adding numbers to a compressed set has the same effect as adding them to a set
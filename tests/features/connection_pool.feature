@@ -0,0 +1,5 @@
+Feature: RethinkDB connection pool
+    Scenario: Streams do not use the connections of queries
+        Given a connection pool with at most 1 connections
+        When 5 streams are open
+        Then 3 queries can run at the same time
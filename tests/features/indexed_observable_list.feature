@@ -0,0 +1,3 @@
+Feature: Indexed observable list
+    Scenario: Indexes are consistent with the items
+        Then modifying an indexed observable list keeps its indexes consistent
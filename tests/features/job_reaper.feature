@@ -0,0 +1,50 @@
+Feature: Job reaper
+    Background:
+        Given a temporary data directory
+        And a mocked channel
+        And a mocked repository
+        And the config option admin_api_key is "secret"
+        And the app is running
+        And the repository contains the module 'test-module'
+        And a file at 'molecules.smi' with content
+            CCO
+            c1ccccc1
+
+    Scenario: Sources are kept while other jobs use them
+        When the client uploads the file 'molecules.smi' 1 times
+        And the client creates a job of module 'test-module' for uploaded source 0
+        And the size of the created jobs is known
+        And the client creates a job of module 'test-module' for uploaded source 0
+        And the client deletes created job 0
+        And the job reaper removes the deleted jobs
+        Then uploaded source 0 is available
+        When the client deletes created job 1
+        And the job reaper removes the deleted jobs
+        Then uploaded source 0 was removed
+        And the sources folder contains exactly 0 file(s)
+        And the blobs folder contains exactly 0 files
+
+    Scenario: Removing a job twice releases its source once
+        When the client uploads the file 'molecules.smi' 1 times
+        And the client creates a job of module 'test-module' for uploaded source 0
+        And the size of the created jobs is known
+        And the client creates a job of module 'test-module' for uploaded source 0
+        And the client deletes created job 0
+        And the job reaper removes the deleted jobs twice
+        Then uploaded source 0 is available
+
+    Scenario: Old jobs are deleted by operators only
+        When the client uploads the file 'molecules.smi' 1 times
+        And the client creates a job of module 'test-module' for uploaded source 0
+        And the client deletes the jobs older than 0 with the admin api key 'secret'
+        Then the status code of the response is 422
+        When the client deletes the jobs older than -P1D with the admin api key 'secret'
+        Then the status code of the response is 422
+        When the client deletes the jobs older than 60 with the admin api key 'wrong'
+        Then the status code of the response is 403
+        When the client deletes the jobs older than 60 with the admin api key 'gehéim'
+        Then the status code of the response is 403
+        When the client deletes the jobs older than P1D with the admin api key 'secret'
+        Then the status code of the response is 200
+        And the client receives a response containing
+            {"num_jobs": 0}
@@ -14,4 +14,8 @@ Feature: Jobs
 
     Scenario: Get non-existing job
         When the client requests /jobs/1
+        Then the status code of the response is 404
+
+    Scenario: Export results of a non-existing job
+        When the client requests /jobs/1/results/export
         Then the status code of the response is 404
\ No newline at end of file
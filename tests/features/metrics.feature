@@ -0,0 +1,18 @@
+Feature: Metrics
+    Background:
+        Given a temporary data directory
+        And a mocked channel
+        And a mocked repository
+
+    Scenario: Metrics are disabled by default
+        When the client requests /metrics
+        Then the status code of the response is 404
+
+    Scenario: Metrics are exposed if enabled
+        Given the config option metrics_enabled is true
+        When the client requests /modules
+        And the client requests /metrics
+        Then the status code of the response is 200
+        And the response contains the metric nerdd_changefeeds
+        And the response contains the metric nerdd_repository_cache_hits_total
+        And the response contains the metric nerdd_action_messages_total
@@ -0,0 +1,38 @@
+Feature: Page cache
+    Scenario: Least recently used pages are evicted
+        Given a page cache of 300 bytes
+        When page 1 of job 'a' with 100 bytes is cached
+        And page 2 of job 'a' with 100 bytes is cached
+        And page 1 of job 'b' with 100 bytes is cached
+        And page 1 of job 'a' is read
+        And page 2 of job 'b' with 100 bytes is cached
+        Then the page cache contains the pages a/1,b/1,b/2
+        And the page cache contains 300 bytes
+
+    Scenario: Replacing a page does not count it twice
+        Given a page cache of 300 bytes
+        When page 1 of job 'a' with 100 bytes is cached
+        And page 1 of job 'a' with 200 bytes is cached
+        Then the page cache contains the pages a/1
+        And the page cache contains 200 bytes
+
+    Scenario: Pages larger than the cache are not cached
+        Given a page cache of 300 bytes
+        When page 1 of job 'a' with 100 bytes is cached
+        And page 2 of job 'a' with 400 bytes is cached
+        Then the page cache contains the pages a/1
+        And the page cache contains 100 bytes
+
+    Scenario: Invalidating a job removes all of its pages
+        Given a page cache of 300 bytes
+        When page 1 of job 'a' with 100 bytes is cached
+        And page 2 of job 'a' with 100 bytes is cached
+        And page 1 of job 'b' with 100 bytes is cached
+        And the pages of job 'a' are invalidated
+        Then the page cache contains the pages b/1
+        And the page cache contains 100 bytes
+
+    Scenario: Compressed pages
+        Given a compressing page cache of 1000 bytes
+        When page 1 of job 'a' with 500 bytes is cached
+        Then page 1 of job 'a' is compressed
@@ -0,0 +1,21 @@
+Feature: Repository
+    Background:
+        Given an initialized repository
+        And the repository contains the module 'mol-scale'
+        And the repository contains a job '1' of module 'mol-scale' with 10 entries
+
+    Scenario: Bulk insert skips existing results
+        When the results of molecules 0,1 of job '1' are inserted
+        And the results of molecules 1,2,3 of job '1' are inserted
+        Then the inserted results are the molecules 2,3
+        And the repository contains 4 results of job '1'
+
+    Scenario: Bulk insert inserts duplicates within a batch once
+        When the results of molecules 4,5,4 of job '1' are inserted
+        Then the inserted results are the molecules 4,5
+        And the repository contains 2 results of job '1'
+
+    Scenario: Processed intervals are merged with the processed entries
+        When the molecules 0,1,5 of job '1' are processed
+        And the intervals [[2, 4], [8, 10]] of job '1' are processed
+        Then the processed entries of job '1' are [[0, 4], [5, 6], [8, 10]]
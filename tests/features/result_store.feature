@@ -0,0 +1,59 @@
+Feature: Result store
+    Background:
+        Given a temporary data directory
+
+    Scenario: Archives return the results that were written
+        Given an archive of 50 molecules with 7 results each and row groups of 20 results
+        Then reading the archive returns all results
+        And reading molecules 13 to 27 of the archive returns their results
+
+    Scenario: Large archives are compressed with a dictionary
+        Given an archive of 2000 molecules with 10 results each and row groups of 100 results
+        Then reading the archive returns all results
+        And reading molecules 1500 to 1502 of the archive returns their results
+
+    Scenario: Results of complete jobs are archived in the background
+        Given an initialized repository
+        And the repository contains the module 'test-module'
+        And the repository contains a job '1' of module 'test-module' with 4 entries
+        And job '1' has 3 results for each of the molecules 0,1,2,3
+        And all entries and checkpoints of job '1' were processed
+        When the results of job '1' are archived in the background
+        Then the results of job '1' are archived
+        And the repository contains 0 results of job '1'
+        And the result store returns 12 results of job '1'
+
+    Scenario: Evicted archives are closed
+        Given an initialized repository
+        And the repository contains the module 'test-module'
+        And the result store keeps at most 1 archives open
+        And the repository contains a job '1' of module 'test-module' with 2 entries
+        And job '1' has 3 results for each of the molecules 0,1
+        And all entries and checkpoints of job '1' were processed
+        And the repository contains a job '2' of module 'test-module' with 2 entries
+        And job '2' has 3 results for each of the molecules 0,1
+        And all entries and checkpoints of job '2' were processed
+        When the results of job '1' are archived in the background
+        And the results of job '2' are archived in the background
+        And the result store reads the results of job '1'
+        And the result store reads the results of job '2'
+        Then the archive of job '1' is closed
+        And the archive of job '2' is open
+
+    Scenario: Evicted archives are closed by their last reader
+        Given an initialized repository
+        And the repository contains the module 'test-module'
+        And the result store keeps at most 1 archives open
+        And the repository contains a job '1' of module 'test-module' with 2 entries
+        And job '1' has 3 results for each of the molecules 0,1
+        And all entries and checkpoints of job '1' were processed
+        And the repository contains a job '2' of module 'test-module' with 2 entries
+        And job '2' has 3 results for each of the molecules 0,1
+        And all entries and checkpoints of job '2' were processed
+        When the results of job '1' are archived in the background
+        And the results of job '2' are archived in the background
+        And the result store starts iterating over the results of job '1'
+        And the result store reads the results of job '2'
+        Then the archive of job '1' is open
+        When the iteration over the results of job '1' stops
+        Then the archive of job '1' is closed
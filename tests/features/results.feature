@@ -0,0 +1,46 @@
+Feature: Results
+    Background:
+        Given a temporary data directory
+        And a mocked channel
+        And a mocked repository
+        And the app is running
+        And the repository contains the module 'test-module'
+        And the repository contains a job '1' of module 'test-module' with 4 entries
+        And job '1' has 3 results for each of the molecules 0,1,2,3
+
+    Scenario: Keyset pages contain all results of a molecule
+        When the client requests /jobs/1/results?limit=2
+        Then the status code of the response is 200
+        And the response contains 3 results of the molecules 0,1
+        And the response continues after molecule 1
+        When the client requests /jobs/1/results?after_mol_id=1&limit=2
+        Then the response contains 3 results of the molecules 2,3
+        And the response continues after molecule 3
+
+    Scenario: Incomplete keyset pages end before the first missing molecule
+        Given the repository contains a job '2' of module 'test-module' with 4 entries
+        And job '2' has 2 results for each of the molecules 0,2
+        When the client requests /jobs/2/results?limit=3
+        Then the status code of the response is 202
+        When the client requests /jobs/2/results?limit=3&return_incomplete=true
+        Then the status code of the response is 200
+        And the response contains 2 results of the molecules 0
+        And the response continues after molecule 0
+
+    Scenario: Complete keyset pages of final jobs are not modified
+        Given job '1' is completed
+        When the client requests /jobs/1/results?limit=2
+        Then the response has an ETag
+        When the client revalidates /jobs/1/results?limit=2 with the ETag of the response
+        Then the status code of the response is 304
+
+    Scenario: Keyset pages of jobs in progress are always sent
+        When the client requests /jobs/1/results?limit=2
+        Then the response has no ETag
+        When the client revalidates /jobs/1/results?limit=2 with If-None-Match *
+        Then the status code of the response is 200
+
+    Scenario: Wildcards do not match keyset pages of final jobs
+        Given job '1' is completed
+        When the client revalidates /jobs/1/results?limit=2 with If-None-Match *
+        Then the status code of the response is 200
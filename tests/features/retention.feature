@@ -0,0 +1,40 @@
+Feature: Retention
+    Background:
+        Given a temporary data directory
+        And a mocked channel
+        And a mocked repository
+        And the app is running
+        And the repository contains the module 'test-module'
+        And the repository contains the module 'other-module'
+        And the repository contains a job '1' of module 'test-module' created 10 days ago
+        And the repository contains a job '2' of module 'test-module' created 1 days ago
+        And the repository contains a job '3' of module 'other-module' created 10 days ago
+
+    Scenario: Jobs older than the time to live of their module are deleted
+        When the retention policy expires jobs of module 'test-module' older than 7 days
+        Then 1 jobs were expired
+        And job '1' is deleted
+        And job '2' is not deleted
+        And job '3' is not deleted
+
+    Scenario: Jobs are expired in batches
+        Given the repository contains a job '4' of module 'test-module' created 8 days ago
+        And the retention policy expires at most 1 jobs per interval
+        When the retention policy expires jobs of module 'test-module' older than 7 days
+        Then 1 jobs were expired
+        When the retention policy expires jobs of module 'test-module' older than 7 days
+        Then 1 jobs were expired
+        And job '1' is deleted
+        And job '4' is deleted
+        And job '2' is not deleted
+
+    Scenario: Reports do not delete jobs
+        When the retention policy reports jobs of module 'test-module' older than 7 days
+        Then the report counts 1 jobs
+        And job '1' is not deleted
+
+    Scenario: Reports count the jobs of the next interval
+        Given the repository contains a job '4' of module 'test-module' created 8 days ago
+        And the retention policy expires at most 1 jobs per interval
+        When the retention policy reports jobs of module 'test-module' older than 7 days
+        Then the report counts 1 jobs
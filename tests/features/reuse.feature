@@ -0,0 +1,24 @@
+Feature: Reusing results of finished jobs
+    Background:
+        Given a temporary data directory
+        And a mocked channel
+        And a mocked repository
+        And the app is running
+        And the repository contains the module 'test-module'
+        And the repository contains a job '1' of module 'test-module' with 2 entries
+        And the repository contains a new job '2' of module 'test-module'
+
+    Scenario: Results of a finished job are copied
+        Given job '1' has 3 results for each of the molecules 0,1
+        And job '1' is completed
+        When the results of job '1' are reused for job '2'
+        Then job '2' is final
+        And the repository contains 6 results of job '2'
+        And the channel sends 0 messages on topic 'jobs'
+
+    Scenario: Jobs are processed if the results cannot be copied
+        Given job '1' has 3 results for each of the molecules 0
+        And job '1' is completed
+        When the results of job '1' are reused for job '2'
+        Then the channel sends a message on topic 'jobs' containing
+            {"id": "2", "job_type": "test-module"}
@@ -0,0 +1,44 @@
+Feature: Saving results
+    Background:
+        Given a temporary data directory
+        And an initialized repository
+        And the repository contains the module 'mol-scale'
+        And the repository contains a job '1' of module 'mol-scale' with 10 entries
+
+    Scenario: Results are written in batches
+        Given a SaveResultToDb action with batch size 3
+        When the action receives results of molecules 0,1,2,3 of job '1'
+        Then the repository contains 3 results of job '1'
+        # the fourth result is buffered in the journal
+        And the journal of the action contains 1 file(s)
+
+    Scenario: Buffered results are written after a restart
+        Given a SaveResultToDb action with batch size 5
+        When the action receives results of molecules 0,1,2,3,4,5,6 of job '1'
+        And the action stops unexpectedly
+        Then the repository contains 5 results of job '1'
+        When a new SaveResultToDb action starts
+        Then the repository contains 7 results of job '1'
+        And the journal of the action contains 0 file(s)
+
+    Scenario: Batch writes are timed
+        Given a SaveResultToDb action with batch size 2
+        And the action is instrumented
+        When the action receives results of molecules 0,1,2,3,4 of job '1'
+        Then the metrics contain 2 batch writes of results
+
+    Scenario: Buffered results are written when the action stops
+        Given a SaveResultToDb action with batch size 5
+        When the action is running
+        And the action receives results of molecules 0,1 of job '1'
+        And the action stops
+        Then the repository contains 2 results of job '1'
+        And the action has no pending timers
+        And the journal of the action contains 0 file(s)
+
+    Scenario: Results are labeled with the inputs they were read from
+        Given a SaveResultToDb action with batch size 1
+        And the repository contains the source 'manifest' without file name
+        And the repository contains the source 'packed' without file name
+        When the action receives a result of molecule 0 of job '1' from manifest,packed,user_input_0,raw_input
+        Then the result of molecule 0 of job '1' has the source user_input_0
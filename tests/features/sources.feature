@@ -16,4 +16,56 @@ Feature: Jobs
         And the source file in the response was created
         # channel
         And the channel sends 0 messages on topic 'jobs'
-        # repository
\ No newline at end of file
+        # repository
+
+    Scenario: Identical uploads share one file
+        Given a file at 'molecules.smi' with content
+            CCO
+            c1ccccc1
+        When the client uploads the file 'molecules.smi' 2 times
+        Then the uploaded sources are different sources sharing one file
+        And the blobs folder contains exactly 1 files
+
+    Scenario: Deleting a source keeps identical uploads
+        Given a file at 'molecules.smi' with content
+            CCO
+            c1ccccc1
+        When the client uploads the file 'molecules.smi' 2 times
+        And the client deletes uploaded source 0
+        Then the status code of the response is 200
+        When the client deletes uploaded source 0
+        Then the status code of the response is 404
+        And uploaded source 1 contains
+            CCO
+            c1ccccc1
+        When the client deletes uploaded source 1
+        Then the status code of the response is 200
+        And the sources folder contains exactly 0 file(s)
+        And the blobs folder contains exactly 0 files
+
+    Scenario: Concurrent identical uploads share one file
+        Then identical files that were stored at the same time end up sharing one blob
+
+    Scenario: Inline inputs are packed into one archive
+        When the inputs are packed
+            ["CCO", "InChI=1S/CH4/h1H4", "c1ccccc1"]
+        Then the packed inputs contain the members user_input_0,user_input_1,user_input_2
+        And member 'user_input_1' of the packed inputs contains
+            InChI=1S/CH4/h1H4
+        # every molecule is labeled with the input it was read from
+        And the packed inputs are read as molecules from user_input_0,user_input_1,user_input_2
+        # identical inputs result in identical archives (e.g. for reusing results)
+        And the inputs packed again are identical
+            ["CCO", "InChI=1S/CH4/h1H4", "c1ccccc1"]
+
+    Scenario: Multi-line inputs are packed as they are
+        When the inputs are packed
+            ["CCO", "\n     RDKit          2D\n\n  1  0  0  0  0  0  0  0  0  0999 V2000\n    0.0000    0.0000    0.0000 C   0  0  0  0  0  0  0  0  0  0  0  0\nM  END\n", "c1ccccc1"]
+        Then the packed inputs contain the members user_input_0,user_input_1,user_input_2
+        And the packed inputs are read as molecules from user_input_0,user_input_1,user_input_2
+
+    Scenario: Empty inputs keep their position
+        When the inputs are packed
+            ["", "CCO", ""]
+        Then the packed inputs contain the members user_input_0,user_input_1,user_input_2
+        And the packed inputs are read as molecules from user_input_0,user_input_1,user_input_2
@@ -0,0 +1,31 @@
+Feature: Upload
+    Background:
+        Given a temporary data directory
+
+    Scenario Outline: Uploads are stored with their checksum
+        Given an upload of 100000 bytes <location>
+        When the upload is stored in chunks of 4096 bytes with a maximum of 100000 bytes
+        Then the stored file has the content of the upload
+        And the checksum of the upload is correct
+
+        Examples:
+            | location        |
+            | in memory       |
+            | spooled to disk |
+            | in a named file |
+
+    Scenario Outline: Uploads are stored without checksum
+        Given an upload of 100000 bytes <location>
+        When the upload is stored without checksum in chunks of 4096 bytes
+        Then the stored file has the content of the upload
+
+        Examples:
+            | location        |
+            | in memory       |
+            | spooled to disk |
+            | in a named file |
+
+    Scenario: Uploads larger than the maximum are rejected
+        Given an upload of 100001 bytes spooled to disk
+        When the upload is stored in chunks of 4096 bytes with a maximum of 100000 bytes
+        Then the upload is rejected as too large
@@ -0,0 +1,31 @@
+Feature: User usage
+    Background:
+        Given an initialized repository
+        And the repository contains the module 'mol-scale'
+        And user 'alice' created a job '1' of module 'mol-scale' 0 hours ago
+
+    Scenario: Reporting the job size counts the entries once
+        When the size of job '1' is reported as 10 entries
+        And the size of job '1' is reported as 10 entries
+        Then user 'alice' has 0 fresh jobs and 10 entries within 24 hours
+
+    Scenario: Deleting a fresh job releases it
+        When job '1' is marked as deleted
+        And the size of job '1' is reported as 10 entries
+        Then user 'alice' has 0 fresh jobs and 0 entries within 24 hours
+
+    Scenario: Deleting a job after its size is known keeps its entries
+        When the size of job '1' is reported as 10 entries
+        And job '1' is marked as deleted
+        Then user 'alice' has 0 fresh jobs and 10 entries within 24 hours
+
+    Scenario: Deleting old jobs releases fresh jobs
+        Given user 'alice' created a job '2' of module 'mol-scale' 1 hours ago
+        When the size of job '1' is reported as 10 entries
+        And all jobs are marked as deleted
+        Then user 'alice' has 0 fresh jobs and 10 entries within 24 hours
+
+    Scenario: Old usage is deleted
+        Given user 'alice' created a job '2' of module 'mol-scale' 30 hours ago
+        When usage older than 24 hours is deleted
+        Then user 'alice' has 1 fresh jobs and 0 entries within 48 hours
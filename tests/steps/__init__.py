@@ -1,5 +1,21 @@
+from .actions import *
+from .caching_repository import *
+from .changefeed_hub import *
 from .channel import *
 from .client import *
+from .coalesce import *
+from .compressed_set import *
+from .connection_pool import *
 from .files import *
+from .indexed_observable_list import *
+from .job_reaper import *
+from .metrics import *
+from .page_cache import *
 from .repository import *
+from .result_store import *
+from .results import *
+from .retention import *
+from .reuse import *
 from .sources import *
+from .upload import *
+from .user_usage import *
@@ -0,0 +1,98 @@
+import asyncio
+import os
+
+from nerdd_link import ResultMessage
+from nerdd_link.tests import async_step
+from omegaconf import OmegaConf
+from pytest_bdd import given, parsers, then, when
+
+from nerdd_backend.actions import SaveResultToDb
+
+
+def create_save_result_action(channel, repository, data_dir, batch_size):
+    # batches are only written when they are full (or when the action stops)
+    config = OmegaConf.create(
+        {
+            "result_batch_size": batch_size,
+            "result_batch_timeout_seconds": 3600,
+            "media_root": data_dir,
+        }
+    )
+    return SaveResultToDb(channel, repository, config)
+
+
+@given(
+    parsers.parse("a SaveResultToDb action with batch size {batch_size:d}"),
+    target_fixture="action",
+)
+def save_result_action(channel, repository, data_dir, batch_size):
+    return create_save_result_action(channel, repository, data_dir, batch_size)
+
+
+@when(parsers.parse("the action receives results of molecules {mol_ids} of job '{job_id}'"))
+@async_step
+async def action_receives_results(action, mol_ids, job_id):
+    for mol_id in mol_ids.split(","):
+        await action._process_message(ResultMessage(job_id=job_id, mol_id=int(mol_id)))
+
+
+@when(
+    parsers.parse(
+        "the action receives a result of molecule {mol_id:d} of job '{job_id}' from {sources}"
+    )
+)
+@async_step
+async def action_receives_result_from_sources(action, mol_id, job_id, sources):
+    await action._process_message(
+        ResultMessage(job_id=job_id, mol_id=mol_id, source=sources.split(","))
+    )
+
+
+@then(parsers.parse("the result of molecule {mol_id:d} of job '{job_id}' has the source {sources}"))
+@async_step
+async def check_result_source(repository, mol_id, job_id, sources):
+    (result,) = await repository.get_results_by_job_id(job_id, mol_id, mol_id)
+    assert result.source == sources.split(","), result.source
+
+
+@when("the action stops unexpectedly")
+def action_stops_unexpectedly(action):
+    # the process dies: nothing is written, but the journal files stay on disk
+    for task in action._flush_tasks:
+        task.cancel()
+    for journal_file in action._journal_files.values():
+        journal_file.close()
+
+
+@when("the action is running", target_fixture="action_task")
+@async_step
+async def action_is_running(action):
+    task = asyncio.create_task(action.run())
+    await asyncio.sleep(0.1)
+    return task
+
+
+@when("the action stops")
+@async_step
+async def action_stops(action_task):
+    action_task.cancel()
+    await asyncio.gather(action_task, return_exceptions=True)
+
+
+@then("the action has no pending timers")
+def check_no_timers(action):
+    assert len(action._flush_tasks) == 0, action._flush_tasks
+
+
+@when("a new SaveResultToDb action starts", target_fixture="action")
+@async_step
+async def new_save_result_action(action, channel, repository, data_dir):
+    new_action = create_save_result_action(channel, repository, data_dir, action.batch_size)
+    await new_action._recover()
+    return new_action
+
+
+@then(parsers.parse("the journal of the action contains {num:d} file(s)"))
+def check_journal_files(action, num):
+    actual = len(os.listdir(action.journal.directory))
+    assert actual == num, f"Expected {num} journal files, got {actual}"
@@ -0,0 +1,115 @@
+import asyncio
+
+from nerdd_link.tests import async_step
+from pytest_bdd import given, parsers, then, when
+
+from nerdd_backend.data import CachingRepository
+from nerdd_backend.models import JobUpdate
+
+
+@given("a caching repository", target_fixture="caching_repository")
+@async_step
+async def caching_repository(repository):
+    caching_repository = CachingRepository(repository)
+    # initializes the wrapped repository, too
+    await caching_repository.initialize()
+    return caching_repository
+
+
+@when(parsers.parse("the status of job '{job_id}' read from the cache is changed to '{status}'"))
+@async_step
+async def change_cached_job(caching_repository, job_id, status):
+    job = await caching_repository.get_job_by_id(job_id)
+    job.status = status
+
+
+@when(
+    parsers.parse(
+        "job '{job_id}' is read from the database while its status is changed to '{status}'"
+    )
+)
+@async_step
+async def read_job_during_update(caching_repository, repository, job_id, status):
+    # the read misses the cache and gets the job before the update
+    old_job = await repository.get_job_by_id(job_id)
+    read_started = asyncio.Event()
+    update_done = asyncio.Event()
+
+    async def slow_get_job_by_id(job_id):
+        read_started.set()
+        await update_done.wait()
+        return old_job
+
+    get_job_by_id = repository.get_job_by_id
+    repository.get_job_by_id = slow_get_job_by_id
+    read = asyncio.create_task(caching_repository.get_job_by_id(job_id))
+    await read_started.wait()
+    repository.get_job_by_id = get_job_by_id
+
+    await caching_repository.update_job(JobUpdate(id=job_id, status=status))
+    update_done.set()
+    await read
+
+
+@then(parsers.parse("job '{job_id}' in the cache has status '{status}'"))
+@async_step
+async def check_cached_job_status(caching_repository, job_id, status):
+    job = await caching_repository.get_job_by_id(job_id)
+    assert job.status == status, f"Expected status {status}, got {job.status}"
+
+
+@when(parsers.parse("the module '{module_id}' is read from the cache"))
+@async_step
+async def read_cached_module(caching_repository, module_id):
+    await caching_repository.get_module_by_id(module_id)
+
+
+@when(
+    parsers.parse(
+        "the version of module '{module_id}' read from the cache is changed to '{version}'"
+    )
+)
+@async_step
+async def change_cached_module(caching_repository, module_id, version):
+    # fill the cache first (MemoryRepository returns the stored objects on a miss)
+    await caching_repository.get_module_by_id(module_id)
+    await caching_repository.get_all_modules()
+
+    module = await caching_repository.get_module_by_id(module_id)
+    module.version = version
+    modules = await caching_repository.get_all_modules()
+    modules[0].version = version
+
+
+@when(
+    parsers.parse("the version of module '{module_id}' is changed to '{version}' in the database")
+)
+@async_step
+async def change_module_version(repository, module_id, version):
+    # bypasses the cache (e.g. another process)
+    module = await repository.get_module_by_id(module_id)
+    await repository.update_module(module.model_copy(update={"version": version}))
+    # let the module changefeed invalidate the cache
+    await asyncio.sleep(0.1)
+
+
+@then(parsers.parse("the module '{module_id}' in the cache has version '{version}'"))
+@async_step
+async def check_cached_module_version(caching_repository, module_id, version):
+    module = await caching_repository.get_module_by_id(module_id)
+    assert module.version == version, f"Expected version {version}, got {module.version}"
+    modules = await caching_repository.get_all_modules()
+    assert modules[0].version == version, f"Expected version {version}, got {modules[0].version}"
+
+
+@when("the caching repository is closed", target_fixture="invalidation_task")
+@async_step
+async def close_caching_repository(caching_repository):
+    invalidation_task = caching_repository._invalidation_task
+    await caching_repository.close()
+    return invalidation_task
+
+
+@then("the module changefeed of the caching repository is stopped")
+def check_module_changefeed_stopped(invalidation_task):
+    assert invalidation_task.done()
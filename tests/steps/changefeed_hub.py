@@ -0,0 +1,130 @@
+import asyncio
+from ast import literal_eval
+
+from nerdd_link.tests import async_step
+from pytest_bdd import given, parsers, then, when
+
+from nerdd_backend.util import ChangefeedHub
+
+
+class SourceFeed:
+    # a changefeed that emits the items put into its queue (as changes (None, item))
+    def __init__(self) -> None:
+        self.queue = asyncio.Queue()
+        self.num_started = 0
+        self.num_running = 0
+
+    async def create(self):
+        self.num_started += 1
+        self.num_running += 1
+        try:
+            while True:
+                yield None, await self.queue.get()
+        finally:
+            self.num_running -= 1
+
+
+class Subscriber:
+    def __init__(self, hub, key, source, state_key=None, paused=False) -> None:
+        self.items = []
+        self.closed = False
+        # a paused subscriber stops reading after the first item
+        self.resumed = asyncio.Event()
+        if not paused:
+            self.resumed.set()
+        self.task = asyncio.create_task(self.run(hub.subscribe(key, source.create, state_key)))
+
+    async def run(self, changes):
+        async for _, item in changes:
+            self.items.append(item)
+            await self.resumed.wait()
+        self.closed = True
+
+
+async def settle():
+    # let all tasks process their pending items
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+@given(parsers.parse("a changefeed hub with queue size {size:d}"), target_fixture="hub")
+def changefeed_hub(size):
+    return ChangefeedHub(size)
+
+
+@given("a source feed", target_fixture="source_feed")
+def source_feed():
+    return SourceFeed()
+
+
+@given("no subscribers", target_fixture="subscribers")
+def no_subscribers():
+    return []
+
+
+@when(parsers.re(r"(?P<num>\d+) subscribers? subscribes? to the source feed"), converters={"num": int})
+@async_step
+async def subscribe(hub, source_feed, subscribers, num):
+    for _ in range(num):
+        subscribers.append(Subscriber(hub, "key", source_feed, state_key=lambda item: item))
+    await settle()
+
+
+@when("a paused subscriber subscribes to the source feed")
+@async_step
+async def subscribe_paused(hub, source_feed, subscribers):
+    subscribers.append(Subscriber(hub, "key", source_feed, state_key=lambda item: item, paused=True))
+    await settle()
+
+
+@when(parsers.parse("subscriber {i:d} resumes"))
+@async_step
+async def resume(subscribers, i):
+    subscribers[i - 1].resumed.set()
+    await settle()
+
+
+@when(parsers.parse("the source feed emits {items}"))
+@async_step
+async def emit(source_feed, items):
+    # one item at a time (bursts larger than the queue size would close all subscribers)
+    for item in literal_eval(items):
+        source_feed.queue.put_nowait(item)
+        await settle()
+
+
+@when(parsers.parse("subscriber {i:d} leaves"))
+@async_step
+async def leave(subscribers, i):
+    subscribers[i - 1].task.cancel()
+    await settle()
+
+
+@then(parsers.parse("subscriber {i:d} received {items}"))
+def check_received(subscribers, i, items):
+    expected = literal_eval(items)
+    assert subscribers[i - 1].items == expected, f"Expected {expected}"
+
+
+@then(parsers.parse("subscriber {i:d} was closed"))
+def check_closed(subscribers, i):
+    assert subscribers[i - 1].closed
+
+
+@then(parsers.re(r"the source feed was started (?P<num>\d+) times?"), converters={"num": int})
+def check_started(source_feed, num):
+    assert source_feed.num_started == num
+
+
+@then(parsers.re(r"the source feed is running (?P<num>\d+) times?"), converters={"num": int})
+def check_running(source_feed, num):
+    assert source_feed.num_running == num
+
+
+@then(
+    parsers.re(r"the hub has (?P<num_feeds>\d+) feeds? and (?P<num_subscribers>\d+) subscribers?"),
+    converters={"num_feeds": int, "num_subscribers": int},
+)
+def check_hub(hub, num_feeds, num_subscribers):
+    assert hub.num_feeds() == num_feeds
+    assert hub.num_subscribers() == num_subscribers
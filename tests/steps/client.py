@@ -3,25 +3,34 @@ import json
 import logging
 from ast import literal_eval
 
+import pytest
 import pytest_asyncio
 from asgi_lifespan import LifespanManager
 from fastapi.testclient import TestClient
 from hydra import compose, initialize
 from nerdd_link.tests import async_step
-from pytest_bdd import parsers, then, when
+from pytest_bdd import given, parsers, then, when
 
 from nerdd_backend.main import create_app
 
 logger = logging.getLogger(__name__)
 
 
+@pytest.fixture
+def config_overrides():
+    # options that differ from the testing config (set before the app is running)
+    return {}
+
+
 @pytest_asyncio.fixture
-async def client(data_dir):
+async def client(data_dir, config_overrides):
     # load correct config file
     with initialize(version_base=None, config_path="../../nerdd_backend/settings"):
         cfg = compose(config_name="testing")
 
     cfg.media_root = data_dir
+    for key, value in config_overrides.items():
+        cfg[key] = value
 
     # create app
     app = await create_app(cfg)
@@ -32,6 +41,11 @@ async def client(data_dir):
         yield client
 
 
+@given(parsers.parse("the config option {key} is {value}"))
+def config_option(config_overrides, key, value):
+    config_overrides[key] = json.loads(value)
+
+
 @when(
     parsers.parse("the client sends a POST request to {url} with content\n{data}"),
     target_fixture="response",
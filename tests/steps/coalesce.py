@@ -0,0 +1,76 @@
+import asyncio
+from ast import literal_eval
+
+from nerdd_link.tests import async_step
+from pytest_bdd import given, parsers, then, when
+
+from nerdd_backend.util import coalesce
+
+# marks the end of the source
+_END = object()
+
+
+class CoalescedSource:
+    def __init__(self, min_interval, is_urgent) -> None:
+        self.queue = asyncio.Queue()
+        self.closed = False
+        self.received = []
+        self.coalesced = coalesce(self.source(), min_interval, is_urgent)
+        self.task = asyncio.create_task(self.consume())
+
+    async def source(self):
+        try:
+            while True:
+                item = await self.queue.get()
+                if item is _END:
+                    return
+                yield item
+        finally:
+            self.closed = True
+
+    async def consume(self):
+        async for item in self.coalesced:
+            self.received.append(item)
+
+
+@given(
+    parsers.parse("a source coalesced to one item every {min_interval:f} seconds"),
+    target_fixture="coalesced_source",
+)
+@async_step
+async def coalesced_source(min_interval):
+    # multiples of 10 are urgent
+    return CoalescedSource(min_interval, lambda previous, item: item % 10 == 0)
+
+
+@when(parsers.parse("the source emits {items}"))
+@async_step
+async def source_emits(coalesced_source, items):
+    for item in literal_eval(items):
+        coalesced_source.queue.put_nowait(item)
+        await asyncio.sleep(0.01)
+
+
+@when("the source ends")
+@async_step
+async def source_ends(coalesced_source):
+    coalesced_source.queue.put_nowait(_END)
+    await asyncio.wait_for(coalesced_source.task, 1)
+
+
+@when("the consumer of the coalesced source is cancelled")
+@async_step
+async def consumer_cancelled(coalesced_source):
+    coalesced_source.task.cancel()
+    await asyncio.gather(coalesced_source.task, return_exceptions=True)
+
+
+@then(parsers.parse("the coalesced source yielded {items}"))
+def check_yielded(coalesced_source, items):
+    expected = literal_eval(items)
+    assert coalesced_source.received == expected, f"Expected {expected}"
+
+
+@then("the source was closed")
+def check_source_closed(coalesced_source):
+    assert coalesced_source.closed
@@ -0,0 +1,74 @@
+import json
+
+from hypothesis import given as hypothesis_given
+from hypothesis import settings
+from hypothesis import strategies as st
+from pytest_bdd import given, parsers, then
+
+from nerdd_backend.util import CompressedSet
+
+
+def to_intervals(xs):
+    intervals = []
+    for x in sorted(xs):
+        if len(intervals) > 0 and intervals[-1][1] == x:
+            intervals[-1] = (intervals[-1][0], x + 1)
+        else:
+            intervals.append((x, x + 1))
+    return intervals
+
+
+def check_same_elements(compressed_set, expected):
+    # the intervals are sorted, disjoint and not adjacent (i.e. maximal)
+    assert compressed_set.to_intervals() == to_intervals(expected)
+    assert compressed_set.count() == len(expected)
+    assert len(compressed_set) == len(expected)
+
+
+numbers = st.integers(min_value=0, max_value=1000)
+operations = st.lists(
+    st.one_of(
+        st.tuples(st.just("add"), st.lists(numbers, min_size=1, max_size=1)),
+        # small updates of large sets insert intervals one by one, others merge all intervals
+        st.tuples(st.just("update"), st.lists(numbers, max_size=50)),
+        st.tuples(st.just("union"), st.lists(numbers, max_size=50)),
+    ),
+    max_size=40,
+)
+
+
+@given(parsers.parse("a compressed set with intervals {intervals}"), target_fixture="compressed_set")
+def compressed_set_with_intervals(intervals):
+    return CompressedSet(json.loads(intervals))
+
+
+@then(parsers.parse("the compressed set contains {count:d} elements"))
+def check_count(compressed_set, count):
+    assert compressed_set.count() == count
+
+
+@then("adding numbers to a compressed set has the same effect as adding them to a set")
+def compressed_set_behaves_like_set():
+    @settings(max_examples=300, deadline=None)
+    @hypothesis_given(numbers=st.sets(numbers, max_size=300), operations=operations)
+    def check(numbers, operations):
+        compressed_set = CompressedSet(to_intervals(numbers))
+        expected = set(numbers)
+        for operation, xs in operations:
+            if operation == "add":
+                compressed_set.add(xs[0])
+            elif operation == "update":
+                compressed_set.update(xs)
+            else:
+                original = compressed_set
+                original_intervals = list(original.to_intervals())
+                compressed_set = original.union(CompressedSet(to_intervals(xs)))
+                # union does not modify the original set
+                assert original.to_intervals() == original_intervals
+            expected.update(xs)
+            check_same_elements(compressed_set, expected)
+
+        for x in range(-1, 1002):
+            assert (x in compressed_set) == (x in expected)
+
+    check()
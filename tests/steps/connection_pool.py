@@ -0,0 +1,51 @@
+import asyncio
+
+from nerdd_link.tests import async_step
+from pytest_bdd import given, parsers, then, when
+
+from nerdd_backend.data.rethinkdb_connection_pool import RethinkDbConnectionPool
+
+
+class FakeConnection:
+    def is_open(self):
+        return True
+
+    async def close(self, noreply_wait=True):
+        pass
+
+
+class FakeRethinkDb:
+    async def connect(self, host, port, db):
+        return FakeConnection()
+
+
+@given(
+    parsers.parse("a connection pool with at most {max_size:d} connections"),
+    target_fixture="pool",
+)
+@async_step
+async def connection_pool(max_size):
+    pool = RethinkDbConnectionPool(
+        FakeRethinkDb(), "localhost", 28015, "nerdd", min_size=0, max_size=max_size
+    )
+    await pool.initialize()
+    return pool
+
+
+@when(parsers.parse("{num:d} streams are open"), target_fixture="streams")
+@async_step
+async def open_streams(pool, num):
+    streams = [pool.acquire_stream_connection() for _ in range(num)]
+    for stream in streams:
+        await stream.__aenter__()
+    return streams
+
+
+@then(parsers.parse("{num:d} queries can run at the same time"))
+@async_step
+async def check_queries(pool, streams, num):
+    async def query():
+        async with pool.acquire():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(asyncio.gather(*[query() for _ in range(num)]), timeout=1)
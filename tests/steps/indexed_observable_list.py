@@ -0,0 +1,80 @@
+from typing import NamedTuple
+
+from hypothesis import given as hypothesis_given
+from hypothesis import settings
+from hypothesis import strategies as st
+from pytest_bdd import then
+
+from nerdd_backend.util import Index, IndexedObservableList
+
+
+class Item(NamedTuple):
+    id: str
+    key: int
+    order: int
+
+
+ids = st.sampled_from([f"item-{i}" for i in range(20)])
+keys = st.integers(min_value=0, max_value=3)
+orders = st.integers(min_value=0, max_value=10)
+operations = st.lists(
+    st.one_of(
+        st.tuples(st.just("put"), ids, keys, orders),
+        st.tuples(st.just("remove"), ids, st.just(0), st.just(0)),
+    ),
+    max_size=60,
+)
+
+
+def check_same_items(items, expected):
+    assert len(items) == len(expected)
+    for id, item in expected.items():
+        assert items.get(id) == item
+
+    for key in range(4):
+        with_key = [item for item in expected.values() if item.key == key]
+        assert set(items.get_all(key, index="key")) == set(with_key)
+
+        # ordered indexes return the items sorted by their order value
+        ordered = items.get_all(key, index="ordered")
+        assert set(ordered) == set(with_key)
+        assert [item.order for item in ordered] == sorted(item.order for item in with_key)
+
+        for start, end in [(None, None), (2, 7), (5, 5), (None, 3), (8, None), (7, 2)]:
+            in_range = [
+                item
+                for item in with_key
+                if (start is None or item.order >= start) and (end is None or item.order <= end)
+            ]
+            result = items.get_range(key, start, end, index="ordered")
+            assert set(result) == set(in_range)
+            assert [item.order for item in result] == sorted(item.order for item in in_range)
+
+
+@then("modifying an indexed observable list keeps its indexes consistent")
+def indexed_observable_list_is_consistent():
+    @settings(max_examples=300, deadline=None)
+    @hypothesis_given(operations=operations)
+    def check(operations):
+        items = IndexedObservableList[Item](
+            indexes={
+                "key": Index(lambda item: item.key),
+                "ordered": Index(lambda item: item.key, order_by=lambda item: item.order),
+            }
+        )
+        expected = {}
+        for operation, id, key, order in operations:
+            old = expected.get(id)
+            if operation == "put":
+                new = expected[id] = Item(id, key, order)
+                if old is None:
+                    items.append(new)
+                else:
+                    items.update(old, new)
+            elif old is not None:
+                del expected[id]
+                items.remove(old)
+
+        check_same_items(items, expected)
+
+    check()
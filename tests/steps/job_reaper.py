@@ -0,0 +1,75 @@
+import pytest
+from nerdd_link.tests import async_step
+from pytest_bdd import parsers, then, when
+
+
+@pytest.fixture
+def created_jobs():
+    return []
+
+
+@when(parsers.parse("the client creates a job of module '{module_id}' for uploaded source {i:d}"))
+def create_job(client, uploaded_sources, created_jobs, module_id, i):
+    response = client.post(
+        "/jobs", json={"job_type": module_id, "source_id": uploaded_sources[i], "params": {}}
+    )
+    assert response.status_code == 200, response.text
+    created_jobs.append(response.json()["id"])
+
+
+@when("the size of the created jobs is known")
+@async_step
+async def created_jobs_have_size(repository, created_jobs):
+    # otherwise, the quota does not allow another job (see check_quota)
+    for job_id in created_jobs:
+        await repository.update_job_size(job_id, 2, 1)
+
+
+@when(parsers.parse("the client deletes created job {i:d}"), target_fixture="response")
+def delete_created_job(client, created_jobs, i):
+    return client.delete(f"/jobs/{created_jobs[i]}")
+
+
+@when(
+    parsers.parse(
+        "the client deletes the jobs older than {older_than} with the admin api key '{key}'"
+    ),
+    target_fixture="response",
+)
+def delete_old_jobs(client, older_than, key):
+    # Note: header values are sent as utf-8 (and decoded as latin-1 by the server)
+    return client.delete(
+        "/jobs", params={"older_than": older_than}, headers={"X-Admin-Api-Key": key.encode()}
+    )
+
+
+@when("the job reaper removes the deleted jobs")
+@async_step
+async def reap_deleted_jobs(client, repository):
+    job_reaper = client.app.state.job_reaper
+    for job in await repository.get_deleted_jobs(limit=job_reaper.batch_size):
+        await job_reaper.reap_job(job)
+
+
+@when("the job reaper removes the deleted jobs twice")
+@async_step
+async def reap_deleted_jobs_twice(client, repository):
+    # e.g. if the reaper was interrupted after releasing the source
+    job_reaper = client.app.state.job_reaper
+    jobs = await repository.get_deleted_jobs(limit=job_reaper.batch_size)
+    for job in jobs:
+        await job_reaper.reap_job(job)
+    for job in jobs:
+        await job_reaper.reap_job(job)
+
+
+@then(parsers.parse("uploaded source {i:d} is available"))
+def check_source_available(client, uploaded_sources, i):
+    response = client.get(f"/sources/{uploaded_sources[i]}")
+    assert response.status_code == 200, response.text
+
+
+@then(parsers.parse("uploaded source {i:d} was removed"))
+def check_source_removed(client, uploaded_sources, i):
+    response = client.get(f"/sources/{uploaded_sources[i]}")
+    assert response.status_code == 404, response.text
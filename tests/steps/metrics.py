@@ -0,0 +1,27 @@
+from pytest_bdd import given, parsers, then
+
+from nerdd_backend.lifespan.action_lifespan import instrument_action
+from nerdd_backend.util import MetricsRegistry
+
+
+@given("the action is instrumented", target_fixture="metrics")
+def instrumented_action(action):
+    metrics = MetricsRegistry()
+    instrument_action(action, metrics)
+    return metrics
+
+
+@then(parsers.parse("the metrics contain {num:d} batch writes of results"))
+def check_batch_writes(action, metrics, num):
+    histogram = metrics.histogram(
+        "nerdd_result_batch_write_duration_seconds",
+        "Duration of writing a batch of results",
+        ["action", "group"],
+    )
+    actual = histogram.get_count(action=type(action).__name__, group=action._get_group_name())
+    assert actual == num, f"Expected {num} batch writes, got {actual}"
+
+
+@then(parsers.parse("the response contains the metric {name}"))
+def check_metric(response, name):
+    assert f"\n# TYPE {name} " in f"\n{response.text}", response.text
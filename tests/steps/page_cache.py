@@ -0,0 +1,54 @@
+import gzip
+
+from pytest_bdd import given, parsers, then, when
+
+from nerdd_backend.util import PageCache
+
+
+@given(parsers.parse("a page cache of {max_bytes:d} bytes"), target_fixture="page_cache")
+def page_cache(max_bytes):
+    # without compression, every page takes exactly the size of its body
+    return PageCache(max_bytes, compress=False)
+
+
+@given(
+    parsers.parse("a compressing page cache of {max_bytes:d} bytes"), target_fixture="page_cache"
+)
+def compressing_page_cache(max_bytes):
+    return PageCache(max_bytes, compress=True)
+
+
+@when(parsers.parse("page {key:d} of job '{job_id}' with {num_bytes:d} bytes is cached"))
+def put_page(page_cache, key, job_id, num_bytes):
+    page_cache.put(job_id, key, b"x" * num_bytes, f'"{job_id}-{key}"')
+
+
+@when(parsers.parse("page {key:d} of job '{job_id}' is read"))
+def get_page(page_cache, key, job_id):
+    page_cache.get(job_id, key)
+
+
+@when(parsers.parse("the pages of job '{job_id}' are invalidated"))
+def invalidate_pages(page_cache, job_id):
+    page_cache.invalidate(job_id)
+
+
+@then(parsers.parse("the page cache contains the pages {pages}"))
+def check_pages(page_cache, pages):
+    # pages are given as <job_id>/<key>, e.g. a/1,b/2
+    expected = {tuple(page.split("/")) for page in pages.split(",")}
+    actual = {(job_id, str(key)) for job_id, key in page_cache._pages}
+    assert actual == expected, f"Expected {expected}, got {actual}"
+
+
+@then(parsers.parse("the page cache contains {num_bytes:d} bytes"))
+def check_num_bytes(page_cache, num_bytes):
+    actual = page_cache.get_stats()["num_bytes"]
+    assert actual == num_bytes, f"Expected {num_bytes} bytes, got {actual}"
+
+
+@then(parsers.parse("page {key:d} of job '{job_id}' is compressed"))
+def check_compressed(page_cache, key, job_id):
+    page = page_cache.get(job_id, key)
+    assert page.gzipped_body is not None
+    assert gzip.decompress(page.gzipped_body) == page.body
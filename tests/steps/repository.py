@@ -1,7 +1,11 @@
+import json
+
 import pytest_asyncio
-from pytest_bdd import given
+from nerdd_link.tests import async_step
+from pytest_bdd import given, parsers, then, when
 
 from nerdd_backend.data import MemoryRepository
+from nerdd_backend.models import JobInternal, JobUpdate, Module, Result, Source
 
 
 @pytest_asyncio.fixture(scope="function")
@@ -17,6 +21,92 @@ def mocked_repository(mocker, repository):
     )
 
 
+@given("an initialized repository")
+@async_step
+async def initialized_repository(repository):
+    # only for scenarios without a client (the app initializes the repository on startup)
+    await repository.initialize()
+
+
+@given(parsers.parse("the repository contains the module '{module_id}'"))
+@async_step
+async def repository_contains_module(repository, module_id):
+    await repository.create_module(Module(id=module_id, name=module_id, version="1.0.0"))
+
+
+@given(parsers.parse("the repository contains the source '{source_id}' without file name"))
+@async_step
+async def repository_contains_source(repository, source_id):
+    await repository.create_source(Source(id=source_id, format="zip"))
+
+
+@given(
+    parsers.parse(
+        "the repository contains a job '{job_id}' of module '{module_id}' with {num:d} entries"
+    )
+)
+@async_step
+async def repository_contains_job(repository, job_id, module_id, num):
+    await repository.create_job(
+        JobInternal(
+            id=job_id,
+            job_type=module_id,
+            source_id="source",
+            params={},
+            status="processing",
+            num_entries_total=num,
+        )
+    )
+
+
+@then(parsers.parse("the repository contains {num:d} results of job '{job_id}'"))
+@async_step
+async def check_number_of_results(repository, num, job_id):
+    actual = await repository.count_results_by_job_id(job_id)
+    assert actual == num, f"Expected {num} results of job {job_id}, got {actual}"
+
+
+@when(
+    parsers.parse("the results of molecules {mol_ids} of job '{job_id}' are inserted"),
+    target_fixture="inserted_results",
+)
+@async_step
+async def insert_results(repository, mol_ids, job_id):
+    results = [
+        Result(id=f"{job_id}-{mol_id}", job_id=job_id, mol_id=int(mol_id))
+        for mol_id in mol_ids.split(",")
+    ]
+    return await repository.create_results(results)
+
+
+@then(parsers.parse("the inserted results are the molecules {mol_ids}"))
+def check_inserted_results(inserted_results, mol_ids):
+    expected = [int(mol_id) for mol_id in mol_ids.split(",")]
+    actual = [result.mol_id for result in inserted_results]
+    assert actual == expected, f"Expected molecules {expected}, got {actual}"
+
+
+@when(parsers.parse("the molecules {mol_ids} of job '{job_id}' are processed"))
+@async_step
+async def molecules_are_processed(repository, mol_ids, job_id):
+    entries_processed = [int(mol_id) for mol_id in mol_ids.split(",")]
+    await repository.update_job(JobUpdate(id=job_id, entries_processed=entries_processed))
+
+
+@when(parsers.parse("the intervals {intervals} of job '{job_id}' are processed"))
+@async_step
+async def intervals_are_processed(repository, intervals, job_id):
+    await repository.update_job(JobUpdate(id=job_id, intervals_processed=json.loads(intervals)))
+
+
+@then(parsers.parse("the processed entries of job '{job_id}' are {intervals}"))
+@async_step
+async def check_processed_entries(repository, job_id, intervals):
+    job = await repository.get_job_by_id(job_id)
+    expected = [tuple(interval) for interval in json.loads(intervals)]
+    assert job.entries_processed == expected, job.entries_processed
+
+
 # TODO move this to the correct file
 # @given("the repository contains the mol weight module")
 # @async_step
@@ -0,0 +1,147 @@
+import os
+
+import pytest
+from nerdd_link import FileSystem
+from nerdd_link.tests import async_step
+from pytest_bdd import given, parsers, then, when
+
+from nerdd_backend.data import ResultStore
+from nerdd_backend.models import JobUpdate
+from nerdd_backend.util import BackgroundTasks, ResultArchive, ResultArchiveWriter
+
+
+@pytest.fixture
+def result_store(repository, data_dir):
+    return ResultStore(repository, FileSystem(data_dir), row_group_size=5)
+
+
+@given(
+    parsers.parse(
+        "an archive of {num_molecules:d} molecules with {num:d} results each "
+        "and row groups of {row_group_size:d} results"
+    ),
+    target_fixture="archived_records",
+)
+def archive(data_dir, num_molecules, num, row_group_size):
+    # some records lack a key or contain None (which have to be distinguished)
+    records = []
+    for mol_id in range(num_molecules):
+        for atom_id in range(num):
+            record = {"mol_id": mol_id, "atom_id": atom_id, "name": f"molecule {mol_id}"}
+            if atom_id % 2 == 0:
+                record["charge"] = None if mol_id % 3 == 0 else atom_id * 0.1
+            records.append(record)
+
+    writer = ResultArchiveWriter(os.path.join(data_dir, "results.archive"), row_group_size)
+    writer.write(records)
+    writer.close()
+    return records
+
+
+@then("reading the archive returns all results")
+def check_archive(data_dir, archived_records):
+    archive = ResultArchive(os.path.join(data_dir, "results.archive"))
+    try:
+        assert archive.read() == archived_records
+        assert archive.num_records == len(archived_records)
+    finally:
+        archive.close()
+
+
+@then(parsers.parse("reading molecules {start:d} to {end:d} of the archive returns their results"))
+def check_archive_range(data_dir, archived_records, start, end):
+    archive = ResultArchive(os.path.join(data_dir, "results.archive"))
+    try:
+        expected = [record for record in archived_records if start <= record["mol_id"] <= end]
+        assert archive.read(start, end) == expected
+    finally:
+        archive.close()
+
+
+@given(parsers.parse("all entries and checkpoints of job '{job_id}' were processed"))
+@async_step
+async def job_is_complete(repository, job_id):
+    job = await repository.get_job_by_id(job_id)
+    await repository.update_job(
+        JobUpdate(
+            id=job_id,
+            entries_processed=list(range(job.num_entries_total)),
+            num_checkpoints_total=1,
+            new_checkpoints_processed=[0],
+        )
+    )
+
+
+@when(parsers.parse("the results of job '{job_id}' are archived in the background"))
+@async_step
+async def archive_results_later(repository, result_store, job_id):
+    background_tasks = BackgroundTasks()
+    result_store.archive_results_later(await repository.get_job_by_id(job_id), background_tasks)
+    # scheduling twice does not archive twice
+    result_store.archive_results_later(await repository.get_job_by_id(job_id), background_tasks)
+    assert len(background_tasks) == 1
+    await background_tasks.wait()
+
+
+@then(parsers.parse("the results of job '{job_id}' are archived"))
+@async_step
+async def check_results_archived(repository, result_store, job_id):
+    job = await repository.get_job_by_id(job_id)
+    assert job.results_archived
+    assert os.path.exists(result_store.get_archive_path(job_id))
+
+
+@then(parsers.parse("the result store returns {num:d} results of job '{job_id}'"))
+@async_step
+async def check_result_store(repository, result_store, num, job_id):
+    job = await repository.get_job_by_id(job_id)
+    results = await result_store.get_results(job)
+    assert len(results) == num, f"Expected {num} results, got {len(results)}"
+    assert [result.mol_id for result in results] == sorted(result.mol_id for result in results)
+
+
+@given(parsers.parse("the result store keeps at most {num:d} archives open"))
+def max_open_archives(result_store, num):
+    result_store.max_open_archives = num
+
+
+@pytest.fixture
+def opened_archives():
+    return {}
+
+
+@when(parsers.parse("the result store reads the results of job '{job_id}'"))
+@async_step
+async def read_results(repository, result_store, opened_archives, job_id):
+    await result_store.get_results(await repository.get_job_by_id(job_id))
+    opened_archives[job_id] = result_store._archives[job_id]
+
+
+@pytest.fixture
+def iterators():
+    return {}
+
+
+@when(parsers.parse("the result store starts iterating over the results of job '{job_id}'"))
+@async_step
+async def start_iterating(repository, result_store, opened_archives, iterators, job_id):
+    iterator = result_store.iter_results(await repository.get_job_by_id(job_id))
+    await iterator.__anext__()
+    iterators[job_id] = iterator
+    opened_archives[job_id] = result_store._archives[job_id]
+
+
+@when(parsers.parse("the iteration over the results of job '{job_id}' stops"))
+@async_step
+async def stop_iterating(iterators, job_id):
+    await iterators.pop(job_id).aclose()
+
+
+@then(parsers.parse("the archive of job '{job_id}' is closed"))
+def check_archive_closed(opened_archives, job_id):
+    assert opened_archives[job_id].closed
+
+
+@then(parsers.parse("the archive of job '{job_id}' is open"))
+def check_archive_open(opened_archives, job_id):
+    assert not opened_archives[job_id].closed
@@ -0,0 +1,75 @@
+from nerdd_link.tests import async_step
+from pytest_bdd import given, parsers, then, when
+
+from nerdd_backend.models import JobUpdate, Result
+
+
+@given("the app is running")
+def app_is_running(client):
+    # the app initializes the repository on startup (scenarios fill it afterwards)
+    pass
+
+
+@given(parsers.parse("job '{job_id}' has {num:d} results for each of the molecules {mol_ids}"))
+@async_step
+async def job_has_results(repository, job_id, num, mol_ids):
+    await repository.create_results(
+        [
+            Result(id=f"{job_id}-{mol_id}-{i}", job_id=job_id, mol_id=int(mol_id), atom_id=i)
+            for mol_id in mol_ids.split(",")
+            for i in range(num)
+        ]
+    )
+
+
+@given(parsers.parse("job '{job_id}' is completed"))
+@async_step
+async def job_is_completed(client, repository, job_id):
+    job = await repository.get_job_by_id(job_id)
+    await repository.update_job(
+        JobUpdate(
+            id=job_id,
+            status="completed",
+            entries_processed=list(range(job.num_entries_total)),
+            new_output_formats=list(client.app.state.config.output_formats),
+        )
+    )
+
+
+@when(
+    parsers.parse("the client revalidates {url} with If-None-Match {etag}"),
+    target_fixture="response",
+)
+def revalidate(client, url, etag):
+    return client.get(url, headers={"If-None-Match": etag})
+
+
+@when(
+    parsers.parse("the client revalidates {url} with the ETag of the response"),
+    target_fixture="response",
+)
+def revalidate_with_etag_of_response(client, response, url):
+    return client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+
+
+@then(parsers.parse("the response contains {num:d} results of the molecules {mol_ids}"))
+def check_results(response, num, mol_ids):
+    expected = [int(mol_id) for mol_id in mol_ids.split(",") for _ in range(num)]
+    actual = [result["mol_id"] for result in response.json()["data"]]
+    assert actual == expected, f"Expected molecules {expected}, got {actual}"
+
+
+@then(parsers.parse("the response continues after molecule {mol_id:d}"))
+def check_last_mol_id_on_page(response, mol_id):
+    actual = response.json()["pagination"]["last_mol_id_on_page"]
+    assert actual == mol_id, f"Expected {mol_id}, got {actual}"
+
+
+@then("the response has an ETag")
+def check_etag(response):
+    assert "ETag" in response.headers
+
+
+@then("the response has no ETag")
+def check_no_etag(response):
+    assert "ETag" not in response.headers
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+
+from nerdd_link.tests import async_step
+from pytest_bdd import given, parsers, then, when
+
+from nerdd_backend.data import RecordNotFoundError
+from nerdd_backend.models import JobInternal
+
+
+@given(
+    parsers.parse(
+        "the repository contains a job '{job_id}' of module '{module_id}' created {days:d} days ago"
+    )
+)
+@async_step
+async def repository_contains_old_job(repository, job_id, module_id, days):
+    await repository.create_job(
+        JobInternal(
+            id=job_id,
+            job_type=module_id,
+            source_id="source",
+            params={},
+            status="created",
+            created_at=datetime.now(timezone.utc) - timedelta(days=days),
+        )
+    )
+
+
+@given(parsers.parse("the retention policy expires at most {num:d} jobs per interval"))
+def retention_batch_size(client, num):
+    client.app.state.retention.batch_size = num
+
+
+@when(
+    parsers.parse(
+        "the retention policy expires jobs of module '{module_id}' older than {days:d} days"
+    ),
+    target_fixture="num_expired",
+)
+@async_step
+async def expire_jobs(client, module_id, days):
+    created_before = datetime.now(timezone.utc) - timedelta(days=days)
+    return await client.app.state.retention.expire(module_id, created_before)
+
+
+@when(
+    parsers.parse(
+        "the retention policy reports jobs of module '{module_id}' older than {days:d} days"
+    ),
+    target_fixture="report",
+)
+@async_step
+async def report_jobs(client, module_id, days):
+    created_before = datetime.now(timezone.utc) - timedelta(days=days)
+    return await client.app.state.retention.report(module_id, created_before)
+
+
+@then(parsers.parse("{num:d} jobs were expired"))
+def check_num_expired(num_expired, num):
+    assert num_expired == num, f"Expected {num} expired jobs, got {num_expired}"
+
+
+@then(parsers.parse("the report counts {num:d} jobs"))
+def check_report(report, num):
+    assert report["num_jobs"] == num, f"Expected {num} jobs, got {report}"
+
+
+@then(parsers.parse("job '{job_id}' is deleted"))
+@async_step
+async def check_job_deleted(repository, job_id):
+    try:
+        await repository.get_job_by_id(job_id)
+    except RecordNotFoundError:
+        return
+    raise AssertionError(f"Job {job_id} was not deleted")
+
+
+@then(parsers.parse("job '{job_id}' is not deleted"))
+@async_step
+async def check_job_not_deleted(repository, job_id):
+    await repository.get_job_by_id(job_id)
@@ -0,0 +1,30 @@
+from nerdd_link.tests import async_step
+from pytest_bdd import given, parsers, then, when
+
+from nerdd_backend.models import JobInternal
+from nerdd_backend.routers.jobs import is_job_final, reuse_or_process_job
+
+
+@given(parsers.parse("the repository contains a new job '{job_id}' of module '{module_id}'"))
+@async_step
+async def repository_contains_new_job(repository, job_id, module_id):
+    # jobs are created without progress (see create_job)
+    await repository.create_job(
+        JobInternal(id=job_id, job_type=module_id, source_id="source", params={}, status="created")
+    )
+
+
+@when(parsers.parse("the results of job '{source_job_id}' are reused for job '{job_id}'"))
+@async_step
+async def reuse_results(client, repository, source_job_id, job_id):
+    source_job = await repository.get_job_by_id(source_job_id)
+    job = await repository.get_job_by_id(job_id)
+    await reuse_or_process_job(job, [source_job], client.app)
+
+
+@then(parsers.parse("job '{job_id}' is final"))
+@async_step
+async def check_job_is_final(client, repository, job_id):
+    job = await repository.get_job_by_id(job_id)
+    assert is_job_final(job, client.app.state.config.output_formats), f"Job {job} is not final"
+
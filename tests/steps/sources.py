@@ -1,7 +1,14 @@
+import json
 import os
+import zipfile
+from io import BytesIO
 
 from nerdd_link.tests import async_step
-from pytest_bdd import parsers, then
+from nerdd_module.input import DepthFirstExplorer
+from pytest_bdd import parsers, then, when
+
+from nerdd_backend.routers.sources import pack_inputs
+from nerdd_backend.util import BlobStore
 
 
 @then("the source file in the response was created")
@@ -15,3 +22,90 @@ def the_source_file_in_the_response_was_created(response, data_dir):
 def the_sources_folder_contains_exactly_count_files(data_dir, count):
     path = os.path.join(data_dir, "sources")
     assert len(os.listdir(path)) == int(count)
+
+
+@when(
+    parsers.parse("the client uploads the file '{path}' {num:d} times"),
+    target_fixture="uploaded_sources",
+)
+def upload_file(client, data_dir, path, num):
+    uploaded_sources = []
+    for _ in range(num):
+        with open(os.path.join(data_dir, path), "rb") as f:
+            response = client.put("/sources/", files={"file": (path, f)})
+        assert response.status_code == 200, response.text
+        uploaded_sources.append(response.json()["id"])
+    return uploaded_sources
+
+
+@when(parsers.parse("the client deletes uploaded source {i:d}"), target_fixture="response")
+def delete_uploaded_source(client, uploaded_sources, i):
+    return client.delete(f"/sources/{uploaded_sources[i]}")
+
+
+@then("the uploaded sources are different sources sharing one file")
+def check_shared_file(data_dir, uploaded_sources):
+    assert len(set(uploaded_sources)) == len(uploaded_sources)
+    inodes = {
+        os.stat(os.path.join(data_dir, "sources", source_id)).st_ino
+        for source_id in uploaded_sources
+    }
+    assert len(inodes) == 1
+
+
+@then(parsers.parse("uploaded source {i:d} contains\n{content}"))
+def check_uploaded_source(client, data_dir, uploaded_sources, i, content):
+    response = client.get(f"/sources/{uploaded_sources[i]}")
+    assert response.status_code == 200
+    with open(os.path.join(data_dir, "sources", uploaded_sources[i])) as f:
+        assert f.read() == content
+
+
+@then(parsers.parse("the blobs folder contains exactly {count:d} files"))
+def check_blobs(data_dir, count):
+    path = os.path.join(data_dir, "blobs")
+    assert len(os.listdir(path)) == count
+
+
+@then("identical files that were stored at the same time end up sharing one blob")
+def check_concurrent_blobs(data_dir):
+    blob_store = BlobStore(os.path.join(data_dir, "blobs"))
+    paths = [os.path.join(data_dir, f"upload_{i}") for i in range(2)]
+    # both uploads missed the blob and stored their own copy
+    for path in paths:
+        assert not blob_store.link("checksum", path)
+        with open(path, "w") as f:
+            f.write("CCO\n")
+    for path in paths:
+        blob_store.add("checksum", path)
+
+    inodes = {os.stat(path).st_ino for path in [*paths, blob_store.get_path("checksum")]}
+    assert len(inodes) == 1
+
+
+@when(parsers.parse("the inputs are packed\n{inputs}"), target_fixture="packed_inputs")
+def packed_inputs(inputs):
+    return pack_inputs(json.loads(inputs))
+
+
+@then(parsers.parse("the packed inputs contain the members {members}"))
+def check_packed_members(packed_inputs, members):
+    with zipfile.ZipFile(BytesIO(packed_inputs)) as zip_file:
+        assert zip_file.namelist() == members.split(",")
+
+
+@then(parsers.parse("member '{member}' of the packed inputs contains\n{content}"))
+def check_packed_member(packed_inputs, member, content):
+    with zipfile.ZipFile(BytesIO(packed_inputs)) as zip_file:
+        assert zip_file.read(member).decode("utf-8") == content
+
+
+@then(parsers.parse("the packed inputs are read as molecules from {members}"))
+def check_packed_molecules(packed_inputs, members):
+    entries = list(DepthFirstExplorer().explore(BytesIO(packed_inputs)))
+    assert [entry.source[0] for entry in entries] == members.split(",")
+
+
+@then(parsers.parse("the inputs packed again are identical\n{inputs}"))
+def check_packed_again(packed_inputs, inputs):
+    assert pack_inputs(json.loads(inputs)) == packed_inputs
@@ -0,0 +1,80 @@
+import hashlib
+import os
+from io import BytesIO
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
+
+from nerdd_link.tests import async_step
+from pytest_bdd import given, parsers, then, when
+from starlette.datastructures import UploadFile
+
+from nerdd_backend.util import UploadTooLargeError, store_upload
+
+
+@given(
+    parsers.parse("an upload of {num_bytes:d} bytes {location}"),
+    target_fixture="upload",
+)
+def upload(num_bytes, location):
+    content = os.urandom(num_bytes)
+    if location == "in memory":
+        file = BytesIO(content)
+    elif location == "spooled to disk":
+        # Starlette rolls large uploads over to an anonymous file
+        file = SpooledTemporaryFile(max_size=1)
+        file.write(content)
+        file.rollover()
+    elif location == "in a named file":
+        file = NamedTemporaryFile()
+        file.write(content)
+    else:
+        raise ValueError(f"Unknown location {location}")
+    file.seek(0)
+    return content, UploadFile(file)
+
+
+@when(
+    parsers.parse(
+        "the upload is stored in chunks of {chunk_size:d} bytes with a maximum of {max_size:d} "
+        "bytes"
+    ),
+    target_fixture="stored_upload",
+)
+@async_step
+async def store(data_dir, upload, chunk_size, max_size):
+    _, file = upload
+    path = os.path.join(data_dir, "upload")
+    try:
+        return await store_upload(file, path, chunk_size, max_size, hash_algorithm="sha256")
+    except UploadTooLargeError as e:
+        return e
+
+
+@when(
+    parsers.parse("the upload is stored without checksum in chunks of {chunk_size:d} bytes"),
+    target_fixture="stored_upload",
+)
+@async_step
+async def store_without_checksum(data_dir, upload, chunk_size):
+    _, file = upload
+    return await store_upload(file, os.path.join(data_dir, "upload"), chunk_size)
+
+
+@then("the stored file has the content of the upload")
+def check_stored_file(data_dir, upload, stored_upload):
+    content, _ = upload
+    with open(os.path.join(data_dir, "upload"), "rb") as f:
+        assert f.read() == content
+    assert stored_upload.num_bytes == len(content)
+
+
+@then("the checksum of the upload is correct")
+def check_checksum(upload, stored_upload):
+    content, _ = upload
+    assert stored_upload.checksum == hashlib.sha256(content).hexdigest()
+
+
+@then("the upload is rejected as too large")
+def check_rejected(data_dir, stored_upload):
+    assert isinstance(stored_upload, UploadTooLargeError)
+    # the partial file is removed
+    assert not os.path.exists(os.path.join(data_dir, "upload"))
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+
+from nerdd_link.tests import async_step
+from pytest_bdd import given, parsers, then, when
+
+from nerdd_backend.data import RecordNotFoundError
+from nerdd_backend.models import JobInternal
+
+
+@given(
+    parsers.parse(
+        "user '{user_id}' created a job '{job_id}' of module '{module_id}' {hours:d} hours ago"
+    )
+)
+@async_step
+async def user_created_job(repository, user_id, job_id, module_id, hours):
+    # same as create_job: the job counts as fresh until its size is known
+    job = await repository.create_job(
+        JobInternal(
+            id=job_id,
+            job_type=module_id,
+            source_id="source",
+            params={},
+            status="processing",
+            user_id=user_id,
+            created_at=datetime.now(timezone.utc) - timedelta(hours=hours),
+        )
+    )
+    await repository.add_user_usage(user_id, job.created_at, num_fresh_jobs=1)
+
+
+@when(parsers.parse("the size of job '{job_id}' is reported as {num:d} entries"))
+@async_step
+async def report_job_size(repository, job_id, num):
+    try:
+        await repository.update_job_size(job_id, num, 1)
+    except RecordNotFoundError:
+        # the job was deleted
+        pass
+
+
+@when(parsers.parse("job '{job_id}' is marked as deleted"))
+@async_step
+async def mark_job_deleted(repository, job_id):
+    await repository.mark_job_deleted(job_id)
+
+
+@when("all jobs are marked as deleted")
+@async_step
+async def mark_all_jobs_deleted(repository):
+    await repository.mark_jobs_deleted(datetime.now(timezone.utc))
+
+
+@when(parsers.parse("usage older than {hours:d} hours is deleted"))
+@async_step
+async def delete_old_usage(repository, hours):
+    await repository.delete_user_usage(datetime.now(timezone.utc) - timedelta(hours=hours))
+
+
+@then(
+    parsers.parse(
+        "user '{user_id}' has {num_fresh_jobs:d} fresh jobs and {num_entries:d} entries "
+        "within {hours:d} hours"
+    )
+)
+@async_step
+async def check_user_usage(repository, user_id, num_fresh_jobs, num_entries, hours):
+    usage = await repository.get_user_usage(user_id, hours * 60 * 60)
+    assert usage.num_fresh_jobs == num_fresh_jobs, f"Got {usage.num_fresh_jobs} fresh jobs"
+    assert usage.num_entries == num_entries, f"Got {usage.num_entries} entries"